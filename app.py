@@ -1,16 +1,22 @@
 import os
+import pathlib
 import re
 import json
+import base64
 import calendar
+import select
+import shutil
+import tempfile
 import threading
 import time
+from collections import OrderedDict, defaultdict, deque
 from datetime import date, datetime, timedelta
 from functools import wraps
 from typing import Optional, Tuple
 
 from flask import (
     Flask, render_template, request, redirect, url_for, flash, abort,
-    send_from_directory, session, Response, stream_with_context, jsonify
+    send_from_directory, session, Request, Response, stream_with_context, jsonify
 )
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import FlaskForm
@@ -21,8 +27,8 @@ from wtforms import (
     TextAreaField, SubmitField, BooleanField, SelectMultipleField, FileField, PasswordField
 )
 from wtforms.validators import DataRequired, Email, Optional as VOptional, Length, NumberRange, URL, Regexp, ValidationError
-from sqlalchemy import or_, and_, text
-from sqlalchemy.orm import foreign, joinedload
+from sqlalchemy import or_, and_, text, true, tuple_, event, inspect, insert, update
+from sqlalchemy.orm import contains_eager, foreign, joinedload, object_session
 from werkzeug.routing import BuildError
 try:
     import serial
@@ -57,8 +63,43 @@ socketio = SocketIO(app, async_mode=async_mode)
 CARD_READER_DEVICE = os.environ.get('CARD_READER_DEVICE', '/dev/input/event0')
 CARD_READER_BAUD = int(os.environ.get('CARD_READER_BAUD', '9600'))  # Not used for HID
 
-# Global variable for card polling
-last_card_id = None
+# Card scans kept for /card_status polling clients (oldest dropped first)
+CARD_SCAN_LOG_SIZE = int(os.environ.get('CARD_SCAN_LOG_SIZE', '100'))
+
+class CardScanLog:
+    """Bounded, thread-safe log of card scans numbered by a monotonically increasing seq."""
+    def __init__(self, maxlen: int):
+        self._lock = threading.Lock()
+        self._scans = deque(maxlen=maxlen)
+        self._seq = 0
+
+    @property
+    def seq(self) -> int:
+        with self._lock:
+            return self._seq
+
+    def append(self, card_id: str) -> dict:
+        with self._lock:
+            self._seq += 1
+            scan = {'seq': self._seq, 'card_id': card_id, 'ts': datetime.now().isoformat(timespec='seconds')}
+            self._scans.append(scan)
+            return scan
+
+    def since(self, after: Optional[int]) -> Tuple[list, int]:
+        """Scans with seq > after, and the current seq. No cursor returns no scans (clients start from now)."""
+        with self._lock:
+            if after is None:
+                return [], self._seq
+            if after > self._seq:
+                # Cursor from before a restart: replay what we have
+                after = 0
+            return [s for s in self._scans if s['seq'] > after], self._seq
+
+card_scans = CardScanLog(CARD_SCAN_LOG_SIZE)
+
+def publish_card_scan(card_id: str) -> None:
+    """Record a scan in the log and push it to Socket.IO clients."""
+    socketio.emit('card_scan', card_scans.append(card_id))
 
 # -----------------------------
 # Config
@@ -72,105 +113,298 @@ os.makedirs(STATIC_IMG, exist_ok=True)
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-change-me")
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(BASE_DIR, "karate_club.db")
+app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.environ.get("SQLITE_PATH", os.path.join(BASE_DIR, "karate_club.db"))
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 app.config["MAX_CONTENT_LENGTH"] = 2 * 1024 * 1024  # 2 MB
 
+# Imports (club backups, event/player archives with photos) get their own, larger body limit
+IMPORT_MAX_BYTES = int(os.environ.get("IMPORT_MAX_MB", "512")) * 1024 * 1024
+UPLOAD_LIMITS = {
+    "import_players_zip": IMPORT_MAX_BYTES,
+    "import_event_zip": IMPORT_MAX_BYTES,
+    "admin_players_import_csv": IMPORT_MAX_BYTES,
+    "admin_payments_import_csv": IMPORT_MAX_BYTES,
+}
+# Uploaded files above this size are spooled to a temp file (UPLOAD_TMP_DIR, default system temp) instead of memory
+UPLOAD_SPOOL_BYTES = int(os.environ.get("UPLOAD_SPOOL_KB", "1024")) * 1024
+UPLOAD_TMP_DIR = os.environ.get("UPLOAD_TMP_DIR") or None
+
+class UploadRequest(Request):
+    """Request with per-endpoint body limits (UPLOAD_LIMITS) and large uploads spooled to disk."""
+
+    @property
+    def max_content_length(self) -> Optional[int]:
+        return UPLOAD_LIMITS.get(self.endpoint, app.config["MAX_CONTENT_LENGTH"])
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        import io
+        if total_content_length is not None and total_content_length <= UPLOAD_SPOOL_BYTES:
+            return io.BytesIO()
+        return tempfile.TemporaryFile("rb+", dir=UPLOAD_TMP_DIR)
+
+app.request_class = UploadRequest
+
+# SQLite engine profile, applied to every new connection (see apply_sqlite_pragmas).
+# WAL lets report reads run alongside kiosk writes; NORMAL sync is safe with WAL and spares the SD card.
+app.config["SQLITE_JOURNAL_MODE"] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+app.config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+app.config["SQLITE_CACHE_SIZE"] = int(os.environ.get("SQLITE_CACHE_SIZE", "-16000"))  # negative = KiB
+
 # Admin credentials (env-configurable)
 ADMIN_USER = os.environ.get("ADMIN_USER", "admin")
 ADMIN_PASS = os.environ.get("ADMIN_PASS", "admin123")
 
+# How often the background job checks that the current month's dues exist
+MONTHLY_DUES_CHECK_SECONDS = int(os.environ.get("MONTHLY_DUES_CHECK_SECONDS", "3600"))
+
+# Check-in journal: sessions are acknowledged once written here and inserted by a background flusher
+CHECKIN_SPOOL_PATH = os.environ.get("CHECKIN_SPOOL_PATH", os.path.join(BASE_DIR, "checkin_spool.jsonl"))
+CHECKIN_FLUSH_SECONDS = float(os.environ.get("CHECKIN_FLUSH_SECONDS", "1"))
+
+# Rendered report pages kept in memory until the tables they read change (LRU, bounded for a Pi)
+REPORT_CACHE_SIZE = int(os.environ.get("REPORT_CACHE_SIZE", "16"))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
 db = SQLAlchemy(app)
 
-# Card reader thread
-def start_card_reader():
-    def card_reader_loop():
-        if not evdev:
-            print("evdev not available, card reader disabled")
+# Card reader supervisor
+CARD_READER_RESCAN_SECONDS = float(os.environ.get('CARD_READER_RESCAN_SECONDS', '2'))
+CARD_READER_BACKOFF_MAX = float(os.environ.get('CARD_READER_BACKOFF_MAX', '60'))
+
+CARD_KEY_CHARS = {
+    'KEY_0': '0', 'KEY_1': '1', 'KEY_2': '2', 'KEY_3': '3', 'KEY_4': '4',
+    'KEY_5': '5', 'KEY_6': '6', 'KEY_7': '7', 'KEY_8': '8', 'KEY_9': '9',
+    'KEY_A': 'a', 'KEY_B': 'b', 'KEY_C': 'c', 'KEY_D': 'd', 'KEY_E': 'e',
+    'KEY_F': 'f', 'KEY_G': 'g', 'KEY_H': 'h', 'KEY_I': 'i', 'KEY_J': 'j',
+    'KEY_K': 'k', 'KEY_L': 'l', 'KEY_M': 'm', 'KEY_N': 'n', 'KEY_O': 'o',
+    'KEY_P': 'p', 'KEY_Q': 'q', 'KEY_R': 'r', 'KEY_S': 's', 'KEY_T': 't',
+    'KEY_U': 'u', 'KEY_V': 'v', 'KEY_W': 'w', 'KEY_X': 'x', 'KEY_Y': 'y',
+    'KEY_Z': 'z',
+}
+
+def is_card_reader_name(name: str) -> bool:
+    name = (name or '').lower()
+    # Match likely card reader device names. Avoid matching short 'ic' inside words like 'silicon'.
+    return (
+        'reader' in name
+        or re.search(r"\bic\b", name) is not None
+        or 'rfid' in name
+        or 'mifare' in name
+        or 'magstripe' in name
+        or 'contact' in name
+    )
+
+class CardKeyDecoder:
+    """Turns a reader's key-down events into card IDs; Enter or a 1 s pause ends a card."""
+    def __init__(self):
+        self.buffer = ''
+        self.last_key = None
+        self.last_key_time = time.time()
+
+    def _take(self) -> list:
+        card = self.buffer.strip()
+        self.buffer = ''
+        self.last_key = None
+        return [card] if card else []
+
+    def feed(self, keycode: str, now: float) -> list:
+        cards = []
+        if keycode == 'KEY_ENTER':
+            cards += self._take()
+        elif keycode.startswith('KEY_') and keycode != self.last_key:
+            # Check if too much time passed, send previous buffer
+            if now - self.last_key_time > 1.0 and self.buffer:
+                cards += self._take()
+            char = CARD_KEY_CHARS.get(keycode, '')
+            if char:
+                self.buffer += char
+                self.last_key = keycode
+                self.last_key_time = now
+        return cards + self.flush(now)
+
+    def flush(self, now: float) -> list:
+        # If no key for 1 second, send buffer
+        if now - self.last_key_time > 1.0 and self.buffer:
+            return self._take()
+        return []
+
+class CardReaderSupervisor:
+    """
+    Keeps every connected card reader open: rescans for devices (hot-plug), multiplexes
+    all readers with select(), and reopens a failed device with exponential backoff.
+
+    list_devices() returns device paths and open_device(path) returns an evdev-like object
+    (name, fileno(), read() yielding events with type/code/value, close()), so a fake
+    device replaying recorded key events can stand in for the hardware.
+    """
+    def __init__(self, list_devices=None, open_device=None, on_scan=None,
+                 rescan_seconds: float = CARD_READER_RESCAN_SECONDS, backoff_max: float = CARD_READER_BACKOFF_MAX):
+        self.list_devices = list_devices or (evdev.list_devices if evdev else None)
+        self.open_device = open_device or (evdev.InputDevice if evdev else None)
+        self.on_scan = on_scan or publish_card_scan
+        self.rescan_seconds = rescan_seconds
+        self.backoff_max = backoff_max
+        self.running = False
+        self._lock = threading.Lock()
+        self._names = {}      # path -> device name, probed once per plug-in
+        self._probe_retry_at = {}  # path -> when to retry a failed name probe
+        self._open = {}       # path -> (device, CardKeyDecoder)
+        self._health = {}     # path -> health dict shown on the status endpoint
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'running': self.running,
+                'evdev_available': evdev is not None,
+                'readers': [dict(h, path=p) for p, h in sorted(self._health.items())],
+            }
+
+    def _set_health(self, path: str, **values) -> None:
+        with self._lock:
+            h = self._health.setdefault(path, {
+                'name': self._names.get(path), 'status': 'unknown', 'connected_since': None,
+                'last_scan_at': None, 'scans': 0, 'failures': 0, 'last_error': None, 'retry_at': 0.0,
+            })
+            h.update(values)
+
+    def _candidates(self, paths: list) -> list:
+        now = time.time()
+        for path in paths:
+            if path not in self._names and now >= self._probe_retry_at.get(path, 0.0):
+                try:
+                    dev = self.open_device(path)
+                    self._names[path] = dev.name
+                    dev.close()
+                    print(f"Input device: {path}: {self._names[path]}")
+                except Exception as e:
+                    # e.g. no permission on a non-reader device; probe again later
+                    self._probe_retry_at[path] = now + self.backoff_max
+                    print(f"Error probing input device {path}: {e}")
+        for path in list(self._names) + list(self._probe_retry_at):
+            if path not in paths:
+                self._names.pop(path, None)
+                self._probe_retry_at.pop(path, None)
+        readers = [p for p in paths if is_card_reader_name(self._names.get(p))]
+        if not readers and CARD_READER_DEVICE in paths:
+            # Fallback to configured device
+            readers = [CARD_READER_DEVICE]
+        return readers
+
+    def _connect(self, path: str, now: float) -> None:
+        with self._lock:
+            retry_at = self._health.get(path, {}).get('retry_at', 0.0)
+        if now < retry_at:
             return
-        # List available devices
         try:
-            devices = [evdev.InputDevice(path) for path in evdev.list_devices()]
-            print("Available input devices:")
-            for dev in devices:
-                print(f"  {dev.path}: {dev.name}")
+            device = self.open_device(path)
         except Exception as e:
-            print(f"Error listing devices: {e}")
-        # Try to find card reader device
-        card_reader_device = None
+            self._fail(path, e, now)
+            return
+        self._open[path] = (device, CardKeyDecoder())
+        self._set_health(path, name=device.name, status='connected',
+                         connected_since=datetime.now().isoformat(timespec='seconds'),
+                         failures=0, last_error=None, retry_at=0.0)
+        print(f"Card reader connected on {path}: {device.name}")
+
+    def _disconnect(self, path: str, status: str) -> None:
+        device, _decoder = self._open.pop(path, (None, None))
+        if device is not None:
+            try:
+                device.close()
+            except Exception:
+                pass
+        self._set_health(path, status=status, connected_since=None)
+
+    def _fail(self, path: str, error: Exception, now: float) -> None:
+        self._disconnect(path, 'error')
+        with self._lock:
+            failures = self._health[path]['failures'] + 1
+        delay = min(self.backoff_max, 2 ** (failures - 1))
+        self._set_health(path, failures=failures, last_error=str(error), retry_at=now + delay)
+        print(f"Card reader error on {path}: {error} (retry in {delay:.0f}s)")
+
+    def _publish(self, path: str, cards: list) -> None:
+        for card in cards:
+            with self._lock:
+                self._health[path]['scans'] += 1
+                self._health[path]['last_scan_at'] = datetime.now().isoformat(timespec='seconds')
+            self.on_scan(card)
+
+    def _read(self, path: str, now: float) -> None:
+        device, decoder = self._open[path]
         try:
-            devices = [evdev.InputDevice(path) for path in evdev.list_devices()]
-            for dev in devices:
-                name = dev.name.lower()
-                # Match likely card reader device names. Avoid matching short 'ic' inside words like 'silicon'.
-                if (
-                    'reader' in name
-                    or re.search(r"\bic\b", name)
-                    or 'rfid' in name
-                    or 'mifare' in name
-                    or 'magstripe' in name
-                    or 'contact' in name
-                ):
-                    card_reader_device = dev.path
-                    print(f"Found potential card reader: {dev.path}: {dev.name}")
-                    break
-            if not card_reader_device:
-                # Fallback to configured device
-                card_reader_device = CARD_READER_DEVICE
-        except Exception as e:
-            print(f"Error finding card reader: {e}")
-            card_reader_device = CARD_READER_DEVICE
-        
+            for event in device.read():
+                if event.type != ecodes.EV_KEY or event.value != 1:  # key down only
+                    continue
+                keycode = ecodes.KEY.get(event.code, '')
+                if isinstance(keycode, (list, tuple)):
+                    keycode = keycode[0]
+                print(f"Key pressed: {keycode}")
+                self._publish(path, decoder.feed(keycode, now))
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            # Device unplugged or gone bad
+            self._fail(path, e, now)
+
+    def poll_once(self, timeout: float) -> None:
+        """One supervisor step: wait for input on the open readers, then flush idle buffers."""
+        if not self._open:
+            time.sleep(timeout)
+            return
+        devices = {device: path for path, (device, _decoder) in self._open.items()}
         try:
-            device = evdev.InputDevice(card_reader_device)
-            print(f"Card reader connected on {card_reader_device}: {device.name}")
-            card_buffer = ''
-            last_key_time = time.time()
-            last_key = None
-            for event in device.read_loop():
-                if event.type == ecodes.EV_KEY:
-                    key_event = evdev.categorize(event)
-                    if key_event.keystate == key_event.key_down:
-                        print(f"Key pressed: {key_event.keycode}")
-                        current_time = time.time()
-                        if key_event.keycode == 'KEY_ENTER':
-                            if card_buffer.strip():
-                                global last_card_id
-                                last_card_id = card_buffer.strip()
-                                socketio.emit('card_scan', {'card_id': card_buffer.strip()})
-                            card_buffer = ''
-                            last_key = None
-                        elif key_event.keycode.startswith('KEY_') and key_event.keycode != last_key:
-                            # Check if too much time passed, send previous buffer
-                            if current_time - last_key_time > 1.0 and card_buffer:
-                                socketio.emit('card_scan', {'card_id': card_buffer.strip()})
-                                card_buffer = ''
-                                last_key = None
-                            # Map keycode to character
-                            key_map = {
-                                'KEY_0': '0', 'KEY_1': '1', 'KEY_2': '2', 'KEY_3': '3', 'KEY_4': '4',
-                                'KEY_5': '5', 'KEY_6': '6', 'KEY_7': '7', 'KEY_8': '8', 'KEY_9': '9',
-                                'KEY_A': 'a', 'KEY_B': 'b', 'KEY_C': 'c', 'KEY_D': 'd', 'KEY_E': 'e',
-                                'KEY_F': 'f', 'KEY_G': 'g', 'KEY_H': 'h', 'KEY_I': 'i', 'KEY_J': 'j',
-                                'KEY_K': 'k', 'KEY_L': 'l', 'KEY_M': 'm', 'KEY_N': 'n', 'KEY_O': 'o',
-                                'KEY_P': 'p', 'KEY_Q': 'q', 'KEY_R': 'r', 'KEY_S': 's', 'KEY_T': 't',
-                                'KEY_U': 'u', 'KEY_V': 'v', 'KEY_W': 'w', 'KEY_X': 'x', 'KEY_Y': 'y',
-                                'KEY_Z': 'z',
-                            }
-                            char = key_map.get(key_event.keycode, '')
-                            if char:
-                                card_buffer += char
-                                last_key = key_event.keycode
-                                last_key_time = current_time
-                        # If no key for 1 second, send buffer
-                        if current_time - last_key_time > 1.0 and card_buffer:
-                            socketio.emit('card_scan', {'card_id': card_buffer.strip()})
-                            card_buffer = ''
-                            last_key = None
-        except Exception as e:
-            print(f"Card reader error: {e}")
-    thread = threading.Thread(target=card_reader_loop, daemon=True)
+            readable, _, _ = select.select(list(devices), [], [], timeout)
+        except (OSError, ValueError):
+            # A device fd closed under us; find it by reading every device
+            readable = list(devices)
+        now = time.time()
+        for device in readable:
+            self._read(devices[device], now)
+        for path, (_device, decoder) in list(self._open.items()):
+            self._publish(path, decoder.flush(now))
+
+    def rescan(self) -> None:
+        """Open newly plugged readers (respecting backoff) and drop unplugged ones."""
+        paths = list(self.list_devices())
+        readers = self._candidates(paths)
+        now = time.time()
+        for path in list(self._open):
+            if path not in paths:
+                self._disconnect(path, 'unplugged')
+                print(f"Card reader unplugged: {path}")
+        with self._lock:
+            for path, h in self._health.items():
+                if path not in paths:
+                    h['status'] = 'unplugged'
+        for path in readers:
+            if path not in self._open:
+                self._connect(path, now)
+
+    def run(self) -> None:
+        if not self.list_devices or not self.open_device or not ecodes:
+            print("evdev not available, card reader disabled")
+            return
+        self.running = True
+        next_rescan = 0.0
+        while self.running:
+            try:
+                if time.time() >= next_rescan:
+                    self.rescan()
+                    next_rescan = time.time() + self.rescan_seconds
+                self.poll_once(min(0.5, self.rescan_seconds))
+            except Exception as e:
+                print(f"Card reader supervisor error: {e}")
+                time.sleep(1)
+
+card_reader = CardReaderSupervisor()
+
+# Card reader thread
+def start_card_reader():
+    thread = threading.Thread(target=card_reader.run, daemon=True)
     thread.start()
 
 # -----------------------------
@@ -179,7 +413,12 @@ def start_card_reader():
 class TrainingSession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(64), nullable=False)
-    __table_args__ = (db.UniqueConstraint('player_id', 'date', name='uq_player_session_date'),)
+    __table_args__ = (
+        db.UniqueConstraint('player_id', 'date', name='uq_player_session_date'),
+        db.Index('ix_training_session_pn_date_paid', 'player_pn', 'date', 'paid'),
+        db.Index('ix_training_session_date_pn', 'date', 'player_pn'),
+        db.Index('ix_training_session_session_id', 'session_id'),
+    )
     player_id = db.Column(db.Integer, nullable=False, index=True)
     player_pn = db.Column(db.String(20), nullable=True, index=True)
     date = db.Column(db.Date, nullable=True)
@@ -332,10 +571,28 @@ translations = {
         "Imports": "Imports",
         "Exports": "Exports",
         "Export All Payments (CSV)": "Export All Payments (CSV)",
+        "Generate Dues": "Generate Dues",
+        "Load more": "Load more",
+        "Generated %(count)s monthly due(s) for %(month)s.": "Generated %(count)s monthly due(s) for %(month)s.",
+        "Rebuild Summary": "Rebuild Summary",
+        "Rebuilt the monthly summary: %(count)s row(s).": "Rebuilt the monthly summary: %(count)s row(s).",
         "Export Players (ZIP)": "Export Players (ZIP)",
         "Export Events (ZIP)": "Export Events (ZIP)",
+        "Export Players with Photos (ZIP)": "Export Players with Photos (ZIP)",
+        "Export Events with Photos (ZIP)": "Export Events with Photos (ZIP)",
+        "Export Event with Photos (full ZIP)": "Export Event with Photos (full ZIP)",
         "Import Players (ZIP)": "Import Players (ZIP)",
         "Import Players (CSV)": "Import Players (CSV)",
+        "Preview only (dry run)": "Preview only (dry run)",
+        "The uploaded file is too large.": "The uploaded file is too large.",
+        "Import preview": "Import preview",
+        "Nothing has been saved. Upload the file again without the preview option to apply these changes.": "Nothing has been saved. Upload the file again without the preview option to apply these changes.",
+        "New players": "New players",
+        "Updated players": "Updated players",
+        "Unchanged players": "Unchanged players",
+        "Skipped (already exist)": "Skipped (already exist)",
+        "Rows with issues": "Rows with issues",
+        "Changes": "Changes",
         "Import Payments (CSV)": "Import Payments (CSV)",
         "Export All Profiles (ZIP)": "Export All Profiles (ZIP)",
         "Delete": "Delete",
@@ -631,7 +888,7 @@ translations = {
         "No file uploaded": "No file uploaded",
         "No file selected": "No file selected",
         "Close": "Close",
-        "DB migration: added columns: {cols}": "DB migration: added columns: {cols}",
+        "DB migration: applied {names}": "DB migration: applied {names}",
         "DB migration: nothing to do.": "DB migration: nothing to do.",
         "DB migration failed: {err}": "DB migration failed: {err}",
 
@@ -897,10 +1154,28 @@ translations = {
         "Imports": "Импорти",
         "Exports": "Експорти",
         "Export All Payments (CSV)": "Експорт всички плащания (CSV)",
+        "Generate Dues": "Генерирай такси",
+        "Load more": "Зареди още",
+        "Generated %(count)s monthly due(s) for %(month)s.": "Генерирани месечни такси: %(count)s за %(month)s.",
+        "Rebuild Summary": "Преизчисли обобщението",
+        "Rebuilt the monthly summary: %(count)s row(s).": "Месечното обобщение е преизчислено: %(count)s ред(а).",
         "Export Players (ZIP)": "Експорт спортисти (ZIP)",
         "Export Events (ZIP)": "Експорт събития (ZIP)",
+        "Export Players with Photos (ZIP)": "Експорт спортисти със снимки (ZIP)",
+        "Export Events with Photos (ZIP)": "Експорт събития със снимки (ZIP)",
+        "Export Event with Photos (full ZIP)": "Експорт на събитието със снимки (пълен ZIP)",
         "Import Players (ZIP)": "Импорт спортисти (ZIP)",
         "Import Players (CSV)": "Импорт спортисти (CSV)",
+        "Preview only (dry run)": "Само преглед (без запис)",
+        "The uploaded file is too large.": "Каченият файл е твърде голям.",
+        "Import preview": "Преглед на импорта",
+        "Nothing has been saved. Upload the file again without the preview option to apply these changes.": "Нищо не е записано. Качете файла отново без опцията за преглед, за да приложите промените.",
+        "New players": "Нови спортисти",
+        "Updated players": "Обновени спортисти",
+        "Unchanged players": "Непроменени спортисти",
+        "Skipped (already exist)": "Пропуснати (вече съществуват)",
+        "Rows with issues": "Редове с проблеми",
+        "Changes": "Промени",
         "Import Payments (CSV)": "Импорт плащания (CSV)",
         "Export All Profiles (ZIP)": "Експорт всички профили (ZIP)",
         "Delete": "Изтрий",
@@ -1196,7 +1471,7 @@ translations = {
         "No file uploaded": "Няма качен файл",
         "No file selected": "Няма избран файл",
         "Close": "Затвори",
-        "DB migration: added columns: {cols}": "Миграция: добавени колони: {cols}",
+        "DB migration: applied {names}": "Миграция: приложени: {names}",
         "DB migration: nothing to do.": "Миграция: няма какво да се прави.",
         "DB migration failed: {err}": "Миграция: грешка: {err}",
 
@@ -1761,32 +2036,69 @@ def is_auto_debt_note(note: Optional[str]) -> bool:
     n = (note or "")
     return "AUTO_DEBT from" in n
 
+def debt_status_for_note(note: Optional[str]) -> Optional[str]:
+    """debt_status for a receipt known only by its note (imported or pre-migration rows)."""
+    if not is_auto_debt_note(note):
+        return None
+    return "paid" if "AUTO_DEBT_PAID" in note else "open"
+
+def mark_debt_paid(debt) -> None:
+    """Settle a debt receipt; the note keeps its marker for people reading the receipt."""
+    debt.debt_status = "paid"
+    debt.note = (debt.note or '') + ' | AUTO_DEBT_PAID'
+
 def ensure_payments_for_month(year: int, month: int) -> int:
-    players = Player.query.filter_by(active_member=True).all()
-    created = 0
-    for p in players:
-        if not p.monthly_fee_is_monthly:
-            continue
-        if p.monthly_fee_amount is None:
-            continue
-        exists = Payment.query.filter_by(player_pn=p.pn, year=year, month=month).first()
-        if not exists:
-            db.session.add(Payment(
-                player_id=p.id,
-                player_pn=p.pn,
-                year=year,
-                month=month,
-                amount=p.monthly_fee_amount,
-                paid=False
-            ))
-            created += 1
+    """
+    Create the missing monthly Payment rows for active monthly payers in one INSERT ... SELECT.
+    Idempotent: players that already have a row for the month (by PN, or by uq_payment_player_month)
+    are skipped. Called from the background dues job and write endpoints, never from page views.
+    """
+    result = db.session.execute(text(
+        "INSERT OR IGNORE INTO payment (player_id, player_pn, year, month, amount, paid) "
+        "SELECT p.id, p.pn, :year, :month, p.monthly_fee_amount, 0 FROM player p "
+        "WHERE p.active_member = 1 AND p.monthly_fee_is_monthly = 1 AND p.monthly_fee_amount IS NOT NULL "
+        "AND NOT EXISTS (SELECT 1 FROM payment x "
+        "WHERE x.player_pn = p.pn AND x.year = :year AND x.month = :month)"
+    ), {"year": year, "month": month})
+    created = result.rowcount or 0
     if created:
-        db.session.commit()
+        pns = db.session.execute(text("SELECT player_pn FROM payment WHERE year = :year AND month = :month"),
+                                 {"year": year, "month": month}).scalars()
+        refresh_player_month_summary(db.session.connection(), [(pn, year, month) for pn in pns])
+    db.session.commit()
     return created
 
+def start_monthly_dues_job():
+    """Background thread that keeps the current month's dues generated (checks every MONTHLY_DUES_CHECK_SECONDS)."""
+    def monthly_dues_loop():
+        while True:
+            try:
+                with app.app_context():
+                    today = date.today()
+                    created = ensure_payments_for_month(today.year, today.month)
+                    if created:
+                        app.logger.info("Generated %s monthly due(s) for %04d-%02d", created, today.year, today.month)
+            except Exception:
+                app.logger.exception("Monthly dues generation failed")
+            time.sleep(MONTHLY_DUES_CHECK_SECONDS)
+
+    thread = threading.Thread(target=monthly_dues_loop, daemon=True)
+    thread.start()
+
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def unique_upload_name(filename: str) -> str:
+    """A safe name for filename that does not clash with a file already in UPLOAD_FOLDER."""
+    fname = secure_filename(filename)
+    base, ext = os.path.splitext(fname)
+    counter = 1
+    new_name = fname
+    while os.path.exists(os.path.join(UPLOAD_FOLDER, new_name)):
+        new_name = f"{base}_{counter}{ext}"
+        counter += 1
+    return new_name
+
 def admin_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
@@ -1796,6 +2108,121 @@ def admin_required(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+class DataVersions:
+    """Per-table write counters, bumped when a transaction that wrote the table commits."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def get(self, tables) -> tuple:
+        with self._lock:
+            return tuple(self._versions.get(t, 0) for t in tables)
+
+    def bump(self, tables) -> None:
+        with self._lock:
+            for t in tables:
+                self._versions[t] = self._versions.get(t, 0) + 1
+
+data_versions = DataVersions()
+
+WRITE_TABLE_RE = re.compile(r"\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|UPDATE|DELETE\s+FROM)\s+(\w+)", re.IGNORECASE)
+
+@event.listens_for(db.session, "after_flush")
+def _track_flushed_tables(session, flush_context):
+    written = session.info.setdefault("written_tables", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        written.add(inspect(obj).mapper.local_table.name)
+
+@event.listens_for(db.session, "do_orm_execute")
+def _track_executed_tables(orm_execute_state):
+    # Query.update()/delete(), Core inserts and raw SQL writes made through the session
+    if orm_execute_state.is_select:
+        return
+    statement = orm_execute_state.statement
+    table = getattr(statement, "table", None)
+    names = {table.name} if table is not None else set(WRITE_TABLE_RE.findall(str(statement)))
+    if names:
+        orm_execute_state.session.info.setdefault("written_tables", set()).update(names)
+
+@event.listens_for(db.session, "after_commit")
+def _bump_data_versions(session):
+    data_versions.bump(session.info.pop("written_tables", ()))
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_written_tables(session):
+    session.info.pop("written_tables", None)
+
+class ReportCache:
+    """LRU of rendered report pages, bounded by entry count and total size.
+
+    Each entry remembers the data versions it was rendered from; a lookup with
+    newer versions drops it.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key, versions: tuple) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != versions:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, versions: tuple, page: str) -> None:
+        if len(page) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (versions, page)
+            self._bytes += len(page)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key) -> None:
+        self._bytes -= len(self._entries.pop(key)[1])
+
+report_cache = ReportCache(REPORT_CACHE_SIZE, REPORT_CACHE_MAX_BYTES)
+
+def cached_report(*tables):
+    """Serve an admin report view from report_cache until one of the tables it reads is written.
+
+    Pages are keyed by endpoint, query string, language and day. Responses with pending
+    flash messages and print views (which stamp the generation time) are never cached.
+    Cached templates must not render anything outside the key, such as request.referrer.
+    """
+    tables = tables + ("setting",)  # base template logo/background
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if session.get("_flashes") or request.args.get("print"):
+                return fn(*args, **kwargs)
+            key = (request.endpoint, request.full_path, get_lang(), date.today())
+            versions = data_versions.get(tables)
+            page = report_cache.get(key, versions)
+            if page is None:
+                page = fn(*args, **kwargs)
+                if isinstance(page, str):
+                    report_cache.put(key, versions, page)
+            return page
+        return wrapper
+    return decorator
+
 # Preview a single training session
 @app.route('/admin/training_session/<session_id>')
 @admin_required
@@ -1856,6 +2283,20 @@ class Player(db.Model):
     # Card ID for RFID/card reader
     card_id = db.Column(db.String(50), nullable=True, unique=True)
 
+    # translit() of the full name, kept for the player_fts triggers (filled by _fill_name_columns)
+    name_translit = db.Column(db.String(200), nullable=True)
+    # name_sort_key() of each name, the players list / kiosk order (filled by _fill_name_columns)
+    first_name_key = db.Column(db.String(80), nullable=True)
+    last_name_key = db.Column(db.String(80), nullable=True)
+
+    # Name orders: binary for the exports, case-folded for the players list / kiosk keyset pagination
+    __table_args__ = (
+        db.Index("ix_player_name", "last_name", "first_name", "id"),
+        db.Index("ix_player_first_name", "first_name", "last_name", "id"),
+        db.Index("ix_player_name_key", "last_name_key", "first_name_key", "id"),
+        db.Index("ix_player_first_name_key", "first_name_key", "last_name_key", "id"),
+    )
+
     def full_name(self) -> str:
         return f"{self.first_name} {self.last_name}"
 
@@ -1872,7 +2313,11 @@ class Payment(db.Model):
 
     player = db.relationship("Player", primaryjoin="Player.id==foreign(Payment.player_id)", foreign_keys=[player_id], backref=db.backref("payments", lazy="dynamic"))
 
-    __table_args__ = (db.UniqueConstraint("player_id", "year", "month", name="uq_payment_player_month"),)
+    __table_args__ = (
+        db.UniqueConstraint("player_id", "year", "month", name="uq_payment_player_month"),
+        db.Index("ix_payment_pn_year_month_paid", "player_pn", "year", "month", "paid"),
+        db.Index("ix_payment_year_month", "year", "month"),
+    )
 
 
 # ---- Sports Calendar models ----
@@ -1917,6 +2362,8 @@ class EventRegistration(db.Model):
     paid = db.Column(db.Boolean, default=False)
     paid_on = db.Column(db.Date, nullable=True)
 
+    __table_args__ = (db.Index("ix_event_registration_pn_paid", "player_pn", "paid"),)
+
     player = db.relationship("Player", primaryjoin="Player.id==foreign(EventRegistration.player_id)", foreign_keys=[player_id], backref=db.backref("event_registrations", cascade="all, delete-orphan", lazy="dynamic"))
 
     # association objects (holds medal per category)
@@ -1974,6 +2421,8 @@ class PaymentRecord(db.Model):
     # Receipt & timestamps
     receipt_no = db.Column(db.String(40), unique=True, nullable=True)
     paid_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # paid_at bucketed as YYYYMM so month-scoped reports can use an index
+    paid_year_month = db.Column(db.Integer, nullable=True, index=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     # Relationships
@@ -1983,6 +2432,20 @@ class PaymentRecord(db.Model):
     related_receipt_id = db.Column(db.Integer, db.ForeignKey("payment_record.id"), nullable=True, index=True)
     related_receipt = db.relationship("PaymentRecord", remote_side=[id], backref="related_payments")
 
+    # Debt receipts (AUTO_DEBT for extra sessions); debt_status is 'open' or 'paid', None for other receipts
+    is_debt = db.Column(db.Boolean, nullable=False, default=False)
+    debt_status = db.Column(db.String(10), nullable=True)
+
+    # Content hash of rows brought in by the payments import (see payment_import_key); re-imports skip matches
+    import_key = db.Column(db.String(40), unique=True, index=True, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_payment_record_pn_kind_paid_at", "player_pn", "kind", "paid_at"),
+        db.Index("ix_payment_record_pn_kind_ym", "player_pn", "kind", "paid_year_month"),
+        db.Index("ix_payment_record_debt_status", "debt_status", "player_pn"),
+        db.Index("ix_payment_record_kind_year_month", "kind", "year", "month"),
+    )
+
     def assign_receipt_no(self, do_commit: bool = True):
         if not self.id:
             return
@@ -1996,6 +2459,121 @@ class Setting(db.Model):
     key = db.Column(db.String(50), primary_key=True)
     value = db.Column(db.String(500), nullable=True)
 
+# Rows linked by player_id only get their player_pn filled in on insert
+# (this used to be a backfill UPDATE on every boot)
+@event.listens_for(TrainingSession, "before_insert")
+@event.listens_for(Payment, "before_insert")
+@event.listens_for(EventRegistration, "before_insert")
+@event.listens_for(PaymentRecord, "before_insert")
+def _fill_player_pn(mapper, connection, target):
+    if target.player_pn is None and target.player_id is not None:
+        target.player_pn = connection.execute(
+            text("SELECT pn FROM player WHERE id = :id"), {"id": target.player_id}
+        ).scalar()
+
+def year_month_key(year: int, month: int) -> int:
+    """The PaymentRecord.paid_year_month value for a calendar month (2024, 3 -> 202403)."""
+    return year * 100 + month
+
+@event.listens_for(PaymentRecord, "before_insert")
+@event.listens_for(PaymentRecord, "before_update")
+def _fill_paid_year_month(mapper, connection, target):
+    if target.paid_at is None:
+        target.paid_at = datetime.utcnow()
+    target.paid_year_month = year_month_key(target.paid_at.year, target.paid_at.month)
+
+class PlayerMonthSummary(db.Model):
+    """Per player and month money rollup, kept in sync with the rows it is computed from.
+
+    Income columns bucket receipts by the month they were paid in; dues and session
+    counts use the month the fee or session belongs to. Unpaid event fees are not here:
+    registrations carry no month and are due as soon as they exist.
+    """
+    __tablename__ = "player_month_summary"
+    player_pn = db.Column(db.String(20), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Integer, primary_key=True)  # 1..12
+    monthly_amount = db.Column(db.Integer, nullable=False, default=0)  # EUR, Payment.amount
+    monthly_due = db.Column(db.Integer, nullable=False, default=0)     # EUR, unpaid Payment.amount
+    monthly_income = db.Column(db.Integer, nullable=False, default=0)  # EUR, training_month receipts
+    session_income = db.Column(db.Integer, nullable=False, default=0)  # EUR, training_session receipts
+    event_income = db.Column(db.Integer, nullable=False, default=0)    # EUR, event receipts
+    bulk_income = db.Column(db.Integer, nullable=False, default=0)     # EUR, bulk_payment receipts
+    sessions_taken = db.Column(db.Integer, nullable=False, default=0)
+    sessions_paid = db.Column(db.Integer, nullable=False, default=0)
+
+# Recomputes the rollup rows for the (pn, y, m) keys selected by {keys}
+PLAYER_MONTH_SUMMARY_UPSERT = """
+INSERT OR REPLACE INTO player_month_summary
+    (player_pn, year, month, monthly_amount, monthly_due, monthly_income, session_income,
+     event_income, bulk_income, sessions_taken, sessions_paid)
+SELECT k.pn, k.y, k.m,
+    COALESCE((SELECT SUM(amount) FROM payment WHERE player_pn = k.pn AND year = k.y AND month = k.m), 0),
+    COALESCE((SELECT SUM(amount) FROM payment WHERE player_pn = k.pn AND year = k.y AND month = k.m AND COALESCE(paid, 0) = 0), 0),
+    COALESCE((SELECT SUM(amount) FROM payment_record WHERE player_pn = k.pn AND kind = 'training_month' AND paid_year_month = k.y * 100 + k.m), 0),
+    COALESCE((SELECT SUM(amount) FROM payment_record WHERE player_pn = k.pn AND kind = 'training_session' AND paid_year_month = k.y * 100 + k.m), 0),
+    COALESCE((SELECT SUM(amount) FROM payment_record WHERE player_pn = k.pn AND kind = 'event' AND paid_year_month = k.y * 100 + k.m), 0),
+    COALESCE((SELECT SUM(amount) FROM payment_record WHERE player_pn = k.pn AND kind = 'bulk_payment' AND paid_year_month = k.y * 100 + k.m), 0),
+    (SELECT COUNT(*) FROM training_session WHERE player_pn = k.pn
+        AND date >= printf('%04d-%02d-01', k.y, k.m) AND date < date(printf('%04d-%02d-01', k.y, k.m), '+1 month')),
+    (SELECT COUNT(*) FROM training_session WHERE player_pn = k.pn AND COALESCE(paid, 0) = 1
+        AND date >= printf('%04d-%02d-01', k.y, k.m) AND date < date(printf('%04d-%02d-01', k.y, k.m), '+1 month'))
+FROM ({keys}) k
+"""
+
+PLAYER_MONTH_SUMMARY_ALL_KEYS = """
+SELECT player_pn AS pn, year AS y, month AS m FROM payment WHERE player_pn IS NOT NULL
+UNION SELECT player_pn, paid_year_month / 100, paid_year_month % 100 FROM payment_record
+    WHERE player_pn IS NOT NULL AND paid_year_month IS NOT NULL
+    AND kind IN ('training_month', 'training_session', 'event', 'bulk_payment')
+UNION SELECT player_pn, CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER)
+    FROM training_session WHERE player_pn IS NOT NULL
+"""
+
+def refresh_player_month_summary(conn, keys) -> None:
+    """Recompute the rollup rows for (player_pn, year, month) keys on conn, inside the caller's transaction."""
+    params = [{"pn": pn, "y": y, "m": m} for pn, y, m in set(keys) if pn and y and m]
+    if params:
+        conn.execute(text(PLAYER_MONTH_SUMMARY_UPSERT.format(keys="SELECT :pn AS pn, :y AS y, :m AS m")), params)
+
+def rebuild_player_month_summary(conn) -> int:
+    """Recompute the whole rollup from payments, receipts and sessions; returns the row count."""
+    conn.execute(text("DELETE FROM player_month_summary"))
+    conn.execute(text(PLAYER_MONTH_SUMMARY_UPSERT.format(keys=PLAYER_MONTH_SUMMARY_ALL_KEYS)))
+    return conn.execute(text("SELECT COUNT(*) FROM player_month_summary")).scalar()
+
+def _summary_keys(obj) -> set:
+    """Rollup keys obj counts towards, both before and after its pending change."""
+    state = inspect(obj)
+    def values(attr):
+        hist = state.attrs[attr].load_history()
+        return {v for v in (*hist.added, *hist.unchanged, *hist.deleted) if v is not None}
+    if isinstance(obj, TrainingSession):
+        months = {(d.year, d.month) for d in values("date")}
+    elif isinstance(obj, Payment):
+        months = {(y, m) for y in values("year") for m in values("month")}
+    else:
+        # paid_year_month is derived from paid_at during the flush, so its old value is never loaded
+        months = {(d.year, d.month) for d in values("paid_at")}
+    return {(pn, y, m) for pn in values("player_pn") for y, m in months}
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+# Load the replaced value when one of the key attributes is set on an expired object; otherwise
+# its history has no deleted value and the rollup row it moves away from is never refreshed
+for _attr in (TrainingSession.player_pn, TrainingSession.date, Payment.player_pn, Payment.year, Payment.month,
+              PaymentRecord.player_pn, PaymentRecord.paid_at):
+    event.listen(_attr, "set", _keep_old_value, active_history=True)
+
+@event.listens_for(db.session, "after_flush")
+def _refresh_month_summary(session, flush_context):
+    keys = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (TrainingSession, Payment, PaymentRecord)):
+            keys |= _summary_keys(obj)
+    refresh_player_month_summary(session.connection(), keys)
+
 # -----------------------------
 # Forms
 # -----------------------------
@@ -2124,105 +2702,222 @@ def set_language(lang_code: str):
 def index():
     return redirect(url_for("list_players"))
 
-@app.route("/players")
-def list_players():
-    q = request.args.get("q", "").strip()
-    belt = request.args.get("belt", "")
-    active = request.args.get("active", "")
-    month_str = request.args.get("month")
+@app.errorhandler(413)
+def upload_too_large(e):
+    flash(_("The uploaded file is too large."), "danger")
+    return redirect(request.referrer or url_for("index"))
 
-    query = Player.query
+# -------- Keyset pagination for the players list and kiosk ----------
+PLAYER_PAGE_SIZE = 50
+PLAYER_PAGE_MAX = 200
 
-    if q:
-        like = f"%{q}%"
-        query = query.filter(or_(Player.first_name.ilike(like), Player.last_name.ilike(like)))
+# Sort keys always end with Player.id so the keyset is unique; names sort by their case-folded keys
+PLAYER_SORTS = {
+    "name": ("last_name_key", "first_name_key", "id"),
+    "first_name": ("first_name_key", "last_name_key", "id"),
+}
+
+# -------- Player full-text search ----------
+# Bulgarian Streamlined System, so "ivan" finds "Иван"
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ж": "zh", "з": "z",
+    "и": "i", "й": "y", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "h", "ц": "ts", "ч": "ch",
+    "ш": "sh", "щ": "sht", "ъ": "a", "ь": "y", "ю": "yu", "я": "ya",
+}
+
+# Set at startup once the player_fts table is in place; search falls back to ILIKE otherwise
+PLAYER_FTS_ENABLED = False
+
+def translit(value: Optional[str]) -> str:
+    """Lower-case Latin transliteration of a (Bulgarian) Cyrillic string."""
+    return "".join(CYRILLIC_TO_LATIN.get(ch, ch) for ch in (value or "").lower())
+
+def player_name_translit(first_name: Optional[str], last_name: Optional[str]) -> str:
+    return translit(f"{first_name or ''} {last_name or ''}")
+
+def name_sort_key(name: Optional[str]) -> str:
+    """Case-insensitive sort key for a name. SQLite's NOCASE only folds ASCII, so Cyrillic is folded here."""
+    return (name or "").casefold()
+
+def player_name_columns(first_name: Optional[str], last_name: Optional[str]) -> dict:
+    """The player columns derived from the name; bulk writes skip the mapper events and fill them themselves."""
+    return {
+        "name_translit": player_name_translit(first_name, last_name),
+        "first_name_key": name_sort_key(first_name),
+        "last_name_key": name_sort_key(last_name),
+    }
+
+@event.listens_for(Player, "before_insert")
+@event.listens_for(Player, "before_update")
+def _fill_name_columns(mapper, connection, target):
+    for column, value in player_name_columns(target.first_name, target.last_name).items():
+        setattr(target, column, value)
 
+def player_fts_query(q: str, identifiers: bool = False) -> Optional[str]:
+    """
+    FTS5 MATCH expression for a search box value: every word must match as a prefix,
+    either as typed or transliterated. Without identifiers only the name columns are
+    searched, never pn / card_id.
+    """
+    terms = []
+    for word in re.findall(r"\w+", q):
+        variants = sorted({word.lower(), translit(word)})
+        term = "(" + " OR ".join(f'"{v}"*' for v in variants) + ")"
+        terms.append(term if identifiers else "{name name_translit} : " + term)
+    return " AND ".join(terms) or None
+
+def player_search_clause(q: str, identifiers: bool = False):
+    """
+    Filter clause matching players by name (FTS5 prefix search); with identifiers also by
+    PN or card ID. Only admin views may pass identifiers: the kiosk and the public players
+    list would otherwise let anyone recover PNs by trying prefixes.
+    """
+    match = player_fts_query(q, identifiers) if PLAYER_FTS_ENABLED else None
+    if match:
+        return Player.id.in_(text("SELECT rowid FROM player_fts WHERE player_fts MATCH :match").bindparams(match=match))
+    like = f"%{q}%"
+    return or_(Player.first_name.ilike(like), Player.last_name.ilike(like))
+
+def filter_players(query, q: str = "", belt: str = "", active: str = "", identifiers: bool = False):
+    """Apply the q/belt/active filters shared by the players list and the kiosk."""
+    if q:
+        query = query.filter(player_search_clause(q, identifiers))
     if belt:
         query = query.filter_by(belt_rank=belt)
-
     if active == "yes":
         query = query.filter_by(active_member=True)
     elif active == "no":
         query = query.filter_by(active_member=False)
+    return query
 
-    players = query.order_by(Player.last_name.asc(), Player.first_name.asc()).all()
+def encode_player_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
 
-    if month_str:
-        y, m = parse_month_str(month_str)
-    else:
-        t = date.today()
-        y, m = t.year, t.month
-    ensure_payments_for_month(y, m)
-    month_year = (y, m)
+def decode_player_cursor(cursor: Optional[str]) -> Optional[list]:
+    if not cursor:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    except Exception:
+        return None
+
+def player_keyset_page(query, sort: str = "name", direction: str = "asc",
+                       cursor: Optional[str] = None, limit: int = PLAYER_PAGE_SIZE) -> Tuple[list, Optional[str]]:
+    """
+    Return one page of players ordered by the sort key and the cursor for the next page
+    (None on the last page). The cursor holds the sort values of the last row, so each
+    page is a range scan instead of an OFFSET over the whole table.
+    """
+    fields = PLAYER_SORTS.get(sort, PLAYER_SORTS["name"])
+    cols = [getattr(Player, f) for f in fields]
+    descending = direction == "desc"
+    after = decode_player_cursor(cursor)
+    if after and len(after) == len(cols):
+        key, bound = tuple_(*cols), tuple_(*after)
+        query = query.filter(key < bound if descending else key > bound)
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in cols])
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_player_cursor([getattr(rows[-1], f) for f in fields])
+    return rows, next_cursor
+
+def page_limit_arg() -> int:
+    try:
+        return max(1, min(int(request.args.get("limit", PLAYER_PAGE_SIZE)), PLAYER_PAGE_MAX))
+    except (TypeError, ValueError):
+        return PLAYER_PAGE_SIZE
+
+def player_page_json(players: list, html: str, next_cursor: Optional[str]):
+    return jsonify({
+        "players": [{
+            "id": p.id,
+            "first_name": p.first_name,
+            "last_name": p.last_name,
+            "belt_rank": p.belt_rank,
+            "grade_level": p.grade_level,
+            "active_member": bool(p.active_member),
+        } for p in players],
+        "html": html,
+        "next_cursor": next_cursor,
+    })
+
+def attach_roster_stats(players: list, year: int, month: int) -> None:
+    """Attach per-player roster stats (sessions, owed amount, monthly due, debt flag).
+
+    Uses grouped queries keyed by player PN plus collect_player_debts(), so the cost
+    of the players list does not grow with the number of athletes.
+    """
+    session_counts = {
+        pn: (int(total or 0), int(paid or 0))
+        for pn, total, paid in (db.session.query(
+                TrainingSession.player_pn,
+                db.func.count(TrainingSession.id),
+                db.func.sum(db.case((TrainingSession.paid == True, 1), else_=0)))  # noqa: E712
+            .group_by(TrainingSession.player_pn)
+            .all())
+    }
+
+    month_dues = {}
+    for pn, amount, paid in (db.session.query(Payment.player_pn, Payment.amount, Payment.paid)
+                             .filter(Payment.year == year, Payment.month == month)
+                             .order_by(Payment.id.asc())
+                             .all()):
+        month_dues.setdefault(pn, (amount, paid))
+
+    debts = collect_player_debts(players, year, month)
 
     for p in players:
         # Health/insurance badges via helper for consistent UX
         p.med_text, p.med_color = validity_badge(p.medical_expiry_date)
         p.ins_text, p.ins_color = validity_badge(p.insurance_expiry_date)
 
-        sess_records = (PaymentRecord.query
-                        .filter_by(player_pn=p.pn, kind='training_session')
-                        .order_by(PaymentRecord.paid_at.desc())
-                        .all())
-
-        # exclude only true AUTO_DEBT (not MANUAL_OWED)
-        sess_receipts = [r for r in sess_records if not is_auto_debt_note(r.note)]
-
-        explicit_sessions_paid = sum((r.sessions_paid or 0) for r in sess_receipts)
-        total_prepaid_amount = sum((r.amount or 0) for r in sess_receipts)
-
-        # per-session price only from profile
-        per_session_price = None
-        if p.monthly_fee_amount is not None and not p.monthly_fee_is_monthly:
-            per_session_price = float(p.monthly_fee_amount)
-
-        # Use TrainingSession for per-session logic
-        all_sessions = TrainingSession.query.filter_by(player_pn=p.pn).all()
-        paid_sessions = [s for s in all_sessions if s.paid]
-        unpaid_sessions = [s for s in all_sessions if not s.paid]
-        p.total_sessions_taken = len(all_sessions)
-        p.total_sessions_paid = len(paid_sessions)
-        p.total_sessions_unpaid = len(unpaid_sessions)
+        taken, paid = session_counts.get(p.pn, (0, 0))
+        p.total_sessions_taken = taken
+        p.total_sessions_paid = paid
+        p.total_sessions_unpaid = taken - paid
         per_session_price = float(p.monthly_fee_amount) if p.monthly_fee_amount and not p.monthly_fee_is_monthly else None
         p.per_session_price = per_session_price
         p.owed_amount = int(round(p.total_sessions_unpaid * per_session_price)) if per_session_price else 0
 
-        # Ensure monthly_due_amount and monthly_due_paid are always set
-        if not hasattr(p, 'monthly_due_amount'):
-            p.monthly_due_amount = None
-        if not hasattr(p, 'monthly_due_paid'):
-            p.monthly_due_paid = None
-
-        # monthly dues (optional, skip if month_year not set)
         p.monthly_due_amount = None
         p.monthly_due_paid = None
-        if 'month_year' in locals() and month_year:
-            try:
-                yy, mm = month_year
-                pay_row = Payment.query.filter_by(player_pn=p.pn, year=yy, month=mm).first()
-                if pay_row:
-                    p.monthly_due_amount = pay_row.amount or 0
-                    p.monthly_due_paid = bool(pay_row.paid)
-            except Exception:
-                pass
+        if p.pn in month_dues:
+            amount, due_paid = month_dues[p.pn]
+            p.monthly_due_amount = amount or 0
+            p.monthly_due_paid = bool(due_paid)
 
         # Mark as having debt if session, monthly, or event debt exists
-        p.has_debt = False
-        if p.owed_amount > 0:
-            p.has_debt = True
-        if p.monthly_due_amount is not None and not p.monthly_due_paid and p.monthly_due_amount > 0:
-            p.has_debt = True
-        # Check for unpaid event registrations with a fee
-        unpaid_regs = EventRegistration.query.filter_by(player_pn=p.pn, paid=False).all()
-        for reg in unpaid_regs:
-            fee = reg.fee_override if reg.fee_override is not None else reg.computed_fee()
-            if fee and fee > 0:
-                p.has_debt = True
-                break
+        player_debts = debts[p.id]
+        p.has_debt = (
+            bool(player_debts["sessions"] and player_debts["sessions"]["amount"] > 0)
+            or any(pay["amount"] > 0 for pay in player_debts["monthly"])
+            or any(reg["fee"] and reg["fee"] > 0 for reg in player_debts["events"])
+        )
+
+@app.route("/players")
+def list_players():
+    q = request.args.get("q", "").strip()
+    belt = request.args.get("belt", "")
+    active = request.args.get("active", "")
+    month_str = request.args.get("month")
+    sort = request.args.get("sort", "name")
+    direction = request.args.get("dir", "asc")
+
+    # Only the first page is rendered; the rest is fetched from players_page_json
+    players, next_cursor = player_keyset_page(
+        filter_players(Player.query, q, belt, active, identifiers=bool(session.get("is_admin"))),
+        sort, direction, limit=page_limit_arg())
+
+    y, m = parse_month_str(month_str)
+    attach_roster_stats(players, y, m)
 
     return render_template(
         "players_list.html",
         players=players, q=q, belt=belt, active=active,
+        month=month_str, sort=sort, direction=direction, next_cursor=next_cursor,
         belts=GRADING_SCHEME["belt_colors"]
     )
     regs = (EventRegistration.query
@@ -2236,16 +2931,27 @@ def list_players():
         regs=regs,
     )
 
+@app.route("/players/page.json")
+def players_page_json():
+    """Next page of the players list (keyset cursor), as JSON with the rendered table rows."""
+    q = request.args.get("q", "").strip()
+    belt = request.args.get("belt", "")
+    active = request.args.get("active", "")
+    players, next_cursor = player_keyset_page(
+        filter_players(Player.query, q, belt, active, identifiers=bool(session.get("is_admin"))),
+        request.args.get("sort", "name"), request.args.get("dir", "asc"),
+        request.args.get("cursor"), page_limit_arg())
+    y, m = parse_month_str(request.args.get("month"))
+    attach_roster_stats(players, y, m)
+    html = render_template("_players_rows.html", players=players)
+    return player_page_json(players, html, next_cursor)
+
 @app.route("/players/<int:player_id>")
 def player_detail(player_id: int):
     if not session.get('is_admin'):
         abort(403)
     player = Player.query.get_or_404(player_id)
     today = date.today()
-    try:
-        ensure_payments_for_month(today.year, today.month)
-    except Exception:
-        pass
 
     # Use player PN when available, otherwise fall back to player_id for legacy rows
     pay_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
@@ -2318,28 +3024,76 @@ def uploaded_file(filename):
 
     return send_from_directory(app.config["UPLOAD_FOLDER"], filename, as_attachment=False)
 
+# -------- Streaming ZIP ----------
+class ZipSink:
+    """Write-only, unseekable file object for zipfile; the bytes are handed on with drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_zip(entries):
+    """Yield a ZIP archive entry by entry from (arcname, content) pairs.
+
+    content is str/bytes, or a path to a file on disk (e.g. an uploaded photo), which is
+    copied in chunks and stored uncompressed. Only the current entry is held in memory;
+    zipfile writes data descriptors because the sink cannot seek.
+    """
+    import zipfile
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for arcname, content in entries:
+            if isinstance(content, os.PathLike):
+                zf.write(content, arcname, compress_type=zipfile.ZIP_STORED)
+            else:
+                zf.writestr(arcname, content)
+            yield sink.drain()
+    yield sink.drain()
+
+def zip_response(entries, filename: str) -> Response:
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    return Response(stream_with_context(stream_zip(entries)), mimetype='application/zip', headers=headers)
+
+def wants_photos() -> bool:
+    return request.args.get('photos') == '1'
+
+def player_photo_path(player) -> Optional[pathlib.Path]:
+    """The player's uploaded photo on disk, if it exists."""
+    if not player.photo_filename:
+        return None
+    path = pathlib.Path(app.config["UPLOAD_FOLDER"]) / os.path.basename(player.photo_filename)
+    return path if path.is_file() else None
+
 # -------- Player CSV Export (Single) ----------
-@app.route("/players/<int:player_id>/export_csv")
-def export_player_csv(player_id):
-    if not session.get('is_admin'):
-        abort(403)
+PLAYER_EXPORT_FIELDS = [
+    'id', 'first_name', 'last_name', 'gender', 'birthdate', 'pn',
+    'belt_rank', 'grade_level', 'grade_date', 'discipline', 'weight_kg', 'height_cm',
+    'email', 'phone', 'join_date', 'active_member', 'notes', 'photo_filename',
+    'sportdata_wkf_url', 'sportdata_bnfk_url', 'sportdata_enso_url',
+    'medical_exam_date', 'medical_expiry_date', 'insurance_expiry_date',
+    'monthly_fee_amount', 'monthly_fee_is_monthly',
+    'mother_name', 'mother_phone', 'father_name', 'father_phone'
+]
+
+def player_profile_csv(player) -> str:
+    """One player's profile as a two-line CSV (header + row), as used by all player exports."""
     import csv
     from io import StringIO
-    player = Player.query.get_or_404(player_id)
-    # Collect all Player fields for CSV
-    fieldnames = [
-        'id', 'first_name', 'last_name', 'gender', 'birthdate', 'pn',
-        'belt_rank', 'grade_level', 'grade_date', 'discipline', 'weight_kg', 'height_cm',
-        'email', 'phone', 'join_date', 'active_member', 'notes', 'photo_filename',
-        'sportdata_wkf_url', 'sportdata_bnfk_url', 'sportdata_enso_url',
-        'medical_exam_date', 'medical_expiry_date', 'insurance_expiry_date',
-        'monthly_fee_amount', 'monthly_fee_is_monthly',
-        'mother_name', 'mother_phone', 'father_name', 'father_phone'
-    ]
     output = StringIO()
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
+    writer = csv.DictWriter(output, fieldnames=PLAYER_EXPORT_FIELDS)
     writer.writeheader()
-    row = {k: getattr(player, k, '') for k in fieldnames}
+    row = {k: getattr(player, k, '') for k in PLAYER_EXPORT_FIELDS}
     # Convert dates and booleans to string
     for k, v in row.items():
         if hasattr(v, 'isoformat'):
@@ -2347,7 +3101,13 @@ def export_player_csv(player_id):
         elif isinstance(v, bool):
             row[k] = str(v)
     writer.writerow(row)
-    output.seek(0)
+    return output.getvalue()
+
+@app.route("/players/<int:player_id>/export_csv")
+def export_player_csv(player_id):
+    if not session.get('is_admin'):
+        abort(403)
+    player = Player.query.get_or_404(player_id)
     # Use ASCII-only fallback for filename, but provide UTF-8 version for browsers that support it
     ascii_filename = f"player_{player.id}.csv"
     utf8_filename = f"player_{player.id}_{player.last_name}.csv"
@@ -2355,7 +3115,7 @@ def export_player_csv(player_id):
         'Content-Disposition': f'attachment; filename="{ascii_filename}"; filename*=UTF-8''{utf8_filename}'
     }
     return Response(
-        output.getvalue(),
+        player_profile_csv(player),
         mimetype='text/csv; charset=utf-8',
         headers=headers
     )
@@ -2363,45 +3123,20 @@ def export_player_csv(player_id):
 # -------- Bulk Player CSV Export (ZIP) ----------
 @app.route("/players/export_zip", endpoint="export_players_zip")
 def export_players_zip():
+    """All player profiles as per-player CSVs, streamed; ?photos=1 adds the uploaded photos."""
     if not session.get('is_admin'):
         abort(403)
-    import csv
-    from io import StringIO, BytesIO
-    import zipfile
-    players = Player.query.order_by(Player.last_name.asc(), Player.first_name.asc()).all()
-    fieldnames = [
-        'id', 'first_name', 'last_name', 'gender', 'birthdate', 'pn',
-        'belt_rank', 'grade_level', 'grade_date', 'discipline', 'weight_kg', 'height_cm',
-        'email', 'phone', 'join_date', 'active_member', 'notes', 'photo_filename',
-        'sportdata_wkf_url', 'sportdata_bnfk_url', 'sportdata_enso_url',
-        'medical_exam_date', 'medical_expiry_date', 'insurance_expiry_date',
-        'monthly_fee_amount', 'monthly_fee_is_monthly',
-        'mother_name', 'mother_phone', 'father_name', 'father_phone'
-    ]
-    mem_zip = BytesIO()
-    with zipfile.ZipFile(mem_zip, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
+    photos = wants_photos()
+
+    def entries():
+        players = Player.query.order_by(Player.last_name.asc(), Player.first_name.asc()).all()
         for player in players:
-            output = StringIO()
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            row = {k: getattr(player, k, '') for k in fieldnames}
-            for k, v in row.items():
-                if hasattr(v, 'isoformat'):
-                    row[k] = v.isoformat()
-                elif isinstance(v, bool):
-                    row[k] = str(v)
-            writer.writerow(row)
-            output.seek(0)
-            filename = f"player_{player.id}_{player.last_name}.csv"
-            zf.writestr(filename, output.getvalue())
-    mem_zip.seek(0)
-    return Response(
-        mem_zip.getvalue(),
-        mimetype='application/zip',
-        headers={
-            'Content-Disposition': 'attachment; filename=players_profiles.zip'
-        }
-    )
+            yield f"player_{player.id}_{player.last_name}.csv", player_profile_csv(player)
+            photo = player_photo_path(player) if photos else None
+            if photo:
+                yield f"photos/{photo.name}", photo
+
+    return zip_response(entries(), "players_profiles.zip")
 
 # -------- Auth ----------
 @app.route("/login", methods=["GET", "POST"])
@@ -2456,6 +3191,274 @@ def logout():
 def help_page():
     return render_template("help.html", _=_ , current_lang=get_lang())
 
+# -------- Check-in journal ----------
+class CheckinSpool:
+    """
+    Append-only journal of check-ins. append() fsyncs one JSON line and returns, so a
+    check-in survives a busy database or a crash; the flusher thread batch-inserts pending
+    entries with INSERT OR IGNORE (idempotent on uq_player_session_date) and then drops
+    them from the journal. Entries left in the file are replayed at startup.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()  # the flusher thread and record_session may both flush
+
+    def replay(self) -> int:
+        """Load entries left in the journal by a previous run; a torn last line is skipped."""
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        app.logger.warning("Skipping unreadable check-in journal line: %r", line)
+        with self._lock:
+            self._pending = entries + self._pending
+        if entries:
+            card_index.invalidate_checkins()
+            self._wake.set()
+        return len(entries)
+
+    def append(self, player_id: int, player_pn: Optional[str], day: date, paid: bool) -> dict:
+        now = datetime.now()
+        entry = {
+            "session_id": f"{player_id}_{day.strftime('%Y%m%d')}_{now.strftime('%H%M%S%f')}",
+            "player_id": player_id,
+            "player_pn": player_pn,
+            "date": day.isoformat(),
+            "paid": bool(paid),
+            "created_at": now.isoformat(),
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.append(entry)
+        self._wake.set()
+        return entry
+
+    def pending_pns(self, day: date) -> set:
+        with self._lock:
+            return {e["player_pn"] for e in self._pending if e["date"] == day.isoformat()}
+
+    def flush(self) -> int:
+        """Insert pending entries in one transaction, then compact the journal. Call inside an app context."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            batch = list(self._pending)
+        if not batch:
+            return 0
+        rows = [{
+            "session_id": e["session_id"],
+            "player_id": e["player_id"],
+            "player_pn": e["player_pn"],
+            "date": date.fromisoformat(e["date"]),
+            "paid": e["paid"],
+            "created_at": datetime.fromisoformat(e["created_at"]),
+        } for e in batch]
+        try:
+            db.session.execute(TrainingSession.__table__.insert().prefix_with("OR IGNORE"), rows)
+            refresh_player_month_summary(db.session.connection(),
+                                         [(r["player_pn"], r["date"].year, r["date"].month) for r in rows])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        with self._lock:
+            # Only appends happen meanwhile, so the flushed entries are the head of the list
+            self._pending = self._pending[len(batch):]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for e in self._pending:
+                    f.write(json.dumps(e) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        return len(batch)
+
+    def run(self) -> None:
+        failures = 0
+        while True:
+            self._wake.wait(CHECKIN_FLUSH_SECONDS)
+            self._wake.clear()
+            try:
+                with app.app_context():
+                    self.flush()
+                failures = 0
+            except Exception:
+                failures += 1
+                app.logger.exception("Check-in flush failed, keeping entries in the journal")
+                time.sleep(min(30, 2 ** failures))
+
+checkin_spool = CheckinSpool(CHECKIN_SPOOL_PATH)
+
+def start_checkin_flusher():
+    thread = threading.Thread(target=checkin_spool.run, daemon=True)
+    thread.start()
+
+def spool_checkin(player_id: int, player_pn: Optional[str], paid: bool) -> dict:
+    """Journal today's check-in for a player and mark them as checked in."""
+    today = date.today()
+    entry = checkin_spool.append(player_id, player_pn, today, paid)
+    card_index.mark_checked_in(player_pn, today)
+    return entry
+
+# -------- Card swipe index ----------
+class CardIndex:
+    """
+    In-process card_id -> player snapshot plus the PNs already checked in today, so a kiosk
+    swipe needs no lookups before the insert. Player writes drop the snapshot once committed and
+    session writes update the day set once committed, or drop it (see the events below); both reload lazily.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()  # mapper events may fire during a reload (autoflush)
+        self._cards = None
+        self._checked_in = None
+        self._day = None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._cards = None
+
+    def invalidate_checkins(self) -> None:
+        with self._lock:
+            self._checked_in = None
+
+    def load(self) -> None:
+        """(Re)build both maps; call inside an app context."""
+        with self._lock:
+            self._load_cards()
+            self._load_checkins(date.today())
+
+    def _load_cards(self) -> None:
+        rows = (db.session.query(Player.id, Player.pn, Player.card_id, Player.first_name, Player.last_name,
+                                 Player.belt_rank, Player.active_member, Player.monthly_fee_is_monthly)
+                .filter(Player.card_id.isnot(None), Player.card_id != '')
+                .all())
+        self._cards = {r.card_id: {
+            "id": r.id, "pn": r.pn, "first_name": r.first_name, "last_name": r.last_name,
+            "belt_rank": r.belt_rank, "active": bool(r.active_member), "monthly": bool(r.monthly_fee_is_monthly),
+        } for r in rows}
+
+    def _load_checkins(self, day: date) -> None:
+        self._checked_in = {pn for (pn,) in db.session.query(TrainingSession.player_pn).filter(TrainingSession.date == day)}
+        # Journaled check-ins not yet flushed count as well
+        self._checked_in |= checkin_spool.pending_pns(day)
+        self._day = day
+
+    def lookup(self, card_id: str) -> Optional[dict]:
+        with self._lock:
+            if self._cards is None:
+                self._load_cards()
+            return self._cards.get(card_id)
+
+    def checked_in(self, pn: Optional[str], day: date) -> bool:
+        with self._lock:
+            if self._checked_in is None or self._day != day:
+                self._load_checkins(day)
+            return pn in self._checked_in
+
+    def mark_checked_in(self, pn: Optional[str], day: date) -> None:
+        with self._lock:
+            if self._checked_in is not None and self._day == day:
+                self._checked_in.add(pn)
+
+card_index = CardIndex()
+
+@event.listens_for(Player, "after_insert")
+@event.listens_for(Player, "after_update")
+@event.listens_for(Player, "after_delete")
+def _player_changed(mapper, connection, target):
+    # Dropped once the write commits: dropped now, another request could reload the old rows
+    # before the commit and keep serving them
+    session = object_session(target)
+    if session is not None:
+        session.info["cards_changed"] = True
+
+@event.listens_for(db.session, "after_commit")
+def _apply_player_changes(session):
+    if session.info.pop("cards_changed", False):
+        card_index.invalidate()
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_player_changes(session):
+    if session.info.pop("cards_changed", False):
+        # A reload inside the transaction may have seen the uncommitted rows
+        card_index.invalidate()
+
+@event.listens_for(TrainingSession, "after_insert")
+def _session_inserted(mapper, connection, target):
+    # Held on the session until the insert commits, so a rolled-back check-in never blocks a retry
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("checked_in", set()).add((target.player_pn, target.date))
+
+@event.listens_for(db.session, "after_commit")
+def _apply_checkins(session):
+    for pn, day in session.info.pop("checked_in", ()):
+        card_index.mark_checked_in(pn, day)
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_checkins(session):
+    if session.info.pop("checked_in", None):
+        # A reload inside the transaction may have seen the uncommitted rows
+        card_index.invalidate_checkins()
+
+@event.listens_for(TrainingSession, "after_update")
+@event.listens_for(TrainingSession, "after_delete")
+def _session_changed(mapper, connection, target):
+    card_index.invalidate_checkins()
+
+@event.listens_for(db.session, "do_orm_execute")
+def _bulk_write(orm_execute_state):
+    # Query.update()/delete() and bulk inserts skip the mapper events above
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ is Player:
+        orm_execute_state.session.info["cards_changed"] = True
+    elif mapper is not None and mapper.class_ is TrainingSession:
+        card_index.invalidate_checkins()
+
+def _rollup_key_rows(conn, model, criterion) -> list:
+    """(id, (player_pn, year, month)) for the rows of model matching criterion, bucketed as the rollup does."""
+    if model is TrainingSession:
+        cols, month = (TrainingSession.date,), lambda d: (d.year, d.month)
+    elif model is Payment:
+        cols, month = (Payment.year, Payment.month), lambda y, m: (y, m)
+    else:
+        cols, month = (PaymentRecord.paid_year_month,), lambda ym: divmod(ym, 100) if ym else (None, None)
+    rows = conn.execute(db.select(model.id, model.player_pn, *cols).where(criterion)).all()
+    return [(row[0], (row[1], *month(*row[2:]))) for row in rows]
+
+@event.listens_for(db.session, "do_orm_execute")
+def _bulk_write_month_summary(orm_execute_state):
+    # Query.update()/delete() skip the flush: refresh the keys of the rows they touch, before and after
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in (TrainingSession, Payment, PaymentRecord):
+        return
+    model = mapper.class_
+    conn = orm_execute_state.session.connection()
+    where = orm_execute_state.statement.whereclause
+    before = _rollup_key_rows(conn, model, where if where is not None else true())
+    result = orm_execute_state.invoke_statement()
+    keys = {key for _id, key in before}
+    if orm_execute_state.is_update and before:
+        # The update may move rows out of its own criteria (a PN change), so re-read them by id
+        keys |= {key for _id, key in _rollup_key_rows(conn, model, model.id.in_([i for i, _key in before]))}
+    refresh_player_month_summary(conn, keys)
+    return result
+
 @app.route("/kiosk")
 def kiosk():
     """Kiosk mode: Public player list for session recording without admin login."""
@@ -2463,37 +3466,51 @@ def kiosk():
     belt = request.args.get("belt", "")
     active = request.args.get("active", "")
 
-    query = Player.query.filter_by(active_member=True)  # Only show active members
+    sort = request.args.get("sort", "first_name")
+    direction = request.args.get("dir", "asc")
 
-    if q:
-        like = f"%{q}%"
-        query = query.filter(or_(Player.first_name.ilike(like), Player.last_name.ilike(like)))
-
-    if belt:
-        query = query.filter_by(belt_rank=belt)
-
-    players = query.all()
-    # Sort by full name alphabetically (first name + last name)
-    players.sort(key=lambda p: (p.first_name + ' ' + p.last_name).lower())
+    # Only show active members; the first page is rendered, the rest comes from kiosk_page_json
+    query = filter_players(Player.query.filter_by(active_member=True), q, belt)
+    players, next_cursor = player_keyset_page(query, sort, direction, limit=page_limit_arg())
 
     # Get belt colors for display
-    belt_colors = {}
-    for p in players:
-        belt_colors[p.id] = BELT_PALETTE.get(p.belt_rank, "#f8f9fa")
+    belt_colors = {p.id: BELT_PALETTE.get(p.belt_rank, "#f8f9fa") for p in players}
+
+    return render_template("kiosk.html", players=players, belt_colors=belt_colors, q=q, belt=belt, active=active,
+                           sort=sort, direction=direction, next_cursor=next_cursor, card_scan_seq=card_scans.seq)
 
-    return render_template("kiosk.html", players=players, belt_colors=belt_colors, q=q, belt=belt, active=active)
+@app.route("/kiosk/page.json")
+def kiosk_page_json():
+    """Next page of kiosk player cards (keyset cursor), as JSON with the rendered cards."""
+    q = request.args.get("q", "").strip()
+    belt = request.args.get("belt", "")
+    query = filter_players(Player.query.filter_by(active_member=True), q, belt)
+    players, next_cursor = player_keyset_page(
+        query, request.args.get("sort", "first_name"), request.args.get("dir", "asc"),
+        request.args.get("cursor"), page_limit_arg())
+    belt_colors = {p.id: BELT_PALETTE.get(p.belt_rank, "#f8f9fa") for p in players}
+    html = render_template("_kiosk_cards.html", players=players, belt_colors=belt_colors)
+    return player_page_json(players, html, next_cursor)
 
 @app.route("/screensaver")
 def screensaver():
     """Screensaver mode: Blank screen for kiosk inactivity."""
-    return render_template("screensaver.html")
+    return render_template("screensaver.html", card_scan_seq=card_scans.seq)
 
 @app.route("/card_status")
 def card_status():
-    global last_card_id
-    card_id = last_card_id
-    last_card_id = None
-    return jsonify({'card_id': card_id})
+    """
+    Card scans after the client's cursor (?after=<seq>). Every client keeps its own cursor
+    (the returned seq), so each scan reaches every open page once. card_id is the latest scan.
+    """
+    scans, seq = card_scans.since(request.args.get('after', type=int))
+    return jsonify({'seq': seq, 'scans': scans, 'card_id': scans[-1]['card_id'] if scans else None})
+
+@app.route("/admin/card_reader/status")
+@admin_required
+def card_reader_status():
+    """Card reader health: each known reader's connection state, scan count, last error and retry time."""
+    return jsonify(dict(card_reader.status(), seq=card_scans.seq))
 
 @app.route("/kiosk/record_session", methods=["POST"])
 def kiosk_record_session():
@@ -2529,23 +3546,17 @@ def kiosk_record_session():
     
     # Check if session already recorded today
     today = date.today()
-    existing = TrainingSession.query.filter_by(player_pn=player.pn, date=today).first()
-    if existing:
+    if card_index.checked_in(player.pn, today):
         flash(_("Session for today already recorded for {name}.").format(name=f"{player.first_name} {player.last_name}"), "info")
         return redirect(url_for("kiosk"))
     
     # For monthly payers, mark as paid since they pay monthly
     is_paid = player.monthly_fee_is_monthly
     
-    session_id = f"{player.id}_{today.strftime('%Y%m%d')}_{datetime.now().strftime('%H%M%S%f')}"
-    ts = TrainingSession(player_id=player.id, player_pn=player.pn, date=today, session_id=session_id, paid=is_paid, created_at=datetime.now())
-    db.session.add(ts)
-    
     try:
-        db.session.commit()
+        spool_checkin(player.id, player.pn, is_paid)
         flash(_("Welcome {name}! Your training session has been recorded successfully. Keep up the great work!").format(name=player.first_name), "success")
     except Exception:
-        db.session.rollback()
         app.logger.exception('Failed to record TrainingSession from kiosk')
         flash(_("Session recording failed. Please try again."), "danger")
     
@@ -2559,40 +3570,152 @@ def kiosk_record_session_card():
     if not card_id:
         return {"success": False, "message": "No card ID provided"}, 400
     
-    # Find player by card_id
-    player = Player.query.filter_by(card_id=card_id).first()
+    # Find player by card_id (in-memory index, no query)
+    player = card_index.lookup(card_id)
     if not player:
         return {"success": False, "message": "Card not recognized. Please register your card first."}, 404
     
-    if not player.active_member:
+    if not player["active"]:
         return {"success": False, "message": "Player account is not active."}, 403
     
     # Check if session already recorded today
     today = date.today()
-    existing = TrainingSession.query.filter_by(player_pn=player.pn, date=today).first()
-    if existing:
-        return {"success": False, "message": f"Session for today already recorded for {player.first_name} {player.last_name}."}, 409
+    if card_index.checked_in(player["pn"], today):
+        return {"success": False, "message": f"Session for today already recorded for {player['first_name']} {player['last_name']}."}, 409
     
     # For monthly payers, mark as paid since they pay monthly
-    is_paid = player.monthly_fee_is_monthly
-    
-    session_id = f"{player.id}_{today.strftime('%Y%m%d')}_{datetime.now().strftime('%H%M%S%f')}"
-    ts = TrainingSession(player_id=player.id, player_pn=player.pn, date=today, session_id=session_id, paid=is_paid, created_at=datetime.now())
-    db.session.add(ts)
+    is_paid = player["monthly"]
     
     try:
-        db.session.commit()
+        spool_checkin(player["id"], player["pn"], is_paid)
         return {
             "success": True, 
-            "message": f"Welcome {player.first_name}! Your training session has been recorded successfully. Keep up the great work!",
-            "player_name": f"{player.first_name} {player.last_name}",
-            "belt_rank": player.belt_rank or "No Belt"
+            "message": f"Welcome {player['first_name']}! Your training session has been recorded successfully. Keep up the great work!",
+            "player_name": f"{player['first_name']} {player['last_name']}",
+            "belt_rank": player["belt_rank"] or "No Belt"
         }, 200
     except Exception:
-        db.session.rollback()
         app.logger.exception('Failed to record TrainingSession from card scan')
         return {"success": False, "message": "Session recording failed. Please try again."}, 500
 
+# -------- Player import engine ----------
+PLAYER_IMPORT_FIELDS = [f for f in PLAYER_EXPORT_FIELDS if f not in ('id', 'pn')]
+PLAYER_IMPORT_DATES = {'birthdate', 'grade_date', 'join_date', 'medical_exam_date', 'medical_expiry_date', 'insurance_expiry_date'}
+PLAYER_IMPORT_INTS = {'weight_kg', 'height_cm', 'monthly_fee_amount'}
+PLAYER_IMPORT_BOOLS = {'active_member', 'monthly_fee_is_monthly'}
+PLAYER_IMPORT_DEFAULTS = {'belt_rank': 'White', 'discipline': 'All', 'active_member': True, 'monthly_fee_is_monthly': True}
+
+def parse_import_date(value: str) -> Optional[date]:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        for fmt in ('%d.%m.%Y', '%d/%m/%Y'):
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                pass
+    return None
+
+def player_import_values(row: dict) -> dict:
+    """Player column values from one import row (export column names, any case); blank or unparsable cells are left out."""
+    norm = {k.strip().lower(): v.strip() for k, v in row.items() if k and isinstance(v, str)}
+    values = {}
+    for field in ('pn', *PLAYER_IMPORT_FIELDS):
+        raw = norm.get(field)
+        if not raw:
+            continue
+        if field in PLAYER_IMPORT_DATES:
+            value = parse_import_date(raw)
+        elif field in PLAYER_IMPORT_INTS:
+            try:
+                value = int(float(raw))
+            except (ValueError, OverflowError):
+                value = None
+        elif field in PLAYER_IMPORT_BOOLS:
+            value = raw.lower() in ('1', 'true', 'yes', 'y')
+        else:
+            value = raw
+        if value is not None:
+            values[field] = value
+    # Prefer an explicit belt_rank, otherwise infer it from the grade
+    grade_to_color = GRADING_SCHEME.get('grade_to_color', {})
+    if 'belt_rank' not in values and values.get('grade_level') in grade_to_color:
+        values['belt_rank'] = grade_to_color[values['grade_level']]
+    return values
+
+def free_player_ids():
+    """Unused player ids in increasing order (fills gaps), in a single pass over the taken ones."""
+    used = {pid for (pid,) in db.session.query(Player.id)}
+    i = 0
+    while True:
+        i += 1
+        if i not in used:
+            yield i
+
+class PlayerImportPlan:
+    """An import file resolved against the database before anything is written.
+
+    All rows are parsed and validated first and matched to existing players by PN in one
+    query. Rows for existing players become updates of the changed fields (or are skipped
+    when update_existing is off); the rest become inserts. apply() writes both with
+    executemany; the caller commits, or renders the plan as a dry-run preview instead.
+    """
+
+    def __init__(self, rows, update_existing: bool = True, fill_id_gaps: bool = False):
+        self.creates = []    # column dicts for new players
+        self.updates = []    # (player, {field: (old, new)})
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors = []
+
+        parsed = {}
+        for where, row in rows:
+            values = player_import_values(row)
+            if not (values.get('first_name') and values.get('last_name')):
+                self.errors.append(f"{where}: missing first_name/last_name")
+            elif not re.match(r'^\d{10}$', values.get('pn', '')):
+                self.errors.append(f"{where}: invalid or missing PN (must be exactly 10 digits): '{values.get('pn', '')}'")
+            elif values['pn'] in parsed:
+                self.errors.append(f"{where}: duplicate PN {values['pn']} in file")
+            else:
+                parsed[values['pn']] = values
+
+        existing = {p.pn: p for p in Player.query.filter(Player.pn.in_(parsed))} if parsed else {}
+        ids = free_player_ids() if fill_id_gaps else None
+        blank = {f: None for f in PLAYER_IMPORT_FIELDS}
+        for pn, values in parsed.items():
+            player = existing.get(pn)
+            if player is None:
+                new = {**blank, **PLAYER_IMPORT_DEFAULTS, **values}
+                if ids is not None:
+                    new['id'] = next(ids)
+                self.creates.append(new)
+            elif not update_existing:
+                self.skipped += 1
+            else:
+                changes = {f: (getattr(player, f), v) for f, v in values.items() if f != 'pn' and getattr(player, f) != v}
+                if changes:
+                    self.updates.append((player, changes))
+                else:
+                    self.unchanged += 1
+
+    def apply(self) -> None:
+        # Bulk writes skip the mapper events, so the name columns are filled in here
+        if self.creates:
+            db.session.execute(insert(Player), [
+                {**new, **player_name_columns(new['first_name'], new['last_name'])}
+                for new in self.creates
+            ])
+        if self.updates:
+            rows = []
+            for player, changes in self.updates:
+                row = {'id': player.id, **{f: new for f, (old, new) in changes.items()}}
+                if 'first_name' in changes or 'last_name' in changes:
+                    row.update(player_name_columns(row.get('first_name', player.first_name),
+                                                   row.get('last_name', player.last_name)))
+                rows.append(row)
+            db.session.execute(update(Player), rows)
+
 # -------- CRUD Players ----------
 @app.route("/admin/players/import_csv", methods=["POST"], endpoint='admin_players_import_csv')
 @admin_required
@@ -2600,7 +3723,8 @@ def admin_players_import_csv():
     """Admin: import players from uploaded CSV file.
 
     Expected headers: first_name,last_name,gender,birthdate,pn,grade_level,join_date,
-    email,phone,monthly_fee_amount,monthly_fee_is_monthly
+    email,phone,monthly_fee_amount,monthly_fee_is_monthly (any player export column is accepted).
+    Players whose PN already exists are updated; with dry_run the changes are only previewed.
     """
     if 'csv_file' not in request.files:
         flash(_('No file uploaded.'), 'danger')
@@ -2617,117 +3741,28 @@ def admin_players_import_csv():
 
     import csv
     import io
-    import datetime
 
     text_stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', errors='replace')
     reader = csv.DictReader(text_stream)
-    created = 0
-    errors = []
-    for idx, row in enumerate(reader, start=1):
-        try:
-            first_name = (row.get('first_name') or '').strip()
-            last_name = (row.get('last_name') or '').strip()
-            if not first_name or not last_name:
-                errors.append(f"Row {idx}: missing first_name/last_name")
-                continue
-
-            def get(k):
-                return (row.get(k) or '').strip() or None
-
-            player = Player(first_name=first_name, last_name=last_name)
-            player.gender = get('gender')
-            player.pn = (get('pn') or '')
-            # Validate PN: must be exactly 10 digits
-            if not re.match(r'^\d{10}$', player.pn):
-                errors.append(f"Row {idx}: invalid or missing PN (must be exactly 10 digits): '{player.pn}'")
-                continue
-            player.email = get('email')
-            player.phone = get('phone')
-            player.grade_level = get('grade_level')
-
-            def parse_date(s):
-                if not s:
-                    return None
-                s = s.strip()
-                try:
-                    return datetime.date.fromisoformat(s)
-                except Exception:
-                    for fmt in ('%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d'):
-                        try:
-                            return datetime.datetime.strptime(s, fmt).date()
-                        except Exception:
-                            pass
-                return None
-
-            player.birthdate = parse_date(get('birthdate'))
-            player.join_date = parse_date(get('join_date'))
-
-            # Medical / insurance dates
-            player.medical_exam_date = parse_date(get('medical_exam_date'))
-            player.medical_expiry_date = parse_date(get('medical_expiry_date'))
-            player.insurance_expiry_date = parse_date(get('insurance_expiry_date'))
-
-            # Active member flag
-            am = get('active_member')
-            if am is not None:
-                player.active_member = str(am).lower() in ('1', 'true', 'yes', 'y')
-
-            # Misc fields
-            player.notes = get('notes')
-            player.photo_filename = get('photo_filename')
-            player.sportdata_wkf_url = get('sportdata_wkf_url')
-            player.sportdata_bnfk_url = get('sportdata_bnfk_url')
-            player.sportdata_enso_url = get('sportdata_enso_url')
-            try:
-                player.weight_kg = int(get('weight_kg')) if get('weight_kg') else None
-            except Exception:
-                player.weight_kg = None
-            try:
-                player.height_cm = int(get('height_cm')) if get('height_cm') else None
-            except Exception:
-                player.height_cm = None
-
-            player.discipline = get('discipline') or player.discipline
-
-            # Parent contacts
-            player.mother_name = get('mother_name')
-            player.mother_phone = get('mother_phone')
-            player.father_name = get('father_name')
-            player.father_phone = get('father_phone')
-
-            mfee = get('monthly_fee_amount')
-            if mfee:
-                try:
-                    player.monthly_fee_amount = int(float(mfee))
-                except Exception:
-                    pass
-
-            mflag = get('monthly_fee_is_monthly')
-            if mflag is not None:
-                player.monthly_fee_is_monthly = str(mflag).lower() in ('1', 'true', 'yes', 'y')
-
-            # Prefer explicit belt_rank in CSV if provided, otherwise infer from grade
-            csv_belt = get('belt_rank')
-            if csv_belt:
-                player.belt_rank = csv_belt
-            elif player.grade_level and player.grade_level in GRADING_SCHEME.get('grade_to_color', {}):
-                player.belt_rank = GRADING_SCHEME['grade_to_color'][player.grade_level]
-
-            db.session.add(player)
-            created += 1
-        except Exception as e:
-            errors.append(f"Row {idx}: {e}")
+    plan = PlayerImportPlan((f"Row {idx}", row) for idx, row in enumerate(reader, start=1))
+    if request.form.get('dry_run'):
+        return render_template('players_import_preview.html', plan=plan, filename=file.filename)
 
     try:
+        plan.apply()
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         flash(_('Import failed: ') + str(e), 'danger')
         return redirect(request.referrer or url_for('list_players'))
+    ensure_payments_for_month(date.today().year, date.today().month)
 
+    created, updated = len(plan.creates), len(plan.updates)
     msg = (_('%(count)s players imported.') % {'count': created}) if created else _('No players imported.')
-    if errors:
-        flash(msg + ' ' + _('Some rows had issues:') + ' ' + '; '.join(errors[:5]), 'warning')
+    if updated:
+        msg += ' ' + _('%(count)s players updated.') % {'count': updated}
+    if plan.errors:
+        flash(msg + ' ' + _('Some rows had issues:') + ' ' + '; '.join(plan.errors[:5]), 'warning')
     else:
         flash(msg, 'success')
     return redirect(url_for('list_players'))
@@ -2778,18 +3813,13 @@ def create_player():
 
         file = request.files.get("photo")
         if file and file.filename and allowed_file(file.filename):
-            fname = secure_filename(file.filename)
-            base, ext = os.path.splitext(fname)
-            counter = 1
-            new_name = fname
-            while os.path.exists(os.path.join(UPLOAD_FOLDER, new_name)):
-                new_name = f"{base}_{counter}{ext}"
-                counter += 1
+            new_name = unique_upload_name(file.filename)
             file.save(os.path.join(UPLOAD_FOLDER, new_name))
             player.photo_filename = new_name
 
         db.session.add(player)
         db.session.commit()
+        ensure_payments_for_month(date.today().year, date.today().month)
         flash(_("Player created."), "success")
         return redirect(url_for("list_players"))
 
@@ -2818,17 +3848,12 @@ def edit_player(player_id: int):
 
         file = request.files.get("photo")
         if file and file.filename and allowed_file(file.filename):
-            fname = secure_filename(file.filename)
-            base, ext = os.path.splitext(fname)
-            counter = 1
-            new_name = fname
-            while os.path.exists(os.path.join(UPLOAD_FOLDER, new_name)):
-                new_name = f"{base}_{counter}{ext}"
-                counter += 1
+            new_name = unique_upload_name(file.filename)
             file.save(os.path.join(UPLOAD_FOLDER, new_name))
             player.photo_filename = new_name
 
         db.session.commit()
+        ensure_payments_for_month(date.today().year, date.today().month)
         flash(_("Player updated."), "success")
         return redirect(url_for("player_detail", player_id=player.id))
 
@@ -2842,69 +3867,118 @@ def edit_player(player_id: int):
     )
 
 # Helper functions for debt checking
+def collect_player_debts(players: list, year: Optional[int] = None, month: Optional[int] = None) -> dict:
+    """Collect outstanding debts for a set of players, keyed by player id.
+
+    Each entry holds:
+      - monthly: unpaid Payment rows for year/month (defaults to the current month)
+      - sessions: owed per-session trainings (None for monthly payers or when no price is set)
+      - events: unpaid event registrations with their computed and per-category fees
+
+    Rows are matched on player_pn, or on player_id for a player without a PN.
+    The number of queries is fixed, whether one player or the whole club is passed in.
+    """
+    if year is None or month is None:
+        today = date.today()
+        year, month = today.year, today.month
+    debts = {p.id: {"monthly": [], "sessions": None, "events": []} for p in players}
+    if not players:
+        return debts
+    by_pn = {p.pn: p for p in players if p.pn}
+    by_id = {p.id: p for p in players if not p.pn}
+
+    def owned_by(model, group):
+        pns = [p.pn for p in group if p.pn]
+        ids = [p.id for p in group if not p.pn]
+        if not ids:
+            return model.player_pn.in_(pns)
+        return or_(model.player_pn.in_(pns), model.player_id.in_(ids))
+
+    def owner(pn, player_id):
+        return by_pn[pn] if pn in by_pn else by_id[player_id]
+
+    for pay in (Payment.query
+                .filter(owned_by(Payment, players), Payment.year == year, Payment.month == month,
+                        Payment.paid == False)  # noqa: E712
+                .order_by(Payment.id.asc())
+                .all()):
+        debts[owner(pay.player_pn, pay.player_id).id]["monthly"].append({
+            "id": pay.id, "year": pay.year, "month": pay.month, "amount": pay.amount or 0,
+        })
+
+    # Owed sessions only count for per-session payers with a price set
+    session_payers = [p for p in players if not p.monthly_fee_is_monthly and p.monthly_fee_amount]
+    if session_payers:
+        payer_ids = {p.id for p in session_payers}
+        for pn, player_id, session_id, sess_date in (db.session.query(
+                    TrainingSession.player_pn, TrainingSession.player_id, TrainingSession.session_id, TrainingSession.date)
+                .filter(owned_by(TrainingSession, session_payers), TrainingSession.paid == False)  # noqa: E712
+                .order_by(TrainingSession.date.asc(), TrainingSession.id.asc())
+                .all()):
+            p = owner(pn, player_id)
+            if p.id not in payer_ids:
+                continue
+            owed = debts[p.id]["sessions"]
+            if owed is None:
+                owed = debts[p.id]["sessions"] = {"count": 0, "per_session_amount": p.monthly_fee_amount, "amount": 0, "session_list": []}
+            owed["count"] += 1
+            owed["amount"] += p.monthly_fee_amount
+            owed["session_list"].append({"session_id": session_id, "date": sess_date})
+
+    # Same fee rule as EventRegistration.computed_fee(): override wins, else the sum of category fees
+    for reg_id, pn, player_id, fee_override, title, category_fees, category_count in (db.session.query(
+                EventRegistration.id,
+                EventRegistration.player_pn,
+                EventRegistration.player_id,
+                EventRegistration.fee_override,
+                Event.title,
+                db.func.sum(EventCategory.fee),
+                db.func.count(EventRegCategory.category_id))
+            .outerjoin(Event, Event.id == EventRegistration.event_id)
+            .outerjoin(EventRegCategory, EventRegCategory.registration_id == EventRegistration.id)
+            .outerjoin(EventCategory, EventCategory.id == EventRegCategory.category_id)
+            .filter(owned_by(EventRegistration, players), EventRegistration.paid == False)  # noqa: E712
+            .group_by(EventRegistration.id)
+            .order_by(EventRegistration.id.asc())
+            .all()):
+        debts[owner(pn, player_id).id]["events"].append({
+            "id": reg_id,
+            "title": title,
+            "fee": fee_override if fee_override is not None else category_fees,
+            "category_fees": int(category_fees or 0),
+            "category_count": category_count,
+        })
+    return debts
+
 def player_has_outstanding_debts(player: Player) -> bool:
     """Check if a player has any outstanding debts."""
-    today = date.today()
-    
-    # Check for unpaid monthly fees
-    pay_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-    unpaid_monthly = Payment.query.filter_by(**pay_filter, year=today.year, month=today.month, paid=False).first()
-    if unpaid_monthly:
-        return True
-    
-    # Check for unpaid training sessions
-    if player.monthly_fee_is_monthly is False and player.monthly_fee_amount:
-        sess_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-        unpaid_sessions = TrainingSession.query.filter_by(**sess_filter, paid=False).count()
-        if unpaid_sessions > 0:
-            return True
-    
-    # Check for unpaid event registrations
-    reg_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-    unpaid_regs = EventRegistration.query.filter_by(**reg_filter, paid=False).count()
-    if unpaid_regs > 0:
-        return True
-    
-    return False
+    debts = collect_player_debts([player])[player.id]
+    return bool(debts["monthly"] or debts["sessions"] or debts["events"])
 
 def get_player_debts(player: Player) -> list:
     """Get detailed list of player's outstanding debts."""
-    today = date.today()
-    debts = []
-    
-    # Monthly due
-    pay_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-    pay = Payment.query.filter_by(**pay_filter, year=today.year, month=today.month, paid=False).first()
-    if pay:
-        debts.append({
+    debts = collect_player_debts([player])[player.id]
+    items = []
+    for pay in debts["monthly"]:
+        items.append({
             "type": "monthly",
-            "label": f"Monthly fee ({today.year}-{today.month:02d})",
-            "amount": pay.amount or 0
+            "label": f"Monthly fee ({pay['year']}-{pay['month']:02d})",
+            "amount": pay["amount"]
         })
-    
-    # Owed session payments
-    if player.monthly_fee_is_monthly is False and player.monthly_fee_amount:
-        sess_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-        unpaid_sessions = TrainingSession.query.filter_by(**sess_filter, paid=False).count()
-        if unpaid_sessions > 0:
-            per_session_amount = player.monthly_fee_amount
-            debts.append({
-                "type": "sessions",
-                "label": f"Owed sessions ({unpaid_sessions} x {per_session_amount} EUR)",
-                "amount": unpaid_sessions * per_session_amount
-            })
-    
-    # Unpaid event registrations
-    reg_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-    regs = EventRegistration.query.filter_by(**reg_filter, paid=False).all()
-    for r in regs:
-        debts.append({
+    owed = debts["sessions"]
+    if owed:
+        items.append({
+            "type": "sessions",
+            "label": f"Owed sessions ({owed['count']} x {owed['per_session_amount']} EUR)",
+            "amount": owed["amount"]
+        })
+    for reg in debts["events"]:
+        items.append({
             "type": "event",
-            "label": f"Event: {r.event.title if r.event else 'Event'}",
-            "amount": r.computed_fee() or 0
+            "label": f"Event: {reg['title'] or 'Event'}",
+            "amount": reg["fee"] or 0
         })
-    
-    return debts
+    return items
 
 @app.route("/admin/players/<int:player_id>/delete", methods=["POST"])
 @admin_required
@@ -3031,8 +4105,8 @@ def player_pay_due_receipt(player_id: int):
         if r:
             return ("event", r)
         # Try PaymentRecord (debt)
-        d = PaymentRecord.query.filter_by(id=due_id, player_pn=player.pn).first()
-        if d and is_auto_debt_note(d.note) and "AUTO_DEBT_PAID" not in (d.note or ""):
+        d = PaymentRecord.query.filter_by(id=due_id, player_pn=player.pn, debt_status='open').first()
+        if d:
             return ("debt", d)
         return (None, None)
 
@@ -3094,7 +4168,7 @@ def player_pay_due_receipt(player_id: int):
             if d_amt <= 0:
                 continue
             bulk_note_parts.append(f"Debt payment for receipt {obj.id}")
-            obj.note = (obj.note or '') + ' | AUTO_DEBT_PAID'
+            mark_debt_paid(obj)
             db.session.add(obj)
             total_amount += d_amt
 
@@ -3127,50 +4201,40 @@ def player_pay_due_receipt(player_id: int):
 @admin_required
 def player_dues_json(player_id: int):
     player = Player.query.get_or_404(player_id)
-    today = date.today()
+    debts = collect_player_debts([player])[player.id]
     dues = []
     # Monthly due (unpaid Payment row for this month)
-    pay_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-    pay = Payment.query.filter_by(**pay_filter, year=today.year, month=today.month, paid=False).first()
-    if pay:
+    for pay in debts["monthly"]:
         dues.append({
-            "id": pay.id,
-            "label": f"Monthly fee ({today.year}-{today.month:02d})",
-            "amount": pay.amount or 0,
+            "id": pay["id"],
+            "label": f"Monthly fee ({pay['year']}-{pay['month']:02d})",
+            "amount": pay["amount"],
             "type": "monthly"
         })
 
-    # Owed session payments (per-session plan, sessions taken > sessions paid)
-    if player.monthly_fee_is_monthly is False and player.monthly_fee_amount:
-        # Get all unpaid TrainingSession records for this player (all time)
-        sess_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-        unpaid_sessions = TrainingSession.query.filter_by(**sess_filter, paid=False).order_by(TrainingSession.date.asc()).all()
-        per_session_amount = player.monthly_fee_amount
-        owed_sessions = len(unpaid_sessions)
-        if owed_sessions > 0:
-            session_list = [
+    # Owed session payments (per-session plan, all unpaid TrainingSession records)
+    owed = debts["sessions"]
+    if owed:
+        dues.append({
+            "id": "owed_sessions_all_time",
+            "label": f"Owed sessions ({owed['count']} x {owed['per_session_amount']} EUR)",
+            "amount": owed["amount"],
+            "type": "owed_sessions",
+            "sessions": owed["count"],
+            "session_list": [
                 {
-                    "session_id": s.session_id,
-                    "date": s.date.strftime('%Y-%m-%d') if s.date else "?"
+                    "session_id": s["session_id"],
+                    "date": s["date"].strftime('%Y-%m-%d') if s["date"] else "?"
                 }
-                for s in unpaid_sessions
+                for s in owed["session_list"]
             ]
-            dues.append({
-                "id": f"owed_sessions_all_time",
-                "label": f"Owed sessions ({owed_sessions} x {per_session_amount} EUR)",
-                "amount": owed_sessions * per_session_amount,
-                "type": "owed_sessions",
-                "sessions": owed_sessions,
-                "session_list": session_list
-            })
+        })
     # Unpaid event registrations
-    reg_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-    regs = EventRegistration.query.filter_by(**reg_filter, paid=False).all()
-    for r in regs:
+    for reg in debts["events"]:
         dues.append({
-            "id": r.id,
-            "label": f"Event: {r.event.title if r.event else 'Event'}",
-            "amount": r.computed_fee() or 0,
+            "id": reg["id"],
+            "label": f"Event: {reg['title'] or 'Event'}",
+            "amount": reg["fee"] or 0,
             "type": "event"
         })
     # Debts (AUTO_DEBT)
@@ -3206,149 +4270,140 @@ def backfill_training_sessions():
     db.session.commit()
     flash(_(f"Backfilled {created_total} missing TrainingSession records."), "success")
     return redirect(request.referrer or url_for('list_players'))
-@app.route("/reports/fees")
-@admin_required
-def fees_report():
-    month_str = request.args.get("month")
-    year, month = parse_month_str(month_str)
-    ensure_payments_for_month(year, month)
+def build_fees_report(year: int, month: int) -> list:
+    """Rows for the monthly fees report (screen and print views), one per active player.
 
-    # Get all active players
+    The month's payments, sessions and receipts are loaded with a fixed number of
+    queries and grouped per player in memory, as in collect_player_debts().
+    Rows link by player_pn; players without a PN fall back to player_id.
+
+    The totals are not read from player_month_summary: every row also lists the
+    sessions and receipts behind them (dates, receipt numbers, event names, notes),
+    so those rows are loaded anyway, and the rollup has no player_id fallback.
+    """
     players = Player.query.filter_by(active_member=True).order_by(Player.last_name.asc(), Player.first_name.asc()).all()
     payments = {p.player_id: p for p in Payment.query.filter_by(year=year, month=month).all()}
+    debts = collect_player_debts(players, year, month)
+
+    def owner(player_pn, player_id):
+        return player_pn if player_pn else player_id
+
+    # Training sessions in the month, only needed for per-session payers
+    from calendar import monthrange
+    month_start = date(year, month, 1)
+    month_end = date(year, month, monthrange(year, month)[1])
+    sessions = defaultdict(list)
+    for pn, player_id, session_id, sess_date, paid in (db.session.query(
+                TrainingSession.player_pn, TrainingSession.player_id, TrainingSession.session_id,
+                TrainingSession.date, TrainingSession.paid)
+            .filter(TrainingSession.date >= month_start, TrainingSession.date <= month_end)
+            .order_by(TrainingSession.date.asc(), TrainingSession.id.asc())
+            .all()):
+        session = {'session_id': session_id, 'date': sess_date, 'paid': bool(paid)}
+        if pn:
+            sessions[pn].append(session)
+        sessions[player_id].append(session)
+
+    # Receipts paid in the month plus the monthly-fee receipts for it. Two queries rather than
+    # one OR, so each seeks its own index (paid_year_month / kind, year, month) instead of a scan.
+    receipt_query = PaymentRecord.query.options(
+        joinedload(PaymentRecord.event_registration).joinedload(EventRegistration.event))
+    paid_in_month = (receipt_query
+                     .filter(PaymentRecord.paid_year_month == year_month_key(year, month),
+                             PaymentRecord.kind.in_(('training_session', 'event', 'bulk_payment')))
+                     .all())
+    monthly_fees = (receipt_query
+                    .filter(PaymentRecord.kind == 'training_month',
+                            PaymentRecord.year == year, PaymentRecord.month == month)
+                    .all())
+    receipts = defaultdict(lambda: defaultdict(list))
+    for rec in sorted(paid_in_month + monthly_fees, key=lambda r: r.id):
+        receipts[owner(rec.player_pn, rec.player_id)][rec.kind].append(rec)
 
-    # Consolidate all payments per athlete
-    from sqlalchemy import extract
     report_rows = []
     for player in players:
+        player_receipts = receipts[owner(player.pn, player.id)]
         # Monthly
         payment = payments.get(player.id)
-        monthly_amount = payment.amount if payment else 0
-        monthly_paid = payment.paid if payment else False
-        monthly_id = payment.id if payment else None
-        # Per-session
-        # Count TrainingSession rows in the report month and use their paid flag to compute owed amount.
+        monthly_receipt = player_receipts['training_month'][0] if payment and player_receipts['training_month'] else None
+        # Per-session: count the month's TrainingSession rows and use their paid flag for the owed amount
         per_session_amount = player.monthly_fee_amount if player.monthly_fee_is_monthly is False else None
-        sessions_taken = 0
-        sessions_paid = 0
-        prepaid_amount = 0
         sessions_in_month = []
-        sess_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
+        session_receipts = []
         if per_session_amount is not None:
-            # Date range for month
-            from calendar import monthrange
-            month_start = date(year, month, 1)
-            month_end = date(year, month, monthrange(year, month)[1])
-            # Training sessions in the month (prefer player_pn for lookup)
-            sessions_in_month = TrainingSession.query.filter_by(**sess_filter).filter(TrainingSession.date >= month_start, TrainingSession.date <= month_end).all()
-            sessions_taken = len(sessions_in_month)
-            sessions_paid = sum(1 for s in sessions_in_month if getattr(s, 'paid', False))
-            # Fallback/prepaid amount: sum PaymentRecord amounts for training_session kind in the month
-            session_pay_recs = PaymentRecord.query.filter_by(player_pn=player.pn, kind='training_session').filter(
-                db.func.strftime('%Y', PaymentRecord.paid_at) == str(year),
-                db.func.strftime('%m', PaymentRecord.paid_at) == f"{month:02d}"
-            ).all()
-            prepaid_amount = sum(r.amount or 0 for r in session_pay_recs)
-            # For compatibility with previous logic, expose these as session_receipts
-            session_receipts = session_pay_recs
-            owed_amount = max(0, (sessions_taken - sessions_paid) * per_session_amount)
-        else:
-            owed_amount = 0
-        # Build a lightweight session list for the UI (session_id, date, paid)
+            sessions_in_month = sessions[owner(player.pn, player.id)]
+            session_receipts = player_receipts['training_session']
+        sessions_taken = len(sessions_in_month)
+        sessions_paid = sum(1 for s in sessions_in_month if s['paid'])
+        owed_amount = max(0, (sessions_taken - sessions_paid) * per_session_amount) if per_session_amount is not None else 0
         session_list = [
             {
-                'session_id': s.session_id,
-                'date': s.date.isoformat() if s.date else None,
-                'paid': bool(getattr(s, 'paid', False)),
-                'amount': per_session_amount if per_session_amount is not None else None
+                'session_id': s['session_id'],
+                'date': s['date'].isoformat() if s['date'] else None,
+                'paid': s['paid'],
+                'amount': per_session_amount,
             }
-            for s in (locals().get('sessions_in_month') or [])
+            for s in sessions_in_month
         ]
-        # Events
-        event_payments = PaymentRecord.query.filter_by(player_pn=player.pn, kind='event').filter(
-            extract('year', PaymentRecord.paid_at) == year,
-            extract('month', PaymentRecord.paid_at) == month
-        ).all()
-        event_total = sum(ep.amount or 0 for ep in event_payments)
-        # Bulk payments
-        bulk_payments = PaymentRecord.query.filter_by(player_pn=player.pn, kind='bulk_payment').filter(
-            extract('year', PaymentRecord.paid_at) == year,
-            extract('month', PaymentRecord.paid_at) == month
-        ).all()
-        bulk_total = sum(bp.amount or 0 for bp in bulk_payments)
-        # Owed for events: sum of unpaid event registrations (per category) for this player
-        # Event fees are due immediately upon registration, not based on event date
-        event_owed = 0
-        category_fees = 0
-        # All unpaid event registrations for this player
-        unpaid_regs = EventRegistration.query.filter_by(player_pn=player.pn, paid=False).all()
-        for reg in unpaid_regs:
-            # Sum all category fees for this registration
-            for rc in reg.reg_categories:
-                if rc.category and rc.category.fee is not None:
-                    category_fees += int(rc.category.fee)
-            # All unpaid registrations are owed
-            for rc in reg.reg_categories:
-                if rc.category and rc.category.fee is not None:
-                    event_owed += int(rc.category.fee)
-            # If no categories, fallback to registration fee
-            if not reg.reg_categories and reg.computed_fee():
-                event_owed += reg.computed_fee()
-        # Details for expansion
-        event_details = []
-        for ep in event_payments:
-            event_name = ep.event_registration.event.title if ep.event_registration and ep.event_registration.event else None
-            event_details.append({
-                'amount': ep.amount,
-                'event_name': event_name,
-                'receipt_no': ep.receipt_no,
-                'paid_on': ep.paid_at.date() if ep.paid_at else None,
-                'id': ep.id,
-            })
-        # Details for bulk payments expansion
-        bulk_details = []
-        for bp in bulk_payments:
-            bulk_details.append({
-                'amount': bp.amount,
-                'receipt_no': bp.receipt_no,
-                'paid_on': bp.paid_at.date() if bp.paid_at else None,
-                'id': bp.id,
-                'note': bp.note,
-            })
-        # Find monthly receipt (PaymentRecord)
-        monthly_receipt = None
-        if payment:
-            monthly_receipt = PaymentRecord.query.filter_by(player_pn=player.pn, kind='training_month', year=year, month=month).first()
-        monthly_receipt_no = monthly_receipt.receipt_no if monthly_receipt else None
-        monthly_receipt_id = monthly_receipt.id if monthly_receipt else None
-        # Collect all session receipts for the month
-        session_receipt_nos = [r.receipt_no for r in (locals().get('session_receipts') or []) if r.receipt_no]
-        session_receipt_ids = [r.id for r in (locals().get('session_receipts') or []) if r.receipt_no]
+        event_payments = player_receipts['event']
+        bulk_payments = player_receipts['bulk_payment']
+        # Event fees are due on registration, not on the event date; no categories falls back to the registration fee
+        unpaid_regs = debts[player.id]["events"]
+        event_owed = sum(reg["category_fees"] if reg["category_count"] else (reg["fee"] or 0) for reg in unpaid_regs)
         report_rows.append({
             'player': player,
             'player_id': player.id,
-            'monthly_amount': monthly_amount,
-            'monthly_paid': monthly_paid,
-            'monthly_id': monthly_id,
-            'monthly_receipt_no': monthly_receipt_no,
-            'monthly_receipt_id': monthly_receipt_id,
+            'monthly_amount': payment.amount if payment else 0,
+            'monthly_paid': payment.paid if payment else False,
+            'monthly_id': payment.id if payment else None,
+            'monthly_receipt_no': monthly_receipt.receipt_no if monthly_receipt else None,
+            'monthly_receipt_id': monthly_receipt.id if monthly_receipt else None,
             'sessions_paid': sessions_paid,
             'sessions_taken': sessions_taken,
-            'prepaid_amount': prepaid_amount,
+            'prepaid_amount': sum(r.amount or 0 for r in session_receipts),
             'per_session_amount': per_session_amount,
-            'session_receipt_nos': session_receipt_nos,
-            'session_receipt_ids': session_receipt_ids,
+            'session_receipt_nos': [r.receipt_no for r in session_receipts if r.receipt_no],
+            'session_receipt_ids': [r.id for r in session_receipts if r.receipt_no],
             'session_list': session_list,
-            'owed_amount': (owed_amount or 0) + (event_owed or 0),
-            'event_total': event_total,
+            'owed_amount': owed_amount + event_owed,
+            'event_total': sum(ep.amount or 0 for ep in event_payments),
             'event_owed': event_owed,
-            'category_fees': category_fees,
-            'event_details': event_details,
-            'bulk_total': bulk_total,
-            'bulk_details': bulk_details,
+            'category_fees': sum(reg["category_fees"] for reg in unpaid_regs),
+            'event_details': [
+                {
+                    'amount': ep.amount,
+                    'event_name': ep.event_registration.event.title if ep.event_registration and ep.event_registration.event else None,
+                    'receipt_no': ep.receipt_no,
+                    'paid_on': ep.paid_at.date() if ep.paid_at else None,
+                    'id': ep.id,
+                }
+                for ep in event_payments
+            ],
+            'bulk_total': sum(bp.amount or 0 for bp in bulk_payments),
+            'bulk_details': [
+                {
+                    'amount': bp.amount,
+                    'receipt_no': bp.receipt_no,
+                    'paid_on': bp.paid_at.date() if bp.paid_at else None,
+                    'id': bp.id,
+                    'note': bp.note,
+                }
+                for bp in bulk_payments
+            ],
             'year': year,
             'month': month,
         })
+    return report_rows
+
+@app.route("/reports/fees")
+@admin_required
+@cached_report("player", "payment", "payment_record", "training_session", "event",
+               "event_registration", "event_reg_category", "event_category")
+def fees_report():
+    month_str = request.args.get("month")
+    year, month = parse_month_str(month_str)
+
+    report_rows = build_fees_report(year, month)
 
     # Show due date as today if today is in the target month, else use first working day
     today_dt = date.today()
@@ -3369,133 +4424,7 @@ def fees_report():
 @admin_required
 def fees_report_print(year: int, month: int):
     """Print-friendly version of the monthly fees report."""
-    month_str = f"{year:04d}-{month:02d}"
-    ensure_payments_for_month(year, month)
-
-    # Get all active players
-    players = Player.query.filter_by(active_member=True).order_by(Player.last_name.asc(), Player.first_name.asc()).all()
-    payments = {p.player_id: p for p in Payment.query.filter_by(year=year, month=month).all()}
-
-    # Consolidate all payments per athlete (same logic as fees_report)
-    from sqlalchemy import extract
-    report_rows = []
-    for player in players:
-        # Monthly
-        payment = payments.get(player.id)
-        monthly_amount = payment.amount if payment else 0
-        monthly_paid = payment.paid if payment else False
-        monthly_id = payment.id if payment else None
-        # Per-session
-        per_session_amount = player.monthly_fee_amount if player.monthly_fee_is_monthly is False else None
-        sessions_taken = 0
-        sessions_paid = 0
-        prepaid_amount = 0
-        sessions_in_month = []
-        sess_filter = {'player_pn': player.pn} if player.pn else {'player_id': player.id}
-        if per_session_amount is not None:
-            from calendar import monthrange
-            month_start = date(year, month, 1)
-            month_end = date(year, month, monthrange(year, month)[1])
-            sessions_in_month = TrainingSession.query.filter_by(**sess_filter).filter(TrainingSession.date >= month_start, TrainingSession.date <= month_end).all()
-            sessions_taken = len(sessions_in_month)
-            sessions_paid = sum(1 for s in sessions_in_month if getattr(s, 'paid', False))
-            session_pay_recs = PaymentRecord.query.filter_by(player_pn=player.pn, kind='training_session').filter(
-                db.func.strftime('%Y', PaymentRecord.paid_at) == str(year),
-                db.func.strftime('%m', PaymentRecord.paid_at) == f"{month:02d}"
-            ).all()
-            prepaid_amount = sum(r.amount or 0 for r in session_pay_recs)
-            owed_amount = max(0, (sessions_taken - sessions_paid) * per_session_amount)
-        else:
-            owed_amount = 0
-        
-        session_list = [
-            {
-                'session_id': s.session_id,
-                'date': s.date.isoformat() if s.date else None,
-                'paid': bool(getattr(s, 'paid', False)),
-                'amount': per_session_amount if per_session_amount is not None else None
-            }
-            for s in (locals().get('sessions_in_month') or [])
-        ]
-        
-        # Events
-        event_payments = PaymentRecord.query.filter_by(player_pn=player.pn, kind='event').filter(
-            extract('year', PaymentRecord.paid_at) == year,
-            extract('month', PaymentRecord.paid_at) == month
-        ).all()
-        event_total = sum(ep.amount or 0 for ep in event_payments)
-        
-        # Bulk payments
-        bulk_payments = PaymentRecord.query.filter_by(player_pn=player.pn, kind='bulk_payment').filter(
-            extract('year', PaymentRecord.paid_at) == year,
-            extract('month', PaymentRecord.paid_at) == month
-        ).all()
-        bulk_total = sum(bp.amount or 0 for bp in bulk_payments)
-        
-        # Event owed calculation (same as main report)
-        event_owed = 0
-        category_fees = 0
-        unpaid_regs = EventRegistration.query.filter_by(player_pn=player.pn, paid=False).all()
-        for reg in unpaid_regs:
-            for rc in reg.reg_categories:
-                if rc.category and rc.category.fee is not None:
-                    category_fees += int(rc.category.fee)
-            for rc in reg.reg_categories:
-                if rc.category and rc.category.fee is not None:
-                    event_owed += int(rc.category.fee)
-            if not reg.reg_categories and reg.computed_fee():
-                event_owed += reg.computed_fee()
-        
-        # Event and bulk details for expandable sections
-        event_details = []
-        for ep in event_payments:
-            event_name = ep.event_registration.event.title if ep.event_registration and ep.event_registration.event else None
-            event_details.append({
-                'amount': ep.amount,
-                'event_name': event_name,
-                'receipt_no': ep.receipt_no,
-                'paid_on': ep.paid_at.date() if ep.paid_at else None,
-                'id': ep.id,
-            })
-        
-        bulk_details = []
-        for bp in bulk_payments:
-            bulk_details.append({
-                'amount': bp.amount,
-                'receipt_no': bp.receipt_no,
-                'paid_on': bp.paid_at.date() if bp.paid_at else None,
-                'id': bp.id,
-                'note': bp.note,
-            })
-        
-        # Find monthly receipt
-        monthly_receipt = None
-        if payment:
-            monthly_receipt = PaymentRecord.query.filter_by(player_pn=player.pn, kind='training_month', year=year, month=month).first()
-        monthly_receipt_no = monthly_receipt.receipt_no if monthly_receipt else None
-        
-        # Session receipts
-        session_receipt_nos = [r.receipt_no for r in (locals().get('session_receipts') or []) if r.receipt_no]
-        
-        report_rows.append({
-            'player': player,
-            'player_id': player.id,
-            'monthly_amount': monthly_amount,
-            'monthly_paid': monthly_paid,
-            'monthly_receipt_no': monthly_receipt_no,
-            'sessions_paid': sessions_paid,
-            'sessions_taken': sessions_taken,
-            'prepaid_amount': prepaid_amount,
-            'per_session_amount': per_session_amount,
-            'session_receipt_nos': session_receipt_nos,
-            'owed_amount': (owed_amount or 0) + (event_owed or 0),
-            'event_total': event_total,
-            'event_owed': event_owed,
-            'category_fees': category_fees,
-            'bulk_total': bulk_total,
-            'year': year,
-            'month': month,
-        })
+    report_rows = build_fees_report(year, month)
 
     # Calculate totals
     total_monthly = sum(p['monthly_amount'] for p in report_rows)
@@ -3564,64 +4493,69 @@ def fees_export_csv():
     return Response(generate(), mimetype="text/csv", headers=headers)
 
 
+# Rows per fetch / per yielded CSV chunk for streaming exports
+EXPORT_CHUNK_ROWS = 1000
+
+PAYMENTS_EXPORT_HEADER = [
+    "source", "payment_id", "record_id", "player_id", "player_pn", "kind", "year", "month", "amount", "currency",
+    "paid", "paid_on", "paid_at", "receipt_no", "payment_id_ref", "event_registration_id", "sessions_paid",
+    "sessions_taken", "note", "method", "created_at",
+]
+
+def payments_export_rows():
+    """Rows for the payments backup: Payment rows, then PaymentRecord rows, fetched EXPORT_CHUNK_ROWS at a time.
+
+    Plain column tuples are selected so nothing accumulates in the session identity map.
+    """
+    def blank(v):
+        return '' if v is None else v
+
+    def iso(v):
+        return v.isoformat() if v else ''
+
+    payments = db.session.execute(
+        db.select(Payment.id, Payment.player_id, Payment.player_pn, Payment.year, Payment.month,
+                  Payment.amount, Payment.paid, Payment.paid_on)
+        .order_by(Payment.id.asc())
+        .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    )
+    for pid, player_id, pn, year, month, amount, paid, paid_on in payments:
+        yield ['payment', pid, '', player_id, pn or '', '', year, month, blank(amount), '',
+               '1' if paid else '0', iso(paid_on), '', '', '', '', '', '', '', '', '']
+
+    records = db.session.execute(
+        db.select(PaymentRecord.id, PaymentRecord.player_id, PaymentRecord.player_pn, PaymentRecord.kind,
+                  PaymentRecord.year, PaymentRecord.month, PaymentRecord.amount, PaymentRecord.currency,
+                  PaymentRecord.paid_at, PaymentRecord.receipt_no, PaymentRecord.payment_id,
+                  PaymentRecord.event_registration_id, PaymentRecord.sessions_paid, PaymentRecord.sessions_taken,
+                  PaymentRecord.note, PaymentRecord.method, PaymentRecord.created_at)
+        .order_by(PaymentRecord.id.asc())
+        .execution_options(yield_per=EXPORT_CHUNK_ROWS)
+    )
+    for (rid, player_id, pn, kind, year, month, amount, currency, paid_at, receipt_no, payment_id,
+         event_registration_id, sessions_paid, sessions_taken, note, method, created_at) in records:
+        yield ['payment_record', '', rid, player_id, pn or '', kind, blank(year), blank(month), blank(amount),
+               currency or '', '', '', iso(paid_at), receipt_no or '', payment_id or '', event_registration_id or '',
+               sessions_paid or '', sessions_taken or '', note or '', method or '', iso(created_at)]
+
 @app.route("/admin/reports/payments/export_all")
 @admin_required
 def payments_export_all_csv():
     """Export all payment-related rows (Payment and PaymentRecord) as a single CSV for backup."""
-    def generate():
-        # Header: source,payment_id,record_id,player_id,player_pn,kind,year,month,amount,currency,paid,paid_on,paid_at,receipt_no,payment_id_ref,event_registration_id,sessions_paid,sessions_taken,note,method,created_at
-        yield ("source,payment_id,record_id,player_id,player_pn,kind,year,month,amount,currency,paid,paid_on,paid_at,receipt_no,payment_id_ref,event_registration_id,sessions_paid,sessions_taken,note,method,created_at\n")
-        # Payments (monthly bookkeeping)
-        for p in Payment.query.order_by(Payment.id.asc()).all():
-            src = 'payment'
-            payment_id = p.id
-            record_id = ''
-            player_id = p.player_id
-            player_pn = p.player_pn or ''
-            kind = ''
-            year = p.year
-            month = p.month
-            amount = p.amount if p.amount is not None else ''
-            currency = ''
-            paid = '1' if p.paid else '0'
-            paid_on = p.paid_on.isoformat() if p.paid_on else ''
-            paid_at = ''
-            receipt_no = ''
-            payment_id_ref = ''
-            event_registration_id = ''
-            sessions_paid = ''
-            sessions_taken = ''
-            note = ''
-            method = ''
-            created_at = ''
-            row = [str(v) for v in [src, payment_id, record_id, player_id, player_pn, kind, year, month, amount, currency, paid, paid_on, paid_at, receipt_no, payment_id_ref, event_registration_id, sessions_paid, sessions_taken, note, method, created_at]]
-            yield ",".join(row) + "\n"
+    import csv
+    from io import StringIO
 
-        # PaymentRecords (receipts)
-        for r in PaymentRecord.query.order_by(PaymentRecord.id.asc()).all():
-            src = 'payment_record'
-            payment_id = ''
-            record_id = r.id
-            player_id = r.player_id
-            player_pn = r.player_pn or ''
-            kind = r.kind
-            year = r.year if r.year is not None else ''
-            month = r.month if r.month is not None else ''
-            amount = r.amount if r.amount is not None else ''
-            currency = r.currency or ''
-            paid = '1' if getattr(r, 'paid', None) else ''
-            paid_on = ''
-            paid_at = r.paid_at.isoformat() if r.paid_at else ''
-            receipt_no = r.receipt_no or ''
-            payment_id_ref = r.payment_id or ''
-            event_registration_id = r.event_registration_id or ''
-            sessions_paid = r.sessions_paid or ''
-            sessions_taken = r.sessions_taken or ''
-            note = (r.note or '').replace('\n', ' ').replace(',', ' ')
-            method = r.method or ''
-            created_at = r.created_at.isoformat() if r.created_at else ''
-            row = [str(v) for v in [src, payment_id, record_id, player_id, player_pn, kind, year, month, amount, currency, paid, paid_on, paid_at, receipt_no, payment_id_ref, event_registration_id, sessions_paid, sessions_taken, note, method, created_at]]
-            yield ",".join(row) + "\n"
+    def generate():
+        buf = StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerow(PAYMENTS_EXPORT_HEADER)
+        for n, row in enumerate(payments_export_rows(), 1):
+            writer.writerow(row)
+            if n % EXPORT_CHUNK_ROWS == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
 
     headers = {"Content-Disposition": 'attachment; filename="payments_all.csv"'}
     return Response(stream_with_context(generate()), mimetype='text/csv', headers=headers)
@@ -3664,93 +4598,163 @@ def admin_payments():
     return render_template('admin_payments.html', payments=payments, players=players, selected_player=selected_player, _=_ , current_lang=get_lang())
 
 
+def event_export_entries(ev, base: str, photos: bool):
+    """ZIP entries for one event: detail JSON, categories and registrations CSVs, per-player CSVs
+    and, with photos, the players' uploaded photos. base prefixes every path ('' or 'event_<id>/')."""
+    import json
+    import csv
+    from io import StringIO
+
+    prefix = f'event_{ev.id}'
+    ev_dict = {
+        'id': ev.id,
+        'title': ev.title,
+        'start_date': ev.start_date.isoformat() if ev.start_date else None,
+        'end_date': ev.end_date.isoformat() if ev.end_date else None,
+        'location': ev.location,
+        'sportdata_url': ev.sportdata_url,
+        'notes': ev.notes,
+    }
+    yield f'{base}{prefix}_detail.json', json.dumps(ev_dict, ensure_ascii=False, indent=2)
+
+    # categories CSV
+    cats = EventCategory.query.filter_by(event_id=ev.id).order_by(EventCategory.name.asc()).all()
+    cat_out = StringIO()
+    cat_writer = csv.writer(cat_out)
+    cat_writer.writerow(['id', 'name', 'age_from', 'age_to', 'sex', 'fee', 'team_size', 'kyu', 'dan', 'other_cutoff_date', 'limit_team', 'limit'])
+    for c in cats:
+        cat_writer.writerow([c.id, c.name, c.age_from, c.age_to, c.sex, c.fee, c.team_size, c.kyu, c.dan, c.other_cutoff_date, c.limit_team, c.limit])
+    yield f'{base}{prefix}_categories.csv', cat_out.getvalue()
+
+    # registrations CSV
+    regs = (EventRegistration.query
+            .filter_by(event_id=ev.id)
+            .join(Player, Player.id == EventRegistration.player_id)
+            .order_by(Player.last_name.asc(), Player.first_name.asc())
+            .all())
+    reg_out = StringIO()
+    reg_writer = csv.writer(reg_out)
+    reg_writer.writerow(['id', 'player_id', 'player_name', 'fee_override', 'computed_fee', 'paid', 'paid_on', 'note', 'categories', 'medals'])
+    for r in regs:
+        cats_list = []
+        medals_list = []
+        for rc in r.reg_categories or []:
+            # rc.category may be loaded; protect against None
+            cats_list.append(rc.category.name if rc.category else '')
+            medals_list.append(rc.medal or '')
+        computed = r.fee_override if r.fee_override is not None else (sum((rc.category.fee or 0) for rc in r.reg_categories) if r.reg_categories else '')
+        reg_writer.writerow([r.id, r.player_id, r.player.full_name() if r.player else '', r.fee_override, computed, r.paid, (r.paid_on.isoformat() if r.paid_on else ''), '', '; '.join(cats_list), '; '.join(medals_list)])
+    yield f'{base}{prefix}_registrations.csv', reg_out.getvalue()
+
+    # per-player CSVs (and photos)
+    player_ids = {r.player_id for r in regs if r.player_id}
+    players = Player.query.filter(Player.id.in_(player_ids)).all() if player_ids else []
+    for p in players:
+        yield f'{base}players/player_{p.id}_{(p.last_name or "").replace(" ","_")}.csv', player_profile_csv(p)
+        photo = player_photo_path(p) if photos else None
+        if photo:
+            yield f'{base}players/photos/{photo.name}', photo
+
 @app.route('/admin/events/export_zip_all')
 @admin_required
 def export_events_zip_all():
-    """Export all events as a single ZIP containing per-event exports (no photos)."""
-    events = Event.query.order_by(Event.start_date.asc()).all()
-    import json
-    import csv
-    from io import StringIO, BytesIO
-    import zipfile
+    """Export all events as a single streamed ZIP of per-event exports; ?photos=1 adds player photos."""
+    photos = wants_photos()
 
-    mem_zip = BytesIO()
-    with zipfile.ZipFile(mem_zip, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-        for ev in events:
-            prefix = f'event_{ev.id}'
-            # event JSON
-            ev_dict = {
-                'id': ev.id,
-                'title': ev.title,
-                'start_date': ev.start_date.isoformat() if ev.start_date else None,
-                'end_date': ev.end_date.isoformat() if ev.end_date else None,
-                'location': ev.location,
-                'sportdata_url': ev.sportdata_url,
-                'notes': ev.notes,
-            }
-            zf.writestr(f'{prefix}/{prefix}_detail.json', json.dumps(ev_dict, ensure_ascii=False, indent=2))
-
-            # categories
-            cats = EventCategory.query.filter_by(event_id=ev.id).order_by(EventCategory.name.asc()).all()
-            cat_out = StringIO()
-            cat_writer = csv.writer(cat_out)
-            cat_writer.writerow(['id', 'name', 'age_from', 'age_to', 'sex', 'fee', 'team_size', 'kyu', 'dan', 'other_cutoff_date', 'limit_team', 'limit'])
-            for c in cats:
-                cat_writer.writerow([c.id, c.name, c.age_from, c.age_to, c.sex, c.fee, c.team_size, c.kyu, c.dan, c.other_cutoff_date, c.limit_team, c.limit])
-            zf.writestr(f'{prefix}/{prefix}_categories.csv', cat_out.getvalue())
-
-            # registrations
-            regs = (EventRegistration.query
-                    .filter_by(event_id=ev.id)
-                    .join(Player, Player.id == EventRegistration.player_id)
-                    .order_by(Player.last_name.asc(), Player.first_name.asc())
-                    .all())
-            reg_out = StringIO()
-            reg_writer = csv.writer(reg_out)
-            reg_writer.writerow(['id', 'player_id', 'player_name', 'fee_override', 'computed_fee', 'paid', 'paid_on', 'note', 'categories', 'medals'])
-            for r in regs:
-                cats_list = []
-                medals_list = []
-                for rc in r.reg_categories or []:
-                    cats_list.append(rc.category.name if rc.category else '')
-                    medals_list.append(rc.medal or '')
-                computed = r.fee_override if r.fee_override is not None else (sum((rc.category.fee or 0) for rc in r.reg_categories) if r.reg_categories else '')
-                reg_writer.writerow([r.id, r.player_id, r.player.full_name() if r.player else '', r.fee_override, computed, r.paid, (r.paid_on.isoformat() if r.paid_on else ''), '', '; '.join(cats_list), '; '.join(medals_list)])
-            zf.writestr(f'{prefix}/{prefix}_registrations.csv', reg_out.getvalue())
-
-            # per-player CSVs
-            player_ids = {r.player_id for r in regs if r.player_id}
-            players = Player.query.filter(Player.id.in_(player_ids)).all() if player_ids else []
-            fieldnames = [
-                'id', 'first_name', 'last_name', 'gender', 'birthdate', 'pn',
-                'belt_rank', 'grade_level', 'grade_date', 'discipline', 'weight_kg', 'height_cm',
-                'email', 'phone', 'join_date', 'active_member', 'notes', 'photo_filename',
-                'sportdata_wkf_url', 'sportdata_bnfk_url', 'sportdata_enso_url',
-                'medical_exam_date', 'medical_expiry_date', 'insurance_expiry_date',
-                'monthly_fee_amount', 'monthly_fee_is_monthly',
-                'mother_name', 'mother_phone', 'father_name', 'father_phone'
-            ]
-            for p in players:
-                out = StringIO()
-                dw = csv.DictWriter(out, fieldnames=fieldnames)
-                dw.writeheader()
-                row = {k: getattr(p, k, '') for k in fieldnames}
-                for k, v in row.items():
-                    if hasattr(v, 'isoformat'):
-                        row[k] = v.isoformat()
-                    elif isinstance(v, bool):
-                        row[k] = str(v)
-                zf.writestr(f'{prefix}/players/player_{p.id}_{(p.last_name or "").replace(" ","_")}.csv', out.getvalue())
-
-    mem_zip.seek(0)
-    headers = {'Content-Disposition': 'attachment; filename="events_all_full_export.zip"'}
-    return Response(mem_zip.getvalue(), mimetype='application/zip', headers=headers)
+    def entries():
+        for ev in Event.query.order_by(Event.start_date.asc()).all():
+            yield from event_export_entries(ev, f'event_{ev.id}/', photos)
+
+    return zip_response(entries(), "events_all_full_export.zip")
+
+
+PAYMENTS_IMPORT_BATCH_ROWS = 1000
+PAYMENT_IMPORT_KEY_FIELDS = ("player_pn", "kind", "year", "month", "amount", "currency", "paid_at", "receipt_no",
+                             "sessions_paid", "sessions_taken", "note", "method")
+
+def payment_import_key(values: dict) -> str:
+    """Natural key of an imported receipt row: a hash of its source values (receipt_no included)."""
+    import hashlib
+    raw = "\x1f".join("" if values.get(f) is None else str(values.get(f)) for f in PAYMENT_IMPORT_KEY_FIELDS)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def unkeyed_receipt_import_keys(pns) -> set:
+    """payment_import_key of the players' receipts entered in the app without a receipt number.
+
+    Those rows have no import_key, so re-importing a backup would add them again. Their key is
+    derived from their current values, normalized the way a backup row is parsed on import.
+    """
+    def clean(value):
+        return (value or '').strip() or None
+    rows = (db.session.query(PaymentRecord.player_pn, PaymentRecord.kind, PaymentRecord.year, PaymentRecord.month,
+                             PaymentRecord.amount, PaymentRecord.currency, PaymentRecord.paid_at,
+                             PaymentRecord.sessions_paid, PaymentRecord.sessions_taken, PaymentRecord.note,
+                             PaymentRecord.method)
+            .filter(PaymentRecord.player_pn.in_(list(pns)),
+                    PaymentRecord.receipt_no.is_(None),
+                    PaymentRecord.import_key.is_(None)))
+    return {payment_import_key({
+        "player_pn": r.player_pn, "kind": r.kind or "training_session", "year": r.year, "month": r.month,
+        "amount": r.amount, "currency": r.currency or "EUR", "paid_at": r.paid_at, "receipt_no": None,
+        "sessions_paid": r.sessions_paid or 0, "sessions_taken": r.sessions_taken or 0,
+        "note": clean(r.note), "method": clean(r.method),
+    }) for r in rows}
+
+def assign_import_receipt_nos(import_keys) -> None:
+    """PaymentRecord.assign_receipt_no for a whole import batch: one UPDATE, same RCPT-YYYYMMDD-id format."""
+    table = PaymentRecord.__table__
+    db.session.connection().execute(
+        table.update()
+        .where(table.c.receipt_no.is_(None), table.c.import_key.in_(list(import_keys)))
+        .values(receipt_no=db.func.printf('RCPT-%s-%06d', db.func.strftime('%Y%m%d', table.c.paid_at), table.c.id))
+    )
 
+def write_payments_import_batch(records: list, payments: list) -> int:
+    """Insert one batch of parsed import rows, leaving out those already in the database; returns how many were written.
+
+    Receipts match on receipt_no or import_key (also derived for unnumbered receipts entered in
+    the app), monthly payments on (player_pn, year, month).
+    """
+    written = 0
+    keys = set()
+    if records:
+        nos = {r['receipt_no'] for r in records if r['receipt_no']}
+        taken_nos = set(db.session.scalars(db.select(PaymentRecord.receipt_no).where(PaymentRecord.receipt_no.in_(nos)))) if nos else set()
+        taken_keys = set(db.session.scalars(db.select(PaymentRecord.import_key)
+                                            .where(PaymentRecord.import_key.in_([r['import_key'] for r in records]))))
+        unnumbered_pns = {r['player_pn'] for r in records if not r['receipt_no']}
+        if unnumbered_pns:
+            taken_keys |= unkeyed_receipt_import_keys(unnumbered_pns)
+        new = [r for r in records if r['receipt_no'] not in taken_nos and r['import_key'] not in taken_keys]
+        if new:
+            db.session.execute(insert(PaymentRecord), new)
+            unnumbered = [r['import_key'] for r in new if not r['receipt_no']]
+            if unnumbered:
+                assign_import_receipt_nos(unnumbered)
+            keys |= {(r['player_pn'], *divmod(r['paid_year_month'], 100)) for r in new}
+        written += len(new)
+    if payments:
+        taken = set(db.session.query(Payment.player_pn, Payment.year, Payment.month)
+                    .filter(Payment.player_pn.in_({p['player_pn'] for p in payments})))
+        new = [p for p in payments if (p['player_pn'], p['year'], p['month']) not in taken]
+        if new:
+            # OR IGNORE: uq_payment_player_month may still match a row stored under an older PN
+            result = db.session.execute(Payment.__table__.insert().prefix_with("OR IGNORE"), new)
+            written += result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(new)
+            keys |= {(p['player_pn'], p['year'], p['month']) for p in new}
+    # Bulk inserts skip the flush hooks, so refresh the monthly rollup here
+    refresh_player_month_summary(db.session.connection(), keys)
+    return written
 
 @app.route('/admin/payments/import_csv', methods=['POST'])
 @admin_required
 def admin_payments_import_csv():
-    """Import payment/receipt rows from CSV into PaymentRecord."""
+    """Import payment/receipt rows from CSV (e.g. the payments backup) in batches, in one transaction.
+
+    Rows already in the database are skipped, so re-importing a backup is safe: receipts by
+    receipt_no or, without one, by a hash of the row; monthly payment rows (source=payment)
+    by player and month. New receipts without a number are numbered per batch.
+    """
     if 'csv_file' not in request.files:
         flash(_('No file uploaded'), 'danger')
         return redirect(request.referrer or url_for('admin_imports'))
@@ -3760,83 +4764,107 @@ def admin_payments_import_csv():
         return redirect(request.referrer or url_for('admin_imports'))
     import io
     import csv
-    import datetime
+
+    by_pn = {}
+    by_id = {}
+    for pid, pn in db.session.query(Player.id, Player.pn):
+        by_pn[pn] = by_id[pid] = (pid, pn)
 
     text_stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', errors='replace')
     reader = csv.DictReader(text_stream)
+    rows = 0
     created = 0
-    skipped = 0
     errors = []
-    for idx, row in enumerate(reader, start=1):
-        try:
-            def g(k):
-                return (row.get(k) or '').strip() or None
-
-            player_pn = g('player_pn')
-            player_id = g('player_id')
-            player_obj = None
-            if player_pn:
-                player_obj = Player.query.filter_by(pn=player_pn).first()
-            elif player_id:
-                try:
-                    player_obj = Player.query.get(int(player_id))
-                except Exception:
-                    player_obj = None
-
-            if not player_obj:
-                skipped += 1
-                continue
-
-            kind = g('kind') or 'training_session'
-            amount_raw = g('amount') or '0'
+    seen = set()
+    records = []
+    payments = []
+    try:
+        for idx, row in enumerate(reader, start=1):
+            rows += 1
             try:
-                amount = int(float(amount_raw))
-            except Exception:
-                amount = 0
+                def g(k):
+                    return (row.get(k) or '').strip() or None
 
-            paid_flag = g('paid')
-            paid = True if str(paid_flag).strip() in ('1', 'true', 'yes', 'y') else False
+                player = by_pn.get(g('player_pn'))
+                if not player and not g('player_pn') and g('player_id'):
+                    player = by_id.get(int(g('player_id')))
+                if not player:
+                    continue
+                player_id, player_pn = player
 
-            paid_at = None
-            if g('paid_at'):
-                try:
-                    paid_at = datetime.datetime.fromisoformat(g('paid_at'))
-                except Exception:
+                if g('source') == 'payment':
+                    key = ('payment', player_pn, int(g('year')), int(g('month')))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    payments.append({
+                        'player_id': player_id,
+                        'player_pn': player_pn,
+                        'year': int(g('year')),
+                        'month': int(g('month')),
+                        'amount': int(float(g('amount'))) if g('amount') else None,
+                        'paid': str(g('paid')).lower() in ('1', 'true', 'yes', 'y'),
+                        'paid_on': date.fromisoformat(g('paid_on')) if g('paid_on') else None,
+                    })
+                else:
+                    try:
+                        amount = int(float(g('amount') or '0'))
+                    except Exception:
+                        amount = 0
                     paid_at = None
+                    if g('paid_at'):
+                        try:
+                            paid_at = datetime.fromisoformat(g('paid_at'))
+                        except Exception:
+                            paid_at = None
+                    rec = {
+                        'kind': g('kind') or 'training_session',
+                        'player_id': player_id,
+                        'player_pn': player_pn,
+                        'year': int(g('year')) if g('year') else None,
+                        'month': int(g('month')) if g('month') else None,
+                        'sessions_paid': int(g('sessions_paid')) if g('sessions_paid') else 0,
+                        'sessions_taken': int(g('sessions_taken')) if g('sessions_taken') else 0,
+                        'amount': amount,
+                        'currency': g('currency') or 'EUR',
+                        'method': g('method'),
+                        'note': g('note'),
+                        'receipt_no': g('receipt_no'),
+                        'paid_at': paid_at,
+                    }
+                    # Keyed on the file's values, before the defaults below fill in "now"
+                    rec['import_key'] = payment_import_key(rec)
+                    if rec['import_key'] in seen or (rec['receipt_no'] and rec['receipt_no'] in seen):
+                        continue
+                    seen.add(rec['import_key'])
+                    if rec['receipt_no']:
+                        seen.add(rec['receipt_no'])
+                    now = datetime.utcnow()
+                    rec['paid_at'] = paid_at or now
+                    rec['paid_year_month'] = year_month_key(rec['paid_at'].year, rec['paid_at'].month)
+                    try:
+                        rec['created_at'] = datetime.fromisoformat(g('created_at')) if g('created_at') else now
+                    except ValueError:
+                        rec['created_at'] = now
+                    rec['debt_status'] = debt_status_for_note(rec['note'])
+                    rec['is_debt'] = rec['debt_status'] is not None
+                    records.append(rec)
+            except Exception as e:
+                errors.append(f'Row {idx}: {e}')
+                continue
 
-            pr = PaymentRecord(
-                kind=kind,
-                player_id=player_obj.id,
-                player_pn=player_obj.pn,
-                year=int(g('year')) if g('year') else None,
-                month=int(g('month')) if g('month') else None,
-                sessions_paid=int(g('sessions_paid')) if g('sessions_paid') else 0,
-                sessions_taken=int(g('sessions_taken')) if g('sessions_taken') else 0,
-                amount=amount,
-                currency=g('currency') or 'EUR',
-                method=g('method'),
-                note=g('note'),
-                receipt_no=g('receipt_no') or None,
-                paid_at=paid_at or datetime.datetime.utcnow(),
-            )
-            # Avoid duplicate receipt_no
-            if pr.receipt_no:
-                existing = PaymentRecord.query.filter_by(receipt_no=pr.receipt_no).first()
-                if existing:
-                    skipped += 1
-                    continue
-
-            db.session.add(pr)
-            db.session.flush()
-            # Assign generated receipt if none
-            if not pr.receipt_no:
-                pr.assign_receipt_no(do_commit=False)
-            created += 1
-        except Exception as e:
-            app.logger.exception('Payments import row failed')
-            errors.append(f'Row {idx}: {e}')
+            if len(records) + len(payments) >= PAYMENTS_IMPORT_BATCH_ROWS:
+                created += write_payments_import_batch(records, payments)
+                records, payments = [], []
+        created += write_payments_import_batch(records, payments)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception('Payments import failed')
+        flash(_('Import failed: ') + str(e), 'danger')
+        return redirect(request.referrer or url_for('admin_imports'))
 
-    db.session.commit()
+    skipped = rows - created - len(errors)
     flash(f'Payments imported: {created}. Skipped: {skipped}. Errors: {len(errors)}', 'success' if not errors else 'warning')
     if errors:
         app.logger.warning('\n'.join(errors))
@@ -3846,6 +4874,14 @@ def admin_payments_import_csv():
 @app.route("/export/csv")
 def export_csv():
     players = Player.query.order_by(Player.last_name.asc(), Player.first_name.asc()).all()
+    # Not read from player_month_summary: these columns are the sessions_paid/sessions_taken written
+    # on the receipts (plus a per-receipt inferred count), which the rollup does not keep, so the
+    # session receipts are loaded once for everyone and grouped by PN here.
+    sess_records_by_pn = defaultdict(list)
+    for rec in (db.session.query(PaymentRecord.player_pn, PaymentRecord.sessions_paid,
+                                 PaymentRecord.sessions_taken, PaymentRecord.amount)
+                .filter(PaymentRecord.kind == 'training_session')):
+        sess_records_by_pn[rec.player_pn].append(rec)
 
     def generate():
         yield (
@@ -3865,9 +4901,7 @@ def export_csv():
             return s
 
         for p in players:
-            sess_records = (PaymentRecord.query
-                            .filter_by(player_pn=p.pn, kind='training_session')
-                            .all())
+            sess_records = sess_records_by_pn.get(p.pn, [])
             explicit_sessions_paid = sum((r.sessions_paid or 0) for r in sess_records)
             sessions_taken = sum((r.sessions_taken or 0) for r in sess_records)
             prepaid_amount = sum((r.amount or 0) for r in sess_records)
@@ -4513,8 +5547,7 @@ def event_registrations(event_id: int):
                       .outerjoin(EventRegistration.reg_categories)
                       .outerjoin(EventRegCategory.category)
                       .filter(or_(
-                          Player.first_name.ilike(like),
-                          Player.last_name.ilike(like),
+                          player_search_clause(q, identifiers=True),
                           EventCategory.name.ilike(like)
                       )))
 
@@ -4631,90 +5664,10 @@ def event_export_csv(event_id: int):
 @app.route("/admin/events/<int:event_id>/export_full", endpoint='event_export_full')
 @admin_required
 def event_export_full(event_id: int):
-    """Export full event data as a ZIP: event.json, categories.csv, registrations.csv,
-    per-player CSVs and photos."""
+    """Export full event data as a streamed ZIP: event.json, categories.csv, registrations.csv,
+    per-player CSVs and, with ?photos=1, the players' photos."""
     ev = Event.query.get_or_404(event_id)
-    cats = EventCategory.query.filter_by(event_id=ev.id).order_by(EventCategory.name.asc()).all()
-    regs = (EventRegistration.query
-            .filter_by(event_id=ev.id)
-            .join(Player, Player.id == EventRegistration.player_id)
-            .order_by(Player.last_name.asc(), Player.first_name.asc())
-            .all())
-
-    import json
-    import csv
-    from io import StringIO, BytesIO
-    import zipfile
-
-    # Prepare per-player list
-    player_ids = {r.player_id for r in regs if r.player_id}
-    players = Player.query.filter(Player.id.in_(player_ids)).all() if player_ids else []
-
-    mem_zip = BytesIO()
-    with zipfile.ZipFile(mem_zip, mode='w', compression=zipfile.ZIP_DEFLATED) as zf:
-        # event JSON
-        ev_dict = {
-            'id': ev.id,
-            'title': ev.title,
-            'start_date': ev.start_date.isoformat() if ev.start_date else None,
-            'end_date': ev.end_date.isoformat() if ev.end_date else None,
-            'location': ev.location,
-            'sportdata_url': ev.sportdata_url,
-            'notes': ev.notes,
-        }
-        zf.writestr(f'event_{ev.id}_detail.json', json.dumps(ev_dict, ensure_ascii=False, indent=2))
-
-        # categories CSV
-        cat_out = StringIO()
-        cat_writer = csv.writer(cat_out)
-        cat_writer.writerow(['id', 'name', 'age_from', 'age_to', 'sex', 'fee', 'team_size', 'kyu', 'dan', 'other_cutoff_date', 'limit_team', 'limit'])
-        for c in cats:
-            cat_writer.writerow([c.id, c.name, c.age_from, c.age_to, c.sex, c.fee, c.team_size, c.kyu, c.dan, c.other_cutoff_date, c.limit_team, c.limit])
-        zf.writestr(f'event_{ev.id}_categories.csv', cat_out.getvalue())
-
-        # registrations CSV
-        reg_out = StringIO()
-        reg_writer = csv.writer(reg_out)
-        reg_writer.writerow(['id', 'player_id', 'player_name', 'fee_override', 'computed_fee', 'paid', 'paid_on', 'note', 'categories', 'medals'])
-        for r in regs:
-            cats_list = []
-            medals_list = []
-            for rc in r.reg_categories or []:
-                # rc.category may be loaded; protect against None
-                cats_list.append(rc.category.name if rc.category else '')
-                medals_list.append(rc.medal or '')
-            computed = r.fee_override if r.fee_override is not None else (sum((rc.category.fee or 0) for rc in r.reg_categories) if r.reg_categories else '')
-            reg_writer.writerow([r.id, r.player_id, r.player.full_name() if r.player else '', r.fee_override, computed, r.paid, (r.paid_on.isoformat() if r.paid_on else ''), '', '; '.join(cats_list), '; '.join(medals_list)])
-        zf.writestr(f'event_{ev.id}_registrations.csv', reg_out.getvalue())
-
-        # per-player CSVs
-        fieldnames = [
-            'id', 'first_name', 'last_name', 'gender', 'birthdate', 'pn',
-            'belt_rank', 'grade_level', 'grade_date', 'discipline', 'weight_kg', 'height_cm',
-            'email', 'phone', 'join_date', 'active_member', 'notes', 'photo_filename',
-            'sportdata_wkf_url', 'sportdata_bnfk_url', 'sportdata_enso_url',
-            'medical_exam_date', 'medical_expiry_date', 'insurance_expiry_date',
-            'monthly_fee_amount', 'monthly_fee_is_monthly',
-            'mother_name', 'mother_phone', 'father_name', 'father_phone'
-        ]
-        for p in players:
-            out = StringIO()
-            dw = csv.DictWriter(out, fieldnames=fieldnames)
-            dw.writeheader()
-            row = {k: getattr(p, k, '') for k in fieldnames}
-            for k, v in row.items():
-                if hasattr(v, 'isoformat'):
-                    row[k] = v.isoformat()
-                elif isinstance(v, bool):
-                    row[k] = str(v)
-            dw.writerow(row)
-            zf.writestr(f'players/player_{p.id}_{(p.last_name or "").replace(" ","_")}.csv', out.getvalue())
-
-            # photos are intentionally omitted from full export
-
-    mem_zip.seek(0)
-    headers = {'Content-Disposition': f'attachment; filename="event_{ev.id}_full_export.zip"'}
-    return Response(mem_zip.getvalue(), mimetype='application/zip', headers=headers)
+    return zip_response(event_export_entries(ev, '', wants_photos()), f"event_{ev.id}_full_export.zip")
 
 
 @app.route('/admin/events/import_zip', methods=['POST'])
@@ -4735,9 +5688,8 @@ def import_event_zip():
         import csv
         import json as _json
 
-        data = f.read()
-        bio = io.BytesIO(data)
-        with zipfile.ZipFile(bio) as z:
+        # Read entries straight from the spooled upload; only the central directory is loaded up front
+        with zipfile.ZipFile(f.stream) as z:
             app.logger.info(f"ZIP contents: {z.namelist()}")
             # Find event detail JSON matching export pattern: event_<id>_detail.json
             ev_json = None
@@ -4909,135 +5861,79 @@ def import_players_zip():
     if f.filename == '':
         flash(_('No file selected'), 'danger')
         return redirect(request.referrer or url_for('list_players'))
+    copied = []  # photos written to UPLOAD_FOLDER, removed again if the import does not commit
+
+    def remove_copied_photos():
+        for path in copied:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
     try:
         import io
         import zipfile
         import csv
 
-        data = f.read()
-        bio = io.BytesIO(data)
-        created = 0
-        updated = 0
-        skipped = 0
-        errors = 0
-        with zipfile.ZipFile(bio) as z:
+        # Read entries straight from the spooled upload; only the central directory is loaded up front
+        with zipfile.ZipFile(f.stream) as z:
             app.logger.info(f"Players ZIP contents: {z.namelist()}")
-            # compute used ids to allocate first-available ids (include ones we create during this run)
-            existing_ids = {r[0] for r in db.session.query(Player.id).all()}
-            used_ids = set(existing_ids)
-
-            def first_available_id():
-                i = 1
-                while i in used_ids:
-                    i += 1
-                used_ids.add(i)
-                return i
-
-            # Process files under players/ or any CSV files that look like player exports
-            for name in z.namelist():
-                base = os.path.basename(name)
-                if not base.lower().endswith('.csv'):
-                    continue
-                # prefer files in players/ folder but accept any csv
-                if ('players/' not in name) and (not base.startswith('player_')):
-                    continue
-                with z.open(name) as pf:
-                    txt = io.TextIOWrapper(pf, encoding='utf-8')
-                    reader = csv.DictReader(txt)
-                    app.logger.info(f"Player CSV headers for {name}: {reader.fieldnames}")
-                    if not reader.fieldnames:
-                        continue
-                    for i, row in enumerate(reader):
-                        try:
-                            # normalize keys
-                            norm = { (k.strip().lower() if k else k): (v.strip() if isinstance(v, str) else v) for k, v in row.items() }
-
-                            def parse_date(v):
-                                if not v:
-                                    return None
-                                try:
-                                    return date.fromisoformat(v)
-                                except Exception:
-                                    return None
-
-                            def parse_int(v):
-                                if not v:
-                                    return None
-                                try:
-                                    return int(float(v))
-                                except Exception:
-                                    return None
-
-                            fn = norm.get('first_name') or ''
-                            ln = norm.get('last_name') or ''
-                            if not (fn and ln):
-                                skipped += 1
-                                continue
+            # Photos exported alongside the profiles (players/photos/ or photos/), by file name
+            photos = {os.path.basename(n): n for n in z.namelist()
+                      if f'/{os.path.dirname(n)}'.endswith('/photos') and allowed_file(n)}
 
-                            # Always create a new Player; do NOT overwrite existing records.
-                            # PN is required — skip rows without PN to avoid creating invalid records.
-                            pn_val = norm.get('pn') or None
-                            if not pn_val:
-                                skipped += 1
-                                continue
-                            # Skip if PN already exists in DB
-                            if Player.query.filter_by(pn=pn_val).first():
-                                app.logger.info(f"Skipping import: PN already exists {pn_val}")
-                                skipped += 1
-                                continue
-                            # Assign the first available numeric id (fill gaps) to the new player.
-                            p = Player(
-                                first_name=fn,
-                                last_name=ln,
-                                gender=norm.get('gender') or None,
-                                birthdate=parse_date(norm.get('birthdate')),
-                                pn=pn_val,
-                                belt_rank=norm.get('belt_rank') or 'White',
-                                grade_level=norm.get('grade_level') or None,
-                                grade_date=parse_date(norm.get('grade_date')),
-                                discipline=norm.get('discipline') or 'All',
-                                weight_kg=parse_int(norm.get('weight_kg')),
-                                height_cm=parse_int(norm.get('height_cm')),
-                                email=norm.get('email') or None,
-                                phone=norm.get('phone') or None,
-                                join_date=parse_date(norm.get('join_date')),
-                                active_member=(str(norm.get('active_member')).lower() in ('1','true','yes')) if norm.get('active_member') is not None else True,
-                                notes=norm.get('notes') or None,
-                                sportdata_wkf_url=norm.get('sportdata_wkf_url') or None,
-                                sportdata_bnfk_url=norm.get('sportdata_bnfk_url') or None,
-                                sportdata_enso_url=norm.get('sportdata_enso_url') or None,
-                                medical_exam_date=parse_date(norm.get('medical_exam_date')),
-                                medical_expiry_date=parse_date(norm.get('medical_expiry_date')),
-                                insurance_expiry_date=parse_date(norm.get('insurance_expiry_date')),
-                                monthly_fee_amount=parse_int(norm.get('monthly_fee_amount')),
-                                monthly_fee_is_monthly=(str(norm.get('monthly_fee_is_monthly')).lower() in ('1','true','yes')) if norm.get('monthly_fee_is_monthly') is not None else True,
-                                mother_name=norm.get('mother_name') or None,
-                                mother_phone=norm.get('mother_phone') or None,
-                                father_name=norm.get('father_name') or None,
-                                father_phone=norm.get('father_phone') or None,
-                            )
-                            # allocate id
-                            try:
-                                p.id = first_available_id()
-                            except Exception:
-                                pass
-                            db.session.add(p)
-                            created += 1
-                        except Exception:
-                            app.logger.exception('Error importing player row')
-                            errors += 1
+            def rows():
+                # Process files under players/ or any CSV files that look like player exports
+                for name in z.namelist():
+                    base = os.path.basename(name)
+                    if not base.lower().endswith('.csv'):
+                        continue
+                    # prefer files in players/ folder but accept any csv
+                    if ('players/' not in name) and (not base.startswith('player_')):
+                        continue
+                    with z.open(name) as pf:
+                        reader = csv.DictReader(io.TextIOWrapper(pf, encoding='utf-8'))
+                        app.logger.info(f"Player CSV headers for {name}: {reader.fieldnames}")
+                        for i, row in enumerate(reader, start=1):
+                            # keep photo_filename only when the photo itself is in the archive
+                            photo = os.path.basename(row.pop('photo_filename', None) or '')
+                            if photo in photos:
+                                row['photo_filename'] = photo
+                            yield f"{name} row {i}", row
+
+            # Existing players (by PN) are never overwritten; new ones get the first free ids
+            plan = PlayerImportPlan(rows(), update_existing=False, fill_id_gaps=True)
+            for err in plan.errors:
+                app.logger.info(f"Skipping player row: {err}")
+            if request.form.get('dry_run'):
+                return render_template('players_import_preview.html', plan=plan, filename=f.filename)
+            # Copy the new players' photos one entry at a time, under names free in UPLOAD_FOLDER
+            for new in plan.creates:
+                member = photos.get(new['photo_filename'] or '')
+                if member:
+                    new['photo_filename'] = unique_upload_name(os.path.basename(member))
+                    path = os.path.join(UPLOAD_FOLDER, new['photo_filename'])
+                    copied.append(path)
+                    with z.open(member) as src, open(path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst)
+            plan.apply()
             db.session.commit()
-            # Ensure monthly payments exist for newly imported players so dues show up
-            try:
-                from datetime import date as _date
-                ensure_payments_for_month(_date.today().year, _date.today().month)
-            except Exception:
-                app.logger.exception('Failed to ensure monthly payments after import')
-        flash(f'Players import finished. Created: {created}. Updated: {updated}. Skipped: {skipped}. Errors: {errors}.', 'success')
+            copied.clear()
+        # Ensure monthly payments exist for newly imported players so dues show up
+        try:
+            ensure_payments_for_month(date.today().year, date.today().month)
+        except Exception:
+            app.logger.exception('Failed to ensure monthly payments after import')
+        flash(f'Players import finished. Created: {len(plan.creates)}. Updated: {len(plan.updates)}. Skipped: {plan.skipped}. Errors: {len(plan.errors)}.', 'success')
         return redirect(url_for('list_players'))
     except zipfile.BadZipFile:
+        # also raised for a corrupt member while its photo is being copied
+        db.session.rollback()
+        remove_copied_photos()
         flash('Uploaded file is not a valid ZIP archive', 'danger')
     except Exception as e:
+        db.session.rollback()
+        remove_copied_photos()
         app.logger.exception('Players import failed')
         flash(f'Import failed: {e}', 'danger')
     return redirect(request.referrer or url_for('list_players'))
@@ -5045,6 +5941,7 @@ def import_players_zip():
 # -------- Medals Year Report --------
 @app.route("/reports/medals")
 @admin_required
+@cached_report("player", "event", "event_registration", "event_reg_category")
 def medals_report():
     try:
         year = int(request.args.get("year") or date.today().year)
@@ -5085,22 +5982,39 @@ def medals_report():
         club_totals=club_totals
     )
 
+DEBT_SORTS = {
+    "created": (PaymentRecord.created_at, PaymentRecord.id),
+    "amount": (PaymentRecord.amount, PaymentRecord.id),
+    "player": (Player.last_name, Player.first_name, PaymentRecord.id),
+}
+
 @app.route('/admin/reports/debts')
 @admin_required
+@cached_report("player", "payment_record")
 def report_debts():
-    # find true AUTO_DEBT records that have no related payment
-    debts = (PaymentRecord.query
-             .filter(PaymentRecord.note.like('%AUTO_DEBT%'))
-             .order_by(PaymentRecord.created_at.desc())
-             .all())
-    outstanding = []
-    for d in debts:
-        if not is_auto_debt_note(d.note):
-            continue
-        paid = PaymentRecord.query.filter_by(related_receipt_id=d.id).first()
-        if not paid:
-            outstanding.append(d)
-    return render_template('report_debts.html', debts=outstanding)
+    # Lists the open debt receipts one by one; player_month_summary has no debt columns to read instead
+    sort = request.args.get("sort", "created")
+    if sort not in DEBT_SORTS:
+        sort = "created"
+    direction = "asc" if request.args.get("dir") == "asc" else "desc"
+    limit = page_limit_arg()
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+    except ValueError:
+        page = 1
+
+    open_debts = PaymentRecord.query.filter(PaymentRecord.debt_status == 'open')
+    # Counted without the player join, which cannot change the count and keeps the count on the index
+    total = open_debts.count()
+    query = (open_debts
+             .outerjoin(Player, Player.id == PaymentRecord.player_id)
+             .options(contains_eager(PaymentRecord.player)))
+    pages = max(1, -(-total // limit))
+    page = min(page, pages)
+    order = [c.asc() if direction == "asc" else c.desc() for c in DEBT_SORTS[sort]]
+    debts = query.order_by(*order).offset((page - 1) * limit).limit(limit).all()
+    return render_template('report_debts.html', debts=debts, total=total, page=page, pages=pages,
+                           limit=limit, sort=sort, direction=direction)
 
 # -------- Admin tools to fix missing receipt numbers ----------
 @app.route("/admin/tools/fix_receipt_numbers", methods=["POST"])
@@ -5118,63 +6032,343 @@ def fix_receipt_numbers():
     flash(f"Assigned receipt numbers to {cnt} receipt(s).", "success")
     return redirect(request.referrer or url_for('list_players'))
 
+# -------- Admin trigger for the monthly dues job ----------
+@app.route("/admin/tools/generate_monthly_dues", methods=["POST"])
+@admin_required
+def generate_monthly_dues():
+    year, month = parse_month_str(request.form.get("month"))
+    created = ensure_payments_for_month(year, month)
+    flash(_("Generated %(count)s monthly due(s) for %(month)s.") % {"count": created, "month": f"{year:04d}-{month:02d}"}, "success")
+    return redirect(request.referrer or url_for('fees_report', month=f"{year:04d}-{month:02d}"))
+
+# -------- Admin rebuild of the player x month rollup ----------
+@app.route("/admin/tools/rebuild_month_summary", methods=["POST"])
+@admin_required
+def rebuild_month_summary():
+    rows = rebuild_player_month_summary(db.session.connection())
+    db.session.info.setdefault("written_tables", set()).add("player_month_summary")
+    db.session.commit()
+    flash(_("Rebuilt the monthly summary: %(count)s row(s).") % {"count": rows}, "success")
+    return redirect(request.referrer or url_for('fees_report'))
+
 # -------- Migration ----------
+# Ordered, versioned schema migrations. Each upgrade runs once, in its own transaction, and
+# is recorded in schema_version; an up-to-date database only pays for reading the version.
+# Upgrades stay idempotent (column checks, IF NOT EXISTS) because databases created before
+# schema_version existed start from version 0.
+
+def add_missing_columns(conn, table: str, columns: list) -> list:
+    """ALTER TABLE ADD COLUMN for each (name, type) the table lacks; returns the names added."""
+    existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+    added = []
+    for col, coltype in columns:
+        if col not in existing:
+            col_sql = f'"{col}"' if col in ("limit", "limit_team") else col
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col_sql} {coltype}"))
+            added.append(col)
+    return added
+
+def create_unique_index_if_clean(conn, name: str, table: str, columns: str) -> bool:
+    """CREATE UNIQUE INDEX unless existing rows already repeat the key; those are logged and the index skipped.
+
+    Older databases could hold such duplicates, and startup used to carry on without the index.
+    """
+    not_null = " AND ".join(f"{col.strip()} IS NOT NULL" for col in columns.split(","))
+    dupes = conn.execute(text(
+        f"SELECT {columns}, COUNT(*) FROM {table} WHERE {not_null} GROUP BY {columns} HAVING COUNT(*) > 1"
+    )).all()
+    if dupes:
+        app.logger.warning("Skipping %s: %d duplicate (%s) keys in %s, first: %s; fix them and recreate the index",
+                           name, len(dupes), columns, table, [tuple(row) for row in dupes[:10]])
+        return False
+    conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+    return True
+
+def migration_0001_profile_columns(conn):
+    add_missing_columns(conn, "event_category", [
+        ("age_from", "INTEGER"),
+        ("age_to", "INTEGER"),
+        ("sex", "VARCHAR(10)"),
+        ("team_size", "VARCHAR(20)"),
+        ("kyu", "VARCHAR(20)"),
+        ("dan", "VARCHAR(20)"),
+        ("other_cutoff_date", "VARCHAR(40)"),
+        ("limit_team", "VARCHAR(20)"),
+        ("limit", "VARCHAR(20)"),
+    ])
+    add_missing_columns(conn, "player", [
+        ("pn", "VARCHAR(20)"),
+        ("sportdata_wkf_url", "VARCHAR(255)"),
+        ("sportdata_bnfk_url", "VARCHAR(255)"),
+        ("sportdata_enso_url", "VARCHAR(255)"),
+        ("grade_level", "VARCHAR(20)"),
+        ("grade_date", "DATE"),
+        ("medical_exam_date", "DATE"),
+        ("medical_expiry_date", "DATE"),
+        ("insurance_expiry_date", "DATE"),
+        ("monthly_fee_amount", "INTEGER"),
+        ("monthly_fee_is_monthly", "BOOLEAN"),
+        ("mother_name", "VARCHAR(120)"),
+        ("mother_phone", "VARCHAR(40)"),
+        ("father_name", "VARCHAR(120)"),
+        ("father_phone", "VARCHAR(40)"),
+        ("card_id", "VARCHAR(50)"),
+    ])
+    add_missing_columns(conn, "payment_record", [("related_receipt_id", "INTEGER")])
+
+def migration_0002_player_pn_links(conn):
+    # PN-based relations: add player_pn to related tables and backfill it once from player_id
+    for tbl in ("training_session", "payment", "event_registration", "payment_record"):
+        add_missing_columns(conn, tbl, [("player_pn", "VARCHAR(20)")])
+    create_unique_index_if_clean(conn, "uq_player_pn", "player", "pn")
+    for tbl in ("training_session", "payment", "event_registration", "payment_record"):
+        conn.execute(text(f"UPDATE {tbl} SET player_pn = (SELECT pn FROM player WHERE player.id = {tbl}.player_id) WHERE player_pn IS NULL"))
+
+def migration_0003_session_date_unique(conn):
+    create_unique_index_if_clean(conn, "uq_player_session_date", "training_session", "player_id, date")
+
+PLAYER_FTS_INSERT = "INSERT INTO player_fts (rowid, name, name_translit, pn, card_id) "
+
+def migration_0004_player_search_index(conn):
+    """player_fts FTS5 table plus the triggers that keep it in sync with player (see user search)."""
+    try:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS player_fts USING fts5("
+            "name, name_translit, pn, card_id, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        ))
+    except Exception:
+        app.logger.warning("SQLite FTS5 not available, player search uses LIKE")
+        return
+    new_row = ("VALUES (new.id, new.first_name || ' ' || new.last_name, "
+               "player_translit(new.first_name || ' ' || new.last_name), new.pn, new.card_id)")
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS player_fts_ai AFTER INSERT ON player BEGIN "
+        + PLAYER_FTS_INSERT + new_row + "; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS player_fts_au AFTER UPDATE OF first_name, last_name, pn, card_id ON player BEGIN "
+        "DELETE FROM player_fts WHERE rowid = old.id; "
+        + PLAYER_FTS_INSERT + new_row + "; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS player_fts_ad AFTER DELETE ON player BEGIN "
+        "DELETE FROM player_fts WHERE rowid = old.id; END"
+    ))
+    conn.execute(text("DELETE FROM player_fts"))
+    conn.execute(text(
+        PLAYER_FTS_INSERT + "SELECT id, first_name || ' ' || last_name, "
+        "player_translit(first_name || ' ' || last_name), pn, card_id FROM player"
+    ))
+
+HOT_QUERY_INDEXES = [
+    # PN-keyed history lookups on the player detail, debts and receipts pages
+    ("ix_training_session_pn_date_paid", "training_session", "player_pn, date, paid"),
+    ("ix_payment_pn_year_month_paid", "payment", "player_pn, year, month, paid"),
+    ("ix_payment_record_pn_kind_paid_at", "payment_record", "player_pn, kind, paid_at"),
+    ("ix_event_registration_pn_paid", "event_registration", "player_pn, paid"),
+    ("ix_training_session_session_id", "training_session", "session_id"),
+    # Day / month scoped lists (kiosk check-ins, fees report) and the name-ordered player pages
+    ("ix_training_session_date_pn", "training_session", "date, player_pn"),
+    ("ix_payment_year_month", "payment", "year, month"),
+    ("ix_player_name", "player", "last_name, first_name, id"),
+    ("ix_player_first_name", "player", "first_name, last_name, id"),
+]
+
+def migration_0005_hot_query_indexes(conn):
+    for name, table, columns in HOT_QUERY_INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+    # Refresh planner statistics so the composite indexes win over the single-column ones
+    conn.execute(text("ANALYZE"))
+
+def migration_0006_receipt_year_month(conn):
+    add_missing_columns(conn, "payment_record", [("paid_year_month", "INTEGER")])
+    conn.execute(text(
+        "UPDATE payment_record SET paid_year_month = CAST(strftime('%Y%m', paid_at) AS INTEGER) "
+        "WHERE paid_at IS NOT NULL"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_payment_record_paid_year_month ON payment_record (paid_year_month)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_payment_record_pn_kind_ym ON payment_record (player_pn, kind, paid_year_month)"
+    ))
+
+def migration_0007_player_month_summary(conn):
+    # Frozen copy of the version 7 table and rollup SQL; later changes to the rollup get their own migration
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS player_month_summary ("
+        "player_pn VARCHAR(20) NOT NULL, year INTEGER NOT NULL, month INTEGER NOT NULL, "
+        "monthly_amount INTEGER NOT NULL, monthly_due INTEGER NOT NULL, monthly_income INTEGER NOT NULL, "
+        "session_income INTEGER NOT NULL, event_income INTEGER NOT NULL, bulk_income INTEGER NOT NULL, "
+        "sessions_taken INTEGER NOT NULL, sessions_paid INTEGER NOT NULL, "
+        "PRIMARY KEY (player_pn, year, month))"
+    ))
+    conn.execute(text("DELETE FROM player_month_summary"))
+    conn.execute(text("""
+        INSERT OR REPLACE INTO player_month_summary
+            (player_pn, year, month, monthly_amount, monthly_due, monthly_income, session_income,
+             event_income, bulk_income, sessions_taken, sessions_paid)
+        SELECT k.pn, k.y, k.m,
+            COALESCE((SELECT SUM(amount) FROM payment WHERE player_pn = k.pn AND year = k.y AND month = k.m), 0),
+            COALESCE((SELECT SUM(amount) FROM payment WHERE player_pn = k.pn AND year = k.y AND month = k.m AND paid = 0), 0),
+            COALESCE((SELECT SUM(amount) FROM payment_record WHERE player_pn = k.pn AND kind = 'training_month' AND paid_year_month = k.y * 100 + k.m), 0),
+            COALESCE((SELECT SUM(amount) FROM payment_record WHERE player_pn = k.pn AND kind = 'training_session' AND paid_year_month = k.y * 100 + k.m), 0),
+            COALESCE((SELECT SUM(amount) FROM payment_record WHERE player_pn = k.pn AND kind = 'event' AND paid_year_month = k.y * 100 + k.m), 0),
+            COALESCE((SELECT SUM(amount) FROM payment_record WHERE player_pn = k.pn AND kind = 'bulk_payment' AND paid_year_month = k.y * 100 + k.m), 0),
+            (SELECT COUNT(*) FROM training_session WHERE player_pn = k.pn
+                AND date >= printf('%04d-%02d-01', k.y, k.m) AND date < date(printf('%04d-%02d-01', k.y, k.m), '+1 month')),
+            (SELECT COUNT(*) FROM training_session WHERE player_pn = k.pn AND paid = 1
+                AND date >= printf('%04d-%02d-01', k.y, k.m) AND date < date(printf('%04d-%02d-01', k.y, k.m), '+1 month'))
+        FROM (
+            SELECT player_pn AS pn, year AS y, month AS m FROM payment WHERE player_pn IS NOT NULL
+            UNION SELECT player_pn, paid_year_month / 100, paid_year_month % 100 FROM payment_record
+                WHERE player_pn IS NOT NULL AND paid_year_month IS NOT NULL
+                AND kind IN ('training_month', 'training_session', 'event', 'bulk_payment')
+            UNION SELECT player_pn, CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER)
+                FROM training_session WHERE player_pn IS NOT NULL
+        ) k
+    """))
+
+def migration_0008_debt_status(conn):
+    add_missing_columns(conn, "payment_record", [("is_debt", "BOOLEAN NOT NULL DEFAULT 0"), ("debt_status", "VARCHAR(10)")])
+    # Same rules the note scans used: 'AUTO_DEBT from' marks a debt (case-sensitive, like is_auto_debt_note);
+    # it is paid once marked AUTO_DEBT_PAID or once a payment points back at it
+    conn.execute(text(
+        "UPDATE payment_record SET is_debt = 1, debt_status = CASE "
+        "WHEN instr(note, 'AUTO_DEBT_PAID') > 0 "
+        "OR EXISTS (SELECT 1 FROM payment_record p WHERE p.related_receipt_id = payment_record.id) "
+        "THEN 'paid' ELSE 'open' END "
+        "WHERE instr(note, 'AUTO_DEBT from') > 0"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_payment_record_debt_status ON payment_record (debt_status, player_pn)"))
+
+def migration_0009_month_receipt_index(conn):
+    # Monthly-fee receipts are looked up club-wide by (kind, year, month) in the fees report
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_payment_record_kind_year_month ON payment_record (kind, year, month)"))
+
+def migration_0010_receipt_import_key(conn):
+    add_missing_columns(conn, "payment_record", [("import_key", "VARCHAR(40)")])
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_payment_record_import_key ON payment_record (import_key)"))
+
+def migration_0011_player_name_translit(conn):
+    # The player_fts triggers called player_translit(), which only this app's connections define, so any
+    # other SQLite client failed to write player rows; they now copy a name_translit column filled in Python
+    add_missing_columns(conn, "player", [("name_translit", "VARCHAR(200)")])
+    rows = conn.execute(text("SELECT id, first_name, last_name FROM player")).all()
+    if rows:
+        conn.execute(text("UPDATE player SET name_translit = :name_translit WHERE id = :id"),
+                     [{"id": pid, "name_translit": player_name_translit(fn, ln)} for pid, fn, ln in rows])
+    if not conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player_fts'")).first():
+        return
+    for trigger in ("player_fts_ai", "player_fts_au", "player_fts_ad"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    insert_new = ("INSERT INTO player_fts (rowid, name, name_translit, pn, card_id) "
+                  "VALUES (new.id, new.first_name || ' ' || new.last_name, new.name_translit, new.pn, new.card_id)")
+    conn.execute(text(
+        "CREATE TRIGGER player_fts_ai AFTER INSERT ON player BEGIN " + insert_new + "; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER player_fts_au AFTER UPDATE OF first_name, last_name, name_translit, pn, card_id ON player BEGIN "
+        "DELETE FROM player_fts WHERE rowid = old.id; " + insert_new + "; END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER player_fts_ad AFTER DELETE ON player BEGIN "
+        "DELETE FROM player_fts WHERE rowid = old.id; END"
+    ))
+    conn.execute(text("DELETE FROM player_fts"))
+    conn.execute(text(
+        "INSERT INTO player_fts (rowid, name, name_translit, pn, card_id) "
+        "SELECT id, first_name || ' ' || last_name, name_translit, pn, card_id FROM player"
+    ))
+
+def migration_0012_player_name_nocase_indexes(conn):
+    # The players list / kiosk keyset pages order names with COLLATE NOCASE
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_player_name_nocase "
+        "ON player (last_name COLLATE NOCASE, first_name COLLATE NOCASE, id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_player_first_name_nocase "
+        "ON player (first_name COLLATE NOCASE, last_name COLLATE NOCASE, id)"
+    ))
+
+def migration_0013_rollup_null_paid_due(conn):
+    # Monthly fees with paid IS NULL now count as due in the rollup, as on the raw report path
+    conn.execute(text(
+        "UPDATE player_month_summary SET monthly_due = COALESCE((SELECT SUM(p.amount) FROM payment p "
+        "WHERE p.player_pn = player_month_summary.player_pn AND p.year = player_month_summary.year "
+        "AND p.month = player_month_summary.month AND COALESCE(p.paid, 0) = 0), 0) "
+        "WHERE EXISTS (SELECT 1 FROM payment p WHERE p.player_pn = player_month_summary.player_pn "
+        "AND p.year = player_month_summary.year AND p.month = player_month_summary.month AND p.paid IS NULL)"
+    ))
+
+def migration_0014_player_name_sort_keys(conn):
+    # COLLATE NOCASE only folds ASCII, so Cyrillic names sorted capitals first; the players list / kiosk
+    # now order by names case-folded in Python, and the *_nocase indexes have no users left
+    add_missing_columns(conn, "player", [("first_name_key", "VARCHAR(80)"), ("last_name_key", "VARCHAR(80)")])
+    rows = conn.execute(text("SELECT id, first_name, last_name FROM player")).all()
+    if rows:
+        conn.execute(text("UPDATE player SET first_name_key = :first_name_key, last_name_key = :last_name_key WHERE id = :id"),
+                     [{"id": pid, "first_name_key": name_sort_key(fn), "last_name_key": name_sort_key(ln)}
+                      for pid, fn, ln in rows])
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_player_name_key ON player (last_name_key, first_name_key, id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_player_first_name_key ON player (first_name_key, last_name_key, id)"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_player_name_nocase"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_player_first_name_nocase"))
+
+# (version, name, upgrade) in the order they must run; never renumber or edit an applied one
+MIGRATIONS = [
+    (1, "player, event category and receipt columns", migration_0001_profile_columns),
+    (2, "player_pn link columns", migration_0002_player_pn_links),
+    (3, "unique training session per player and date", migration_0003_session_date_unique),
+    (4, "player full-text search index", migration_0004_player_search_index),
+    (5, "composite indexes for hot queries", migration_0005_hot_query_indexes),
+    (6, "receipt paid year/month bucket", migration_0006_receipt_year_month),
+    (7, "player x month summary", migration_0007_player_month_summary),
+    (8, "structured debt status on receipts", migration_0008_debt_status),
+    (9, "monthly receipt lookup index", migration_0009_month_receipt_index),
+    (10, "receipt import key", migration_0010_receipt_import_key),
+    (11, "player name transliteration column", migration_0011_player_name_translit),
+    (12, "case-insensitive player name indexes", migration_0012_player_name_nocase_indexes),
+    (13, "unpaid-if-null monthly dues in the rollup", migration_0013_rollup_null_paid_due),
+    (14, "case-folded player name sort keys", migration_0014_player_name_sort_keys),
+]
+
+def schema_version(conn) -> int:
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'")).first()
+    if not exists:
+        return 0
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+def run_migrations() -> list:
+    """Create missing tables and apply pending migrations in order; returns the names applied."""
+    with db.engine.connect() as conn:
+        version = schema_version(conn)
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    if not pending:
+        return []
+    db.create_all()
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(120) NOT NULL, applied_at DATETIME NOT NULL)"
+        ))
+    applied = []
+    for number, name, upgrade in pending:
+        with db.engine.begin() as conn:
+            upgrade(conn)
+            conn.execute(text("INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                         {"version": number, "name": name, "applied_at": datetime.now()})
+        app.logger.info("Applied migration %04d: %s", number, name)
+        applied.append(name)
+    return applied
+
 @app.route("/admin/migrate")
 @admin_required
 def migrate():
     try:
-        with db.engine.begin() as conn:
-            # --- EventCategory columns migration ---
-            result3 = conn.execute(text("PRAGMA table_info(event_category)"))
-            existing3 = {row[1] for row in result3}
-            eventcat_cols = [
-                ("age_from", "INTEGER"),
-                ("age_to", "INTEGER"),
-                ("sex", "VARCHAR(10)"),
-                ("team_size", "VARCHAR(20)"),
-                ("kyu", "VARCHAR(20)"),
-                ("dan", "VARCHAR(20)"),
-                ("other_cutoff_date", "VARCHAR(40)"),
-                ("limit_team", "VARCHAR(20)"),
-                ("limit", "VARCHAR(20)")
-            ]
-            for col, t in eventcat_cols:
-                col_sql = f'"{col}"' if col in ("limit", "limit_team") else col
-                if col not in existing3:
-                    conn.execute(text(f"ALTER TABLE event_category ADD COLUMN {col_sql} {t}"))
-            result = conn.execute(text("PRAGMA table_info(player)"))
-            existing = {row[1] for row in result}
-            to_add = []
-            if "sportdata_wkf_url" not in existing: to_add.append(("sportdata_wkf_url", "VARCHAR(255)"))
-            if "sportdata_bnfk_url" not in existing: to_add.append(("sportdata_bnfk_url", "VARCHAR(255)"))
-            if "sportdata_enso_url" not in existing: to_add.append(("sportdata_enso_url", "VARCHAR(255)"))
-            if "grade_level" not in existing: to_add.append(("grade_level", "VARCHAR(20)"))
-            if "grade_date" not in existing: to_add.append(("grade_date", "DATE"))
-            if "medical_exam_date" not in existing: to_add.append(("medical_exam_date", "DATE"))
-            if "medical_expiry_date" not in existing: to_add.append(("medical_expiry_date", "DATE"))
-            if "insurance_expiry_date" not in existing: to_add.append(("insurance_expiry_date", "DATE"))
-            if "monthly_fee_amount" not in existing: to_add.append(("monthly_fee_amount", "INTEGER"))
-            if "monthly_fee_is_monthly" not in existing: to_add.append(("monthly_fee_is_monthly", "BOOLEAN"))
-            if "mother_name" not in existing: to_add.append(("mother_name", "VARCHAR(120)"))
-            if "mother_phone" not in existing: to_add.append(("mother_phone", "VARCHAR(40)"))
-            if "father_name" not in existing: to_add.append(("father_name", "VARCHAR(120)"))
-            if "father_phone" not in existing: to_add.append(("father_phone", "VARCHAR(40)"))
-            if "card_id" not in existing: to_add.append(("card_id", "VARCHAR(50)"))
-            if "pn" not in existing:
-                conn.execute(text("ALTER TABLE player ADD COLUMN pn VARCHAR(20)"))
-            for name, coltype in to_add:
-                conn.execute(text(f"ALTER TABLE player ADD COLUMN {name} {coltype}"))
-
-            result2 = conn.execute(text("PRAGMA table_info(payment_record)"))
-            existing2 = {row[1] for row in result2}
-            if "related_receipt_id" not in existing2:
-                conn.execute(text("ALTER TABLE payment_record ADD COLUMN related_receipt_id INTEGER"))
-
-        db.create_all()
-
-        if to_add:
-            added = ", ".join([name for name, _ in to_add])
-            flash(_("DB migration: added columns: {cols}").format(cols=added), "success")
+        applied = run_migrations()
+        if applied:
+            flash(_("DB migration: applied {names}").format(names="; ".join(applied)), "success")
         else:
             flash(_("DB migration: nothing to do.").format(), "info")
     except Exception as e:
@@ -5182,101 +6376,64 @@ def migrate():
 
     return redirect(url_for("list_players"))
 
-def auto_migrate_on_startup():
-    # Add unique constraint on (player_id, date) for TrainingSession
-    with db.engine.begin() as conn:
-        try:
-            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_player_session_date ON training_session (player_id, date)"))
-        except Exception:
-            pass
-    with db.engine.begin() as conn:
-        # --- EventCategory columns migration ---
-        result3 = conn.execute(text("PRAGMA table_info(event_category)"))
-        existing3 = {row[1] for row in result3}
-        eventcat_cols = [
-            ("age_from", "INTEGER"),
-            ("age_to", "INTEGER"),
-            ("sex", "VARCHAR(10)"),
-            ("team_size", "VARCHAR(20)"),
-            ("kyu", "VARCHAR(20)"),
-            ("dan", "VARCHAR(20)"),
-            ("other_cutoff_date", "VARCHAR(40)"),
-            ("limit_team", "VARCHAR(20)"),
-            ("limit", "VARCHAR(20)")
-        ]
-        for col, t in eventcat_cols:
-            col_sql = f'"{col}"' if col in ("limit", "limit_team") else col
-            if col not in existing3:
-                conn.execute(text(f"ALTER TABLE event_category ADD COLUMN {col_sql} {t}"))
-
-        result = conn.execute(text("PRAGMA table_info(player)"))
-        existing = {row[1] for row in result}
-        to_add = []
-        for col, t in [
-            ("pn", "VARCHAR(20)"),
-            ("sportdata_wkf_url", "VARCHAR(255)"),
-            ("sportdata_bnfk_url", "VARCHAR(255)"),
-            ("sportdata_enso_url", "VARCHAR(255)"),
-            ("grade_level", "VARCHAR(20)"),
-            ("grade_date", "DATE"),
-            ("medical_exam_date", "DATE"),
-            ("medical_expiry_date", "DATE"),
-            ("insurance_expiry_date", "DATE"),
-            ("monthly_fee_amount", "INTEGER"),
-            ("monthly_fee_is_monthly", "BOOLEAN"),
-            ("mother_name", "VARCHAR(120)"),
-            ("mother_phone", "VARCHAR(40)"),
-            ("father_name", "VARCHAR(120)"),
-            ("father_phone", "VARCHAR(40)"),
-            ("card_id", "VARCHAR(50)"),
-        ]:
-            if col not in existing:
-                to_add.append((col, t))
-        for name, coltype in to_add:
-            conn.execute(text(f"ALTER TABLE player ADD COLUMN {name} {coltype}"))
-        result2 = conn.execute(text("PRAGMA table_info(payment_record)"))
-        existing2 = {row[1] for row in result2}
-        if "related_receipt_id" not in existing2:
-            conn.execute(text("ALTER TABLE payment_record ADD COLUMN related_receipt_id INTEGER"))
-
-        # Add player_pn columns to related tables to support PN-based relations
-        for tbl in ("training_session", "payment", "event_registration", "payment_record"):
-            info = conn.execute(text(f"PRAGMA table_info({tbl})"))
-            cols = {row[1] for row in info}
-            if "player_pn" not in cols:
-                conn.execute(text(f"ALTER TABLE {tbl} ADD COLUMN player_pn VARCHAR(20)"))
-
-        # Ensure Player.pn is unique (create unique index)
-        try:
-            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_player_pn ON player (pn)"))
-        except Exception:
-            pass
+def register_sqlite_functions(dbapi_conn, connection_record):
+    """SQL functions used by migration 0004 (player_fts build); registered on every new connection."""
+    dbapi_conn.create_function("player_translit", 1, translit, deterministic=True)
 
-        # Backfill player_pn from existing player_id values
-        try:
-            conn.execute(text("UPDATE training_session SET player_pn = (SELECT pn FROM player WHERE player.id = training_session.player_id) WHERE player_pn IS NULL"))
-            conn.execute(text("UPDATE payment SET player_pn = (SELECT pn FROM player WHERE player.id = payment.player_id) WHERE player_pn IS NULL"))
-            conn.execute(text("UPDATE event_registration SET player_pn = (SELECT pn FROM player WHERE player.id = event_registration.player_id) WHERE player_pn IS NULL"))
-            conn.execute(text("UPDATE payment_record SET player_pn = (SELECT pn FROM player WHERE player.id = payment_record.player_id) WHERE player_pn IS NULL"))
-        except Exception:
-            app.logger.exception('Backfill player_pn failed')
+SQLITE_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SQLITE_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
 
-        # Add unique constraint on (player_id, date) for TrainingSession
-        try:
-            conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_player_session_date ON training_session (player_id, date)"))
-        except Exception:
-            pass
+def apply_sqlite_pragmas(dbapi_conn, connection_record):
+    """Apply the SQLITE_* engine profile from app.config to a new connection."""
+    cfg = app.config
+    cursor = dbapi_conn.cursor()
+    try:
+        journal_mode = str(cfg.get("SQLITE_JOURNAL_MODE") or "").upper()
+        if journal_mode in SQLITE_JOURNAL_MODES:
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        synchronous = str(cfg.get("SQLITE_SYNCHRONOUS") or "").upper()
+        if synchronous in SQLITE_SYNCHRONOUS_MODES:
+            cursor.execute(f"PRAGMA synchronous={synchronous}")
+        for pragma, key in (("busy_timeout", "SQLITE_BUSY_TIMEOUT_MS"),
+                            ("mmap_size", "SQLITE_MMAP_SIZE"),
+                            ("cache_size", "SQLITE_CACHE_SIZE")):
+            if cfg.get(key) is not None:
+                cursor.execute(f"PRAGMA {pragma}={int(cfg[key])}")
+    finally:
+        cursor.close()
+
+def player_fts_available() -> bool:
+    with db.engine.connect() as conn:
+        return conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'player_fts'")).first() is not None
 
 with app.app_context():
-    db.create_all()
+    event.listen(db.engine, "connect", apply_sqlite_pragmas)
+    event.listen(db.engine, "connect", register_sqlite_functions)
     try:
-        auto_migrate_on_startup()
+        run_migrations()
     except Exception as e:
         app.logger.exception("Auto-migrate failed: %s", e)
+    PLAYER_FTS_ENABLED = player_fts_available()
+    try:
+        replayed = checkin_spool.replay()
+        if replayed:
+            app.logger.info("Replaying %s journaled check-in(s)", replayed)
+    except Exception as e:
+        app.logger.exception("Check-in journal replay failed: %s", e)
+    try:
+        card_index.load()
+    except Exception as e:
+        app.logger.exception("Card index warm-up failed: %s", e)
 
 # Start card reader thread
 start_card_reader()
 
+# Start monthly dues job
+start_monthly_dues_job()
+
+# Start check-in journal flusher
+start_checkin_flusher()
+
 # -----------------------------
 # Admin Settings
 # -----------------------------
@@ -5535,7 +6692,6 @@ def payment_delete(payment_id: int):
 def player_due_print(player_id: int):
     month_str = request.args.get("month")
     year, month = parse_month_str(month_str)
-    ensure_payments_for_month(year, month)
 
     player = Player.query.get_or_404(player_id)
     pay = Payment.query.filter_by(player_pn=player.pn, year=year, month=month).first()
@@ -5588,6 +6744,8 @@ def player_due_print(player_id: int):
 
 @app.route("/reports/fees/period")
 @admin_required
+@cached_report("player", "payment", "payment_record", "training_session", "player_month_summary",
+               "event_registration", "event_reg_category", "event_category")
 def fees_period_report():
     # Get date range parameters
     start_date_str = request.args.get("start_date")
@@ -5611,7 +6769,73 @@ def fees_period_report():
     # Get all active players
     players = Player.query.filter_by(active_member=True).order_by(Player.last_name.asc(), Player.first_name.asc()).all()
 
-    # Aggregate data across the date range
+    # year*12+month keeps ranges across New Year intact
+    start_index = start_date.year * 12 + start_date.month
+    end_index = end_date.year * 12 + end_date.month
+    income = defaultdict(int)
+    if start_date.day == 1 and (end_date + timedelta(days=1)).day == 1:
+        # Whole months: one pass over the player x month rollup. Both paths count paid IS NULL as unpaid
+        summary_index = PlayerMonthSummary.year * 12 + PlayerMonthSummary.month
+        monthly_dues = {}
+        unpaid_sessions = {}
+        for pn, monthly_income, session_income, event_income, monthly_due, taken, paid in (db.session.query(
+                    PlayerMonthSummary.player_pn,
+                    db.func.sum(PlayerMonthSummary.monthly_income),
+                    db.func.sum(PlayerMonthSummary.session_income),
+                    db.func.sum(PlayerMonthSummary.event_income),
+                    db.func.sum(PlayerMonthSummary.monthly_due),
+                    db.func.sum(PlayerMonthSummary.sessions_taken),
+                    db.func.sum(PlayerMonthSummary.sessions_paid))
+                .filter(PlayerMonthSummary.year.between(start_date.year, end_date.year),
+                        summary_index.between(start_index, end_index))
+                .group_by(PlayerMonthSummary.player_pn)):
+            income[(pn, 'training_month')] = monthly_income
+            income[(pn, 'training_session')] = session_income
+            income[(pn, 'event')] = event_income
+            monthly_dues[pn] = monthly_due
+            unpaid_sessions[pn] = taken - paid
+    else:
+        # Each figure is one grouped query keyed by player_pn over the whole range
+        # paid_at is a datetime, so the range runs up to (not including) the day after end_date
+        paid_from = datetime.combine(start_date, datetime.min.time())
+        paid_until = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        for pn, kind, amount in (db.session.query(PaymentRecord.player_pn, PaymentRecord.kind, db.func.sum(PaymentRecord.amount))
+                                 .filter(PaymentRecord.kind.in_(('training_month', 'training_session', 'event')),
+                                         PaymentRecord.paid_at >= paid_from,
+                                         PaymentRecord.paid_at < paid_until)
+                                 .group_by(PaymentRecord.player_pn, PaymentRecord.kind)):
+            income[(pn, kind)] = int(amount or 0)
+
+        # Unpaid monthly fees whose month falls in the range
+        month_index = Payment.year * 12 + Payment.month
+        monthly_dues = dict(db.session.query(Payment.player_pn, db.func.sum(Payment.amount))
+                            .filter(db.func.coalesce(Payment.paid, False) == False,  # noqa: E712
+                                    Payment.year.between(start_date.year, end_date.year),
+                                    month_index.between(start_index, end_index))
+                            .group_by(Payment.player_pn)
+                            .all())
+
+        unpaid_sessions = dict(db.session.query(TrainingSession.player_pn, db.func.count(TrainingSession.id))
+                               .filter(db.func.coalesce(TrainingSession.paid, False) == False,  # noqa: E712
+                                       TrainingSession.date >= start_date,
+                                       TrainingSession.date <= end_date)
+                               .group_by(TrainingSession.player_pn)
+                               .all())
+
+    # Event fees are due immediately upon registration, not based on event date.
+    # Same fee rule as EventRegistration.computed_fee(): override wins, else the sum of category fees
+    reg_fees = (db.session.query(
+                    EventRegistration.player_pn.label("player_pn"),
+                    db.func.coalesce(EventRegistration.fee_override, db.func.sum(EventCategory.fee), 0).label("fee"))
+                .outerjoin(EventRegCategory, EventRegCategory.registration_id == EventRegistration.id)
+                .outerjoin(EventCategory, EventCategory.id == EventRegCategory.category_id)
+                .filter(EventRegistration.paid == False)  # noqa: E712
+                .group_by(EventRegistration.id)
+                .subquery())
+    event_dues = dict(db.session.query(reg_fees.c.player_pn, db.func.sum(reg_fees.c.fee))
+                      .group_by(reg_fees.c.player_pn)
+                      .all())
+
     report_data = {
         'monthly_fees': {'total_income': 0, 'total_due': 0, 'details': []},
         'session_fees': {'total_income': 0, 'total_due': 0, 'details': []},
@@ -5623,89 +6847,25 @@ def fees_period_report():
     total_due = 0
 
     for player in players:
+        pn = player.pn
+        session_due = 0
+        if pn and not player.monthly_fee_is_monthly and player.monthly_fee_amount:
+            session_due = unpaid_sessions.get(pn, 0) * player.monthly_fee_amount
         player_data = {
             'player': player,
-            'monthly_income': 0,
-            'monthly_due': 0,
-            'session_income': 0,
-            'session_due': 0,
-            'event_income': 0,
-            'event_due': 0,
-            'total_income': 0,
-            'total_due': 0
+            'monthly_income': income[(pn, 'training_month')] if pn else 0,
+            'monthly_due': int(monthly_dues.get(pn) or 0) if pn else 0,
+            'session_income': income[(pn, 'training_session')] if pn else 0,
+            'session_due': session_due,
+            'event_income': income[(pn, 'event')] if pn else 0,
+            'event_due': int(event_dues.get(pn) or 0) if pn else 0,
         }
-
-        # Monthly fees - get all payments in date range
-        monthly_payments = PaymentRecord.query.filter_by(
-            player_pn=player.pn, kind='training_month'
-        ).filter(
-            PaymentRecord.paid_at >= start_date,
-            PaymentRecord.paid_at <= end_date
-        ).all()
-
-        monthly_income = sum(p.amount or 0 for p in monthly_payments)
-        player_data['monthly_income'] = monthly_income
-        report_data['monthly_fees']['total_income'] += monthly_income
-
-        # Check for unpaid monthly fees in the period
-        monthly_dues = Payment.query.filter_by(player_pn=player.pn, paid=False).filter(
-            Payment.year >= start_date.year,
-            Payment.month >= start_date.month,
-            Payment.year <= end_date.year,
-            Payment.month <= end_date.month
-        ).all()
-        monthly_due = sum(p.amount or 0 for p in monthly_dues)
-        player_data['monthly_due'] = monthly_due
-        report_data['monthly_fees']['total_due'] += monthly_due
-
-        # Session fees - per session payments
-        session_payments = PaymentRecord.query.filter_by(
-            player_pn=player.pn, kind='training_session'
-        ).filter(
-            PaymentRecord.paid_at >= start_date,
-            PaymentRecord.paid_at <= end_date
-        ).all()
-
-        session_income = sum(p.amount or 0 for p in session_payments)
-        player_data['session_income'] = session_income
-        report_data['session_fees']['total_income'] += session_income
-
-        # Calculate owed session fees
-        if not player.monthly_fee_is_monthly and player.monthly_fee_amount:
-            # Count unpaid sessions in the date range
-            unpaid_sessions = TrainingSession.query.filter_by(
-                player_pn=player.pn, paid=False
-            ).filter(
-                TrainingSession.date >= start_date,
-                TrainingSession.date <= end_date
-            ).count()
-            session_due = unpaid_sessions * player.monthly_fee_amount
-            player_data['session_due'] = session_due
-            report_data['session_fees']['total_due'] += session_due
-
-        # Event fees - event payments
-        event_payments = PaymentRecord.query.filter_by(
-            player_pn=player.pn, kind='event'
-        ).filter(
-            PaymentRecord.paid_at >= start_date,
-            PaymentRecord.paid_at <= end_date
-        ).all()
-
-        event_income = sum(p.amount or 0 for p in event_payments)
-        player_data['event_income'] = event_income
-        report_data['event_fees']['total_income'] += event_income
-
-        # Calculate owed event fees
-        # Event fees are due immediately upon registration, not based on event date
-        event_dues = EventRegistration.query.filter_by(
-            player_pn=player.pn, paid=False
-        ).all()
-
-        event_due = 0
-        for reg in event_dues:
-            event_due += reg.computed_fee() or 0
-        player_data['event_due'] = event_due
-        report_data['event_fees']['total_due'] += event_due
+        report_data['monthly_fees']['total_income'] += player_data['monthly_income']
+        report_data['monthly_fees']['total_due'] += player_data['monthly_due']
+        report_data['session_fees']['total_income'] += player_data['session_income']
+        report_data['session_fees']['total_due'] += player_data['session_due']
+        report_data['event_fees']['total_income'] += player_data['event_income']
+        report_data['event_fees']['total_due'] += player_data['event_due']
 
         # Calculate player totals
         player_data['total_income'] = player_data['monthly_income'] + player_data['session_income'] + player_data['event_income']
@@ -5995,6 +7155,8 @@ def receipt_tick_session(rid: int):
             method=None,
             note=f"AUTO_DEBT from receipt {rec.id}: {delta} extra sessions",
             related_receipt_id=rec.id,
+            is_debt=True,
+            debt_status='open',
         )
         db.session.add(debt)
         db.session.commit()
@@ -6018,24 +7180,27 @@ def record_session(player_id: int):
     # Always create a new TrainingSession row for this player
     today = date.today()
     # Avoid duplicate session for same player and date (unique constraint)
-    existing = TrainingSession.query.filter_by(player_pn=player.pn, date=today).first()
-    if existing:
+    if card_index.checked_in(player.pn, today):
         flash('Session for today already recorded.', 'info')
         return redirect(request.referrer or url_for('player_detail', player_id=player.id))
     
     # For monthly payers, mark as paid since they pay monthly
     is_paid = player.monthly_fee_is_monthly
     
-    session_id = f"{player.id}_{today.strftime('%Y%m%d')}_{datetime.now().strftime('%H%M%S%f')}"
-    ts = TrainingSession(player_id=player.id, player_pn=player.pn, date=today, session_id=session_id, paid=is_paid, created_at=datetime.now())
-    db.session.add(ts)
     try:
-        db.session.commit()
-        flash('Session recorded. New TrainingSession created.', 'success')
+        spool_checkin(player.id, player.pn, is_paid)
     except Exception:
-        db.session.rollback()
         app.logger.exception('Failed to record TrainingSession (possible race or duplicate)')
         flash('Session recording failed (possibly already exists).', 'warning')
+        return redirect(request.referrer or url_for('player_detail', player_id=player.id))
+
+    # The admin goes straight back to pages listing sessions, so insert it now instead of on the next flush
+    try:
+        checkin_spool.flush()
+        flash('Session recorded. New TrainingSession created.', 'success')
+    except Exception:
+        app.logger.exception('Check-in flush failed, keeping entries in the journal')
+        flash('Session queued; it will be saved shortly.', 'info')
 
     return redirect(request.referrer or url_for('player_detail', player_id=player.id))
 
@@ -6043,10 +7208,12 @@ def record_session(player_id: int):
 @admin_required
 def receipt_pay_debt(rid: int):
     orig = PaymentRecord.query.get_or_404(rid)
-    note = (orig.note or "")
-    if not is_auto_debt_note(note):
+    if not orig.is_debt:
         flash("Receipt is not an auto-generated training debt.", "warning")
         return redirect(url_for("receipt_view", rid=rid))
+    if orig.debt_status != 'open':
+        flash("This debt is already paid.", "info")
+        return redirect(url_for("receipt_view", rid=rid))
 
     pay = PaymentRecord(
         kind=orig.kind,
@@ -6066,7 +7233,7 @@ def receipt_pay_debt(rid: int):
     pay.related_receipt_id = orig.id
     db.session.add(pay)
     try:
-        orig.note = (orig.note or '') + ' | AUTO_DEBT_PAID'
+        mark_debt_paid(orig)
         db.session.add(orig)
         db.session.commit()
     except Exception:
@@ -6153,17 +7320,10 @@ def player_pay_due(player_id: int):
     # Debts (true AUTO_DEBT only)
     debts_to_pay = []
     if kind in ("debts", "all"):
-        debts = (PaymentRecord.query
-             .filter(PaymentRecord.player_pn == player.pn,
-                 PaymentRecord.note.like('%AUTO_DEBT%'))
-                 .order_by(PaymentRecord.paid_at.asc())
-                 .all())
-        for d in debts:
-            if not is_auto_debt_note(d.note):
-                continue
-            has_related = bool(getattr(d, 'related_payments', []))
-            if not has_related:
-                debts_to_pay.append(d)
+        debts_to_pay = (PaymentRecord.query
+                        .filter_by(player_pn=player.pn, debt_status='open')
+                        .order_by(PaymentRecord.paid_at.asc())
+                        .all())
 
     unit_price = float(player.monthly_fee_amount) if (player.monthly_fee_amount is not None and not player.monthly_fee_is_monthly) else None
 
@@ -6193,15 +7353,16 @@ def player_pay_due(player_id: int):
         created.append(pay_rec)
         total_amount += d_amt
 
-        d.note = (d.note or '') + ' | AUTO_DEBT_PAID'
+        mark_debt_paid(d)
         db.session.add(d)
+        db.session.commit()
 
     # 2) ALWAYS settle any residual owed in the same click (based on fundamentals)
     if kind in ("debts", "all") and unit_price is not None and unit_price > 0:
         # Recompute fresh from DB AFTER paying explicit debts
         sess_records_all = PaymentRecord.query.filter_by(player_pn=player.pn, kind='training_session').all()
         # Prepaid = all non-debt training receipts (MANUAL_OWED is prepaid, not debt)
-        sess_receipts = [r for r in sess_records_all if not is_auto_debt_note(r.note)]
+        sess_receipts = [r for r in sess_records_all if not r.is_debt]
         total_sessions_taken = sum((r.sessions_taken or 0) for r in sess_records_all)
         total_prepaid_amount = sum((r.amount or 0) for r in sess_receipts)
 
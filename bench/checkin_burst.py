@@ -0,0 +1,43 @@
+"""Kiosk card swipe latency for a burst of scans (new check-ins, then repeat swipes).
+
+    python bench/checkin_burst.py [--players 300] [--swipes 200] [--repo PATH]
+"""
+import time
+
+from sqlalchemy import event
+
+from common import load_app, parse_args, percentile, seed_players
+
+
+def swipe_burst(client, cards: list, counter: dict):
+    counter["n"] = 0
+    latencies, codes = [], set()
+    for card_id in cards:
+        start = time.perf_counter()
+        codes.add(client.post("/kiosk/record_session_card", data={"card_id": card_id}).status_code)
+        latencies.append(time.perf_counter() - start)
+    return latencies, codes, counter["n"]
+
+
+def main():
+    args = parse_args(__doc__.splitlines()[0], players=(300, "players with a card"),
+                      swipes=(200, "distinct cards swiped in the burst"))
+    enso = load_app(args.repo)
+    players = seed_players(enso, args.players)
+    cards = [card_id for _id, _pn, card_id in players[:args.swipes]]
+
+    counter = {"n": 0}
+    with enso.app.app_context():
+        event.listen(enso.db.engine, "before_cursor_execute", lambda *a: counter.__setitem__("n", counter["n"] + 1))
+    client = enso.app.test_client()
+    client.post("/kiosk/record_session_card", data={"card_id": "warm-up"})
+
+    for label, burst in (("new check-ins", cards), ("repeat swipes", cards)):
+        latencies, codes, queries = swipe_burst(client, burst, counter)
+        print(f"{len(burst)} {label}: mean {sum(latencies) * 1000 / len(burst):.2f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, {queries / len(burst):.1f} queries/swipe, "
+              f"status codes {sorted(codes)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Shared setup for the benchmarks: a throwaway copy of the app with its own database.
+
+Each script takes the checkout to measure (default: this one), so running it once on a
+git worktree of an older revision and once here gives the before/after numbers.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(description: str, **options) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--repo", default=REPO_DIR, help="checkout to benchmark (default: this one)")
+    for name, (default, help_text) in options.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=type(default), default=default, help=help_text)
+    return parser.parse_args()
+
+
+def load_app(repo: str = REPO_DIR):
+    """Import app.py from a temporary copy of the checkout, so the database and spool are fresh."""
+    work = tempfile.mkdtemp(prefix="enso-bench-")
+    shutil.copytree(repo, work, dirs_exist_ok=True, ignore=shutil.ignore_patterns(
+        ".git", "karate_club.db*", "checkin_spool*", "uploads", "bench", "tests", "__pycache__"))
+    os.environ["SQLITE_PATH"] = os.path.join(work, "karate_club.db")
+    os.environ["CHECKIN_SPOOL_PATH"] = os.path.join(work, "checkin_spool.jsonl")
+    os.chdir(work)
+    sys.path.insert(0, work)
+    import app
+    app.app.config["WTF_CSRF_ENABLED"] = False
+    print(f"app: {repo} (copied to {work})")
+    return app
+
+
+def seed_players(enso, n: int) -> list:
+    """n active players with a PN and a card; returns (id, pn, card_id) tuples."""
+    with enso.app.app_context():
+        for i in range(n):
+            monthly = i % 3 != 0
+            enso.db.session.add(enso.Player(
+                first_name=f"First{i}", last_name=f"Last{i:05d}", pn=f"{8000000000 + i}", card_id=f"card{i:05d}",
+                active_member=True, monthly_fee_amount=40 if monthly else 10, monthly_fee_is_monthly=monthly))
+        enso.db.session.commit()
+        today = date.today()
+        enso.ensure_payments_for_month(today.year, today.month)
+        return [(p.id, p.pn, p.card_id) for p in enso.Player.query.order_by(enso.Player.id).all()]
+
+
+def admin_client(enso):
+    client = enso.app.test_client()
+    with client.session_transaction() as s:
+        s["is_admin"] = True
+    return client
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, int(len(ordered) * p) - 1)]
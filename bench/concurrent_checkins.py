@@ -0,0 +1,67 @@
+"""Kiosk-style session writes while report pages are read concurrently (SQLite pragma profile).
+
+    python bench/concurrent_checkins.py [--players 300] [--seconds 8] [--readers 2] [--repo PATH]
+"""
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from common import admin_client, load_app, parse_args, percentile, seed_players
+
+
+def main():
+    args = parse_args(__doc__.splitlines()[0], players=(300, "players to seed"),
+                      seconds=(8.0, "how long to run"), readers=(2, "concurrent report readers"))
+    enso = load_app(args.repo)
+    players = seed_players(enso, args.players)
+    with enso.app.app_context():
+        pragma = lambda name: enso.db.session.execute(text(f"PRAGMA {name}")).scalar()
+        print(f"journal_mode {pragma('journal_mode')}, synchronous {pragma('synchronous')}, "
+              f"busy_timeout {pragma('busy_timeout')}")
+
+    stop = time.time() + args.seconds
+    write_latency, read_latency, errors = [], [], []
+
+    def writer():
+        i = 0
+        while time.time() < stop:
+            player_id, pn, _card = players[i % len(players)]
+            day = date(2020, 1, 1) + timedelta(days=i // len(players))
+            start = time.perf_counter()
+            with enso.app.app_context():
+                try:
+                    enso.db.session.add(enso.TrainingSession(player_id=player_id, player_pn=pn, date=day,
+                                                             session_id=f"bench{i}", paid=False))
+                    enso.db.session.commit()
+                except Exception as e:
+                    enso.db.session.rollback()
+                    errors.append(type(e).__name__)
+            write_latency.append(time.perf_counter() - start)
+            i += 1
+
+    def reader():
+        client = admin_client(enso)
+        while time.time() < stop:
+            start = time.perf_counter()
+            status = client.get("/reports/fees").status_code
+            if status != 200:
+                errors.append(status)
+            read_latency.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    ms = lambda values, p: percentile(values, p) * 1000
+    print(f"writes: {len(write_latency)} in {args.seconds:.0f}s, p50 {ms(write_latency, .5):.1f} ms, "
+          f"p99 {ms(write_latency, .99):.1f} ms, max {max(write_latency) * 1000:.0f} ms")
+    print(f"report reads: {len(read_latency)}, p50 {ms(read_latency, .5):.0f} ms, p99 {ms(read_latency, .99):.0f} ms")
+    print(f"errors: {len(errors)} {sorted(set(map(str, errors)))}")
+
+
+if __name__ == "__main__":
+    main()
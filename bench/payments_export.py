@@ -0,0 +1,70 @@
+"""Full payments backup export: rows/s and peak Python memory while streaming the CSV.
+
+    python bench/payments_export.py [--receipts 200000] [--players 50] [--repo PATH]
+"""
+import csv
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import text
+
+from common import admin_client, load_app, parse_args, seed_players
+
+
+def seed_receipts(enso, players: list, n: int) -> None:
+    """n per-session receipts inserted directly; every 7th note has a comma and a newline."""
+    columns = ["kind", "player_id", "player_pn", "amount", "currency", "note", "paid_at", "created_at",
+               "sessions_paid", "sessions_taken"]
+    values = [":kind", ":player_id", ":pn", ":amount", "'EUR'", ":note", ":paid_at", ":paid_at", "1", "1"]
+    if hasattr(enso.PaymentRecord, "paid_year_month"):
+        columns.append("paid_year_month")
+        values.append(":paid_year_month")
+    if hasattr(enso.PaymentRecord, "is_debt"):
+        columns.append("is_debt")
+        values.append("0")
+    insert = text(f"INSERT INTO payment_record ({', '.join(columns)}) VALUES ({', '.join(values)})")
+    with enso.app.app_context():
+        for chunk_start in range(0, n, 10000):
+            rows = []
+            for i in range(chunk_start, min(n, chunk_start + 10000)):
+                player_id, pn, _card = players[i % len(players)]
+                paid_at = datetime(2025, 1 + i % 12, 1 + i % 28, 10, 0, 0)
+                rows.append({"kind": "training_session", "player_id": player_id, "pn": pn, "amount": i % 50,
+                             "note": "note, with comma\nand newline" if i % 7 == 0 else f"n{i}",
+                             "paid_at": paid_at, "paid_year_month": paid_at.year * 100 + paid_at.month})
+            enso.db.session.execute(insert, rows)
+        enso.db.session.commit()
+
+
+def main():
+    args = parse_args(__doc__.splitlines()[0], receipts=(200000, "receipts in the history"),
+                      players=(50, "players the receipts belong to"))
+    enso = load_app(args.repo)
+    seed_receipts(enso, seed_players(enso, args.players), args.receipts)
+    client = admin_client(enso)
+
+    out_path = os.path.join(tempfile.mkdtemp(prefix="enso-export-"), "payments_backup.csv")
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get("/admin/reports/payments/export_all", buffered=False)
+    nbytes = 0
+    with open(out_path, "w", newline="") as out:
+        for chunk in response.response:
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            nbytes += len(chunk)
+            out.write(chunk)
+    elapsed = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with open(out_path, newline="") as f:
+        rows = sum(1 for _ in csv.reader(f)) - 1
+    print(f"{rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s), peak Python memory {peak / 1e6:.1f} MB, "
+          f"output {nbytes / 1e6:.1f} MB -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Shared fixtures. app.py migrates its database on import, so point it at a throwaway one first."""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="enso-tests-")
+os.environ["SQLITE_PATH"] = os.path.join(_TMP, "karate_club.db")
+os.environ["CHECKIN_SPOOL_PATH"] = os.path.join(_TMP, "checkin_spool.jsonl")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def enso():
+    import app as enso_app
+    enso_app.app.config["TESTING"] = True
+    return enso_app
+
+
+@pytest.fixture
+def db(enso):
+    """The app's db inside an app context; every table is emptied afterwards."""
+    with enso.app.app_context():
+        yield enso.db
+        enso.db.session.rollback()
+        for table in reversed(enso.db.metadata.sorted_tables):
+            enso.db.session.execute(table.delete())
+        enso.db.session.commit()
+        enso.card_index.invalidate()
+        enso.card_index.invalidate_checkins()
+
+
+@pytest.fixture
+def seed_players(enso, db):
+    """seed_players(n, year, month): n players with dues, sessions and receipts in that month."""
+    def seed(n: int, year: int, month: int, start: int = 0) -> list:
+        players = []
+        for i in range(start, start + n):
+            monthly = i % 3 != 0
+            p = enso.Player(first_name=f"First{i}", last_name=f"Last{i:05d}", pn=f"{7000000000 + i}",
+                            monthly_fee_amount=40 if monthly else 10, monthly_fee_is_monthly=monthly)
+            db.session.add(p)
+            db.session.flush()
+            if monthly:
+                db.session.add(enso.Payment(player_id=p.id, player_pn=p.pn, year=year, month=month,
+                                            amount=40, paid=i % 2 == 0))
+            for k in range(1 + i % 4):
+                db.session.add(enso.TrainingSession(player_id=p.id, player_pn=p.pn, date=date(year, month, 1 + k * 3),
+                                                    session_id=f"s{p.id}_{k}", paid=k % 2 == 0))
+            paid_at = datetime(year, month, 10)
+            for kind in ("training_session", "event", "bulk_payment"):
+                if i % 3 == ("training_session", "event", "bulk_payment").index(kind):
+                    db.session.add(enso.PaymentRecord(kind=kind, player_id=p.id, player_pn=p.pn, amount=20,
+                                                      sessions_paid=1, paid_at=paid_at))
+            if monthly and i % 2 == 0:
+                db.session.add(enso.PaymentRecord(kind="training_month", player_id=p.id, player_pn=p.pn, amount=40,
+                                                  year=year, month=month, paid_at=paid_at - timedelta(days=1)))
+            players.append(p)
+        db.session.commit()
+        return players
+    return seed
@@ -0,0 +1,61 @@
+"""The kiosk card index only reflects check-ins and card changes once their rows are committed."""
+import threading
+from datetime import date
+
+
+def add_session(enso, db, player):
+    db.session.add(enso.TrainingSession(player_id=player.id, player_pn=player.pn, date=date.today(),
+                                        session_id=f"t{player.id}", paid=True))
+    db.session.flush()
+
+
+def test_checkin_applies_on_commit(enso, db, seed_players):
+    player = seed_players(1, 2024, 3)[0]
+    assert not enso.card_index.checked_in(player.pn, date.today())
+
+    add_session(enso, db, player)
+    assert not enso.card_index.checked_in(player.pn, date.today())
+    db.session.commit()
+    assert enso.card_index.checked_in(player.pn, date.today())
+
+
+def test_checkin_discarded_on_rollback(enso, db, seed_players):
+    player = seed_players(1, 2024, 3)[0]
+    assert not enso.card_index.checked_in(player.pn, date.today())
+
+    add_session(enso, db, player)
+    db.session.rollback()
+    assert not enso.card_index.checked_in(player.pn, date.today())
+    db.session.commit()
+    assert not enso.card_index.checked_in(player.pn, date.today())
+
+
+def lookup_from_another_request(enso, card_id):
+    found = []
+
+    def run():
+        with enso.app.app_context():
+            found.append(enso.card_index.lookup(card_id))
+            enso.db.session.remove()
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return found[0]
+
+
+def test_card_change_reaches_a_reload_that_ran_before_commit(enso, db, seed_players):
+    player = seed_players(1, 2024, 3)[0]
+    player.card_id = "0001234567"
+    db.session.flush()
+    assert lookup_from_another_request(enso, "0001234567") is None  # not committed yet
+    db.session.commit()
+    assert enso.card_index.lookup("0001234567")["id"] == player.id
+
+
+def test_card_change_rolled_back_is_forgotten(enso, db, seed_players):
+    player = seed_players(1, 2024, 3)[0]
+    player.card_id = "0001234567"
+    db.session.flush()
+    assert enso.card_index.lookup("0001234567")["id"] == player.id  # a reload inside the transaction
+    db.session.rollback()
+    assert enso.card_index.lookup("0001234567") is None
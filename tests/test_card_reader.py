@@ -0,0 +1,177 @@
+"""CardReaderSupervisor against fake evdev devices: decoding, disconnect, backoff and reconnect."""
+import os
+import time
+from collections import namedtuple
+
+import pytest
+
+InputEvent = namedtuple("InputEvent", "type code value")
+READER = "/dev/input/event3"
+
+
+class FakeDevice:
+    """evdev.InputDevice stand-in; a pipe gives select() a real fd to wait on."""
+    def __init__(self, ecodes, name="USB RFID Reader"):
+        self.ecodes = ecodes
+        self.name = name
+        self.gone = False
+        self.closed = False
+        self._events = []
+        self._r, self._w = os.pipe()
+        os.set_blocking(self._r, False)
+
+    def fileno(self):
+        return self._r
+
+    def type_card(self, card):
+        for ch in card:
+            self._key(f"KEY_{ch.upper()}")
+        self._key("KEY_ENTER")
+
+    def _key(self, keycode):
+        code = self.ecodes.ecodes[keycode]
+        self._events += [InputEvent(self.ecodes.EV_KEY, code, 1), InputEvent(self.ecodes.EV_KEY, code, 0)]
+        os.write(self._w, b"x")
+
+    def unplug(self):
+        self.gone = True
+        os.write(self._w, b"x")
+
+    def read(self):
+        try:
+            os.read(self._r, 1024)
+        except BlockingIOError:
+            pass
+        if self.gone:
+            raise OSError(19, "No such device")
+        if not self._events:
+            raise BlockingIOError()
+        events, self._events = self._events, []
+        yield from events
+
+    def close(self):
+        self.closed = True
+
+
+class FakeInput:
+    """The injectable list_devices()/open_device() pair over a dict of fake devices."""
+    def __init__(self):
+        self.devices = {}
+        self.broken = set()
+        self.opens = []
+
+    def list_devices(self):
+        return list(self.devices)
+
+    def open_device(self, path):
+        self.opens.append(path)
+        if path in self.broken:
+            raise OSError(19, "No such device")
+        return self.devices[path]
+
+
+class FakeClock:
+    """Replaces app.time so backoff deadlines can be stepped over without sleeping."""
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+@pytest.fixture
+def reader(enso, monkeypatch):
+    if enso.ecodes is None:
+        pytest.skip("evdev is not installed")
+    clock = FakeClock()
+    monkeypatch.setattr(enso, "time", clock)
+    inputs = FakeInput()
+    scans = []
+    supervisor = enso.CardReaderSupervisor(list_devices=inputs.list_devices, open_device=inputs.open_device,
+                                           on_scan=scans.append, rescan_seconds=0.01, backoff_max=8)
+    return supervisor, inputs, clock, scans
+
+
+def health(supervisor, path=READER):
+    return next(r for r in supervisor.status()["readers"] if r["path"] == path)
+
+
+def test_decoded_card_is_reported(enso, reader):
+    supervisor, inputs, _clock, scans = reader
+    inputs.devices[READER] = device = FakeDevice(enso.ecodes)
+    inputs.devices["/dev/input/event0"] = FakeDevice(enso.ecodes, name="AT Translated Set 2 keyboard")
+
+    supervisor.rescan()
+    assert health(supervisor)["status"] == "connected"
+    assert [r["path"] for r in supervisor.status()["readers"]] == [READER]
+
+    device.type_card("0a1b2c")
+    supervisor.poll_once(0.1)
+    assert scans == ["0a1b2c"]
+    status = health(supervisor)
+    assert status["scans"] == 1
+    assert status["last_scan_at"]
+    assert status["name"] == "USB RFID Reader"
+
+
+def test_disconnect_backoff_and_reconnect(enso, reader):
+    supervisor, inputs, clock, scans = reader
+    inputs.devices[READER] = device = FakeDevice(enso.ecodes)
+    supervisor.rescan()
+
+    # The device fails mid-read: it is closed and retried after 1 s
+    device.unplug()
+    supervisor.poll_once(0.1)
+    status = health(supervisor)
+    assert device.closed
+    assert (status["status"], status["failures"], status["retry_at"]) == ("error", 1, clock.now + 1)
+    assert "No such device" in status["last_error"]
+
+    # Still broken when retried: the delay doubles
+    inputs.broken.add(READER)
+    opens = len(inputs.opens)
+    supervisor.rescan()
+    assert len(inputs.opens) == opens  # within the backoff window nothing is opened
+    clock.now += 1.5
+    supervisor.rescan()
+    assert len(inputs.opens) == opens + 1
+    status = health(supervisor)
+    assert (status["status"], status["failures"], status["retry_at"]) == ("error", 2, clock.now + 2)
+
+    clock.now += 1
+    supervisor.rescan()
+    assert len(inputs.opens) == opens + 1
+
+    # Back after the delay: reconnected with the failure count reset, and reading again
+    inputs.broken.clear()
+    inputs.devices[READER] = device = FakeDevice(enso.ecodes)
+    clock.now += 1.5
+    supervisor.rescan()
+    status = health(supervisor)
+    assert (status["status"], status["failures"], status["last_error"]) == ("connected", 0, None)
+
+    device.type_card("123")
+    supervisor.poll_once(0.1)
+    assert scans == ["123"]
+    assert health(supervisor)["scans"] == 1
+
+
+def test_unplugged_reader_is_dropped_and_replugged(enso, reader):
+    supervisor, inputs, _clock, scans = reader
+    inputs.devices[READER] = device = FakeDevice(enso.ecodes)
+    supervisor.rescan()
+
+    del inputs.devices[READER]
+    supervisor.rescan()
+    assert device.closed
+    assert health(supervisor)["status"] == "unplugged"
+
+    inputs.devices[READER] = device = FakeDevice(enso.ecodes)
+    supervisor.rescan()
+    assert health(supervisor)["status"] == "connected"
+    device.type_card("9")
+    supervisor.poll_once(0.1)
+    assert scans == ["9"]
@@ -0,0 +1,89 @@
+"""Outstanding debts: what collect_player_debts() finds, and how paying them clears the debts report."""
+from datetime import date
+
+import pytest
+from flask import template_rendered
+
+
+def test_player_without_pn_matches_rows_by_id(enso, db, seed_players):
+    other = seed_players(1, 2024, 3, start=1)[0]
+    player = enso.Player(first_name="No", last_name="Pn", pn="", monthly_fee_amount=10, monthly_fee_is_monthly=False)
+    db.session.add(player)
+    db.session.flush()
+    event = enso.Event(title="Cup", start_date=date(2024, 3, 16))
+    db.session.add(event)
+    db.session.flush()
+    db.session.add_all([
+        enso.Payment(player_id=player.id, year=2024, month=3, amount=40, paid=False),
+        enso.TrainingSession(player_id=player.id, date=date(2024, 3, 2), session_id="nopn_1", paid=False),
+        enso.EventRegistration(event_id=event.id, player_id=player.id, fee_override=25, paid=False),
+    ])
+    db.session.commit()
+
+    debts = enso.collect_player_debts([other, player], 2024, 3)
+    assert [p["amount"] for p in debts[player.id]["monthly"]] == [40]
+    assert debts[player.id]["sessions"]["count"] == 1
+    assert [e["fee"] for e in debts[player.id]["events"]] == [25]
+    assert debts[other.id]["monthly"] and not debts[other.id]["events"]
+
+
+def add_debt(enso, db, player, amount=10):
+    debt = enso.PaymentRecord(kind="training_session", player_id=player.id, player_pn=player.pn, amount=amount,
+                              sessions_paid=0, sessions_taken=0, is_debt=True, debt_status="open",
+                              note="AUTO_DEBT from receipt 1: 1 extra sessions")
+    db.session.add(debt)
+    db.session.commit()
+    return debt
+
+
+def open_debt_ids(enso, client):
+    captured = []
+
+    def record(sender, template, context, **extra):
+        captured.append(context)
+    with template_rendered.connected_to(record, enso.app):
+        assert client.get("/admin/reports/debts").status_code == 200
+    return {d.id for d in captured[0]["debts"]} if captured else None
+
+
+@pytest.fixture
+def client(enso, db, monkeypatch):
+    monkeypatch.setitem(enso.app.config, "WTF_CSRF_ENABLED", False)
+    client = enso.app.test_client()
+    with client.session_transaction() as s:
+        s["is_admin"] = True
+    return client
+
+
+def test_paying_a_debt_twice_pays_it_once(enso, db, client, seed_players):
+    player = seed_players(1, 2024, 3)[0]
+    debt = add_debt(enso, db, player)
+    for _ in range(2):
+        client.post(f"/admin/receipts/{debt.id}/pay", data={"method": "cash"})
+    db.session.expire_all()
+    assert enso.PaymentRecord.query.filter_by(related_receipt_id=debt.id).count() == 1
+    assert db.session.get(enso.PaymentRecord, debt.id).debt_status == "paid"
+
+
+def test_pay_from_list_clears_debts_report(enso, db, client, seed_players):
+    player, other = seed_players(2, 2024, 3)  # player 0 pays per session, 10 EUR
+    debts = [add_debt(enso, db, player), add_debt(enso, db, player, amount=20)]
+    kept = add_debt(enso, db, other)
+    assert open_debt_ids(enso, client) == {d.id for d in debts} | {kept.id}
+
+    client.post(f"/admin/players/{player.id}/pay_due", data={"kind": "debts"})
+    assert open_debt_ids(enso, client) == {kept.id}
+    paid = enso.PaymentRecord.query.filter(enso.PaymentRecord.related_receipt_id.in_([d.id for d in debts])).all()
+    assert sorted(p.amount for p in paid) == [10, 20]
+
+
+def test_pay_due_modal_clears_debts_report(enso, db, client, seed_players):
+    player, other = seed_players(2, 2024, 3)
+    debt = add_debt(enso, db, player)
+    kept = add_debt(enso, db, other)
+    assert open_debt_ids(enso, client) == {debt.id, kept.id}
+
+    client.post(f"/admin/players/{player.id}/pay_due_receipt", json={"dues": [debt.id]})
+    assert open_debt_ids(enso, client) == {kept.id}
+    bulk = enso.PaymentRecord.query.filter_by(kind="bulk_payment", player_pn=player.pn).one()
+    assert bulk.amount == 10 and f"receipt {debt.id}" in bulk.note
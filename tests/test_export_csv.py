@@ -0,0 +1,48 @@
+"""The players CSV export reads the session receipts once, not once per player."""
+import csv
+import io
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def count_statements(engine):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+def export(enso, db):
+    db.session.expire_all()
+    client = enso.app.test_client()
+    with count_statements(db.engine) as statements:
+        body = client.get("/export/csv").get_data(as_text=True)
+    return list(csv.DictReader(io.StringIO(body))), len(statements)
+
+
+def test_export_query_count_is_constant(enso, db, seed_players):
+    seed_players(6, 2024, 3)
+    small_rows, small = export(enso, db)
+    seed_players(24, 2024, 3, start=6)
+    large_rows, large = export(enso, db)
+
+    assert (len(small_rows), len(large_rows)) == (6, 30)
+    assert 0 < small == large
+
+
+def test_export_session_figures(enso, db, seed_players):
+    player = seed_players(1, 2024, 3)[0]  # per-session payer at 10 EUR with one 20 EUR session receipt
+    db.session.add(enso.PaymentRecord(kind="training_session", player_id=player.id, player_pn=player.pn,
+                                      amount=30, sessions_paid=0, sessions_taken=2))
+    db.session.commit()
+    row, = export(enso, db)[0]
+    assert (row["sessions_paid"], row["sessions_taken"], row["prepaid_amount_eur"], row["owed_amount_eur"]) \
+        == ("4", "2", "50", "-30")
@@ -0,0 +1,37 @@
+"""build_fees_report() must issue a fixed number of queries however many players the club has."""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def count_statements(engine):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+
+def report_statements(enso, db, year, month):
+    db.session.expire_all()
+    with count_statements(db.engine) as statements:
+        rows = enso.build_fees_report(year, month)
+    return rows, len(statements)
+
+
+def test_fees_report_query_count_is_constant(enso, db, seed_players):
+    n = 12
+    seed_players(n, 2024, 3)
+    small_rows, small = report_statements(enso, db, 2024, 3)
+    seed_players(4 * n, 2024, 3, start=n)
+    large_rows, large = report_statements(enso, db, 2024, 3)
+
+    assert len(small_rows) == n
+    assert len(large_rows) == 5 * n
+    assert 0 < small == large
@@ -0,0 +1,84 @@
+"""Individual migrations run against small hand-built legacy databases."""
+import pytest
+from sqlalchemy import create_engine, text
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE player (id INTEGER PRIMARY KEY, pn VARCHAR(20))",
+    "CREATE TABLE training_session (id INTEGER PRIMARY KEY, player_id INTEGER, date DATE)",
+    "CREATE TABLE payment (id INTEGER PRIMARY KEY, player_id INTEGER)",
+    "CREATE TABLE event_registration (id INTEGER PRIMARY KEY, player_id INTEGER)",
+    "CREATE TABLE payment_record (id INTEGER PRIMARY KEY, player_id INTEGER, note TEXT, related_receipt_id INTEGER)",
+]
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    yield engine
+    engine.dispose()
+
+
+def indexes(conn, table):
+    return {row[1] for row in conn.execute(text(f"PRAGMA index_list({table})"))}
+
+
+def test_unique_indexes_created_on_clean_data(enso, legacy):
+    with legacy.begin() as conn:
+        conn.execute(text("INSERT INTO player (id, pn) VALUES (1, '7000000001'), (2, NULL), (3, NULL)"))
+        conn.execute(text("INSERT INTO training_session (player_id, date) VALUES (1, '2024-03-01'), (1, '2024-03-02')"))
+        enso.migration_0002_player_pn_links(conn)
+        enso.migration_0003_session_date_unique(conn)
+        assert "uq_player_pn" in indexes(conn, "player")
+        assert "uq_player_session_date" in indexes(conn, "training_session")
+
+
+def test_duplicates_skip_the_unique_index_and_are_reported(enso, legacy, caplog):
+    with legacy.begin() as conn:
+        conn.execute(text("INSERT INTO player (id, pn) VALUES (1, '7000000001'), (2, '7000000001')"))
+        conn.execute(text("INSERT INTO training_session (player_id, date) VALUES (1, '2024-03-01'), (1, '2024-03-01')"))
+        enso.migration_0002_player_pn_links(conn)
+        enso.migration_0003_session_date_unique(conn)
+        assert "uq_player_pn" not in indexes(conn, "player")
+        assert "uq_player_session_date" not in indexes(conn, "training_session")
+        # The rest of migration 2 still ran
+        assert conn.execute(text("SELECT player_pn FROM training_session")).scalars().all() == ["7000000001"] * 2
+    messages = " ".join(r.getMessage() for r in caplog.records)
+    assert "uq_player_pn" in messages and "'7000000001'" in messages
+    assert "uq_player_session_date" in messages
+
+
+def test_debt_status_backfill_follows_the_note_rules(enso, legacy):
+    notes = {
+        1: "AUTO_DEBT from receipt 9: 1 extra sessions",                     # open
+        2: "AUTO_DEBT from receipt 9: 2 extra sessions | AUTO_DEBT_PAID",    # marked paid
+        3: "AUTO_DEBT from receipt 9: 1 extra sessions",                     # paid by receipt 4 below
+        4: "Payment for debt receipt 3",
+        5: "MANUAL_OWED: owed 20",                                           # prepaid, not a debt
+        6: "auto_debt from receipt 9",                                       # the marker is case-sensitive
+        7: None,
+    }
+    with legacy.begin() as conn:
+        for rid, note in notes.items():
+            conn.execute(text("INSERT INTO payment_record (id, player_id, note, related_receipt_id) VALUES (:id, 1, :note, :rel)"),
+                         {"id": rid, "note": note, "rel": 3 if rid == 4 else None})
+        enso.migration_0002_player_pn_links(conn)
+        enso.migration_0008_debt_status(conn)
+        rows = dict(conn.execute(text("SELECT id, debt_status FROM payment_record WHERE is_debt = 1")).all())
+    assert rows == {1: "open", 2: "paid", 3: "paid"}
+
+
+def test_name_sort_keys_backfill_folds_cyrillic(enso, legacy):
+    with legacy.begin() as conn:
+        conn.execute(text("ALTER TABLE player ADD COLUMN first_name VARCHAR(80)"))
+        conn.execute(text("ALTER TABLE player ADD COLUMN last_name VARCHAR(80)"))
+        conn.execute(text("INSERT INTO player (id, first_name, last_name) VALUES (1, 'Борис', 'ИВАНОВ'), (2, NULL, 'Ana')"))
+        enso.migration_0012_player_name_nocase_indexes(conn)
+        enso.migration_0014_player_name_sort_keys(conn)
+        rows = conn.execute(text("SELECT id, first_name_key, last_name_key FROM player ORDER BY id")).all()
+        assert [tuple(r) for r in rows] == [(1, "борис", "иванов"), (2, "", "ana")]
+        names = indexes(conn, "player")
+        assert {"ix_player_name_key", "ix_player_first_name_key"} <= names
+        assert not {"ix_player_name_nocase", "ix_player_first_name_nocase"} & names
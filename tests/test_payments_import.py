@@ -0,0 +1,35 @@
+"""Re-importing the payments backup into the database it came from adds nothing."""
+import io
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def client(enso, db, monkeypatch):
+    monkeypatch.setitem(enso.app.config, "WTF_CSRF_ENABLED", False)
+    client = enso.app.test_client()
+    with client.session_transaction() as s:
+        s["is_admin"] = True
+    return client
+
+
+def test_reimporting_backup_adds_nothing(enso, db, client, seed_players):
+    player = seed_players(2, 2024, 3)[1]
+    numbered = enso.PaymentRecord(kind="training_session", player_id=player.id, amount=20, sessions_paid=2,
+                                  note="cash, two sessions", paid_at=datetime(2024, 3, 9, 10, 1, 2, 345678))
+    # Entered in the app and never numbered: no receipt_no and no import_key to match on
+    unnumbered = [enso.PaymentRecord(kind="event", player_id=player.id, amount=15, note="Cup\nKata U12 "),
+                  enso.PaymentRecord(kind="bulk_payment", player_id=player.id, amount=30, method="card",
+                                     sessions_paid=None)]
+    db.session.add_all([numbered, *unnumbered])
+    db.session.flush()
+    numbered.assign_receipt_no(do_commit=False)
+    db.session.commit()
+    counts = (enso.PaymentRecord.query.count(), enso.Payment.query.count())
+
+    backup = client.get("/admin/reports/payments/export_all").get_data()
+    for _ in range(2):
+        client.post("/admin/payments/import_csv", data={"csv_file": (io.BytesIO(backup), "backup.csv")},
+                    content_type="multipart/form-data")
+        assert (enso.PaymentRecord.query.count(), enso.Payment.query.count()) == counts
@@ -0,0 +1,115 @@
+"""Players import: how rows are planned and applied, dry runs, and photo cleanup for the ZIP import."""
+import io
+import zipfile
+
+import pytest
+
+
+def players_zip(enso, photo="ivan.jpg", pn="7123456789") -> io.BytesIO:
+    player = enso.Player(first_name="Ivan", last_name="Petrov", pn=pn, photo_filename=photo)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("players/player_1_Petrov.csv", enso.player_profile_csv(player))
+        z.writestr(f"players/photos/{photo}", b"\xff\xd8 not really a jpeg")
+    buf.seek(0)
+    return buf
+
+
+@pytest.fixture
+def client(enso, db, tmp_path, monkeypatch):
+    monkeypatch.setattr(enso, "UPLOAD_FOLDER", str(tmp_path))
+    monkeypatch.setitem(enso.app.config, "WTF_CSRF_ENABLED", False)
+    client = enso.app.test_client()
+    with client.session_transaction() as s:
+        s["is_admin"] = True
+    return client
+
+
+def upload(client, archive):
+    return client.post("/admin/players/import_zip", data={"zipfile": (archive, "players.zip")},
+                       content_type="multipart/form-data")
+
+
+def test_import_copies_photos(enso, db, client, tmp_path):
+    upload(client, players_zip(enso))
+    player = enso.Player.query.filter_by(pn="7123456789").one()
+    assert [p.name for p in tmp_path.iterdir()] == [player.photo_filename]
+
+
+def test_failed_import_removes_copied_photos(enso, db, client, tmp_path, monkeypatch):
+    def fail(plan):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(enso.PlayerImportPlan, "apply", fail)
+    upload(client, players_zip(enso))
+    assert enso.Player.query.filter_by(pn="7123456789").count() == 0
+    assert list(tmp_path.iterdir()) == []
+
+
+def import_rows(*rows):
+    return [(f"Row {i}", row) for i, row in enumerate(rows, start=1)]
+
+
+def test_plan_sorts_rows_into_inserts_updates_unchanged_and_errors(enso, db):
+    db.session.add_all([enso.Player(first_name="Ana", last_name="Same", pn="7000000001", phone="111"),
+                        enso.Player(first_name="Boris", last_name="Moved", pn="7000000002", phone="222")])
+    db.session.commit()
+    plan = enso.PlayerImportPlan(import_rows(
+        {"first_name": "Ana", "last_name": "Same", "pn": "7000000001", "phone": "111"},
+        {"first_name": "Boris", "last_name": "Moved", "pn": "7000000002", "phone": "333"},
+        {"first_name": "Vera", "last_name": "New", "pn": "7000000003"},
+        {"first_name": "Gosho", "last_name": "Short", "pn": "700000000"},
+        {"first_name": "", "last_name": "Nameless", "pn": "7000000004"},
+        {"first_name": "Vera", "last_name": "Again", "pn": "7000000003"},
+    ))
+    assert [new["pn"] for new in plan.creates] == ["7000000003"]
+    assert [(p.pn, changes) for p, changes in plan.updates] == [("7000000002", {"phone": ("222", "333")})]
+    assert plan.unchanged == 1
+    assert [e.split(":")[0] for e in plan.errors] == ["Row 4", "Row 5", "Row 6"]
+
+    plan.apply()
+    db.session.commit()
+    db.session.expire_all()
+    assert {p.pn: p.phone for p in enso.Player.query} == {"7000000001": "111", "7000000002": "333", "7000000003": None}
+    assert enso.Player.query.filter_by(pn="7000000003").one().name_translit
+
+
+def test_plan_skips_existing_players_without_update_existing(enso, db):
+    db.session.add(enso.Player(first_name="Boris", last_name="Moved", pn="7000000002", phone="222"))
+    db.session.commit()
+    plan = enso.PlayerImportPlan(import_rows({"first_name": "Boris", "last_name": "Moved", "pn": "7000000002",
+                                              "phone": "333"}), update_existing=False)
+    assert (plan.creates, plan.updates, plan.skipped) == ([], [], 1)
+
+
+def test_fill_id_gaps_reuses_free_ids_in_order(enso, db):
+    db.session.add_all([enso.Player(id=1, first_name="A", last_name="One", pn="7000000001"),
+                        enso.Player(id=3, first_name="C", last_name="Three", pn="7000000003")])
+    db.session.commit()
+    rows = import_rows({"first_name": "B", "last_name": "Two", "pn": "7000000002"},
+                       {"first_name": "D", "last_name": "Four", "pn": "7000000004"})
+    assert [new["id"] for new in enso.PlayerImportPlan(rows, fill_id_gaps=True).creates] == [2, 4]
+    assert "id" not in enso.PlayerImportPlan(rows).creates[0]
+
+
+def test_dry_run_writes_nothing(enso, db, client, tmp_path):
+    db.session.add(enso.Player(first_name="Boris", last_name="Moved", pn="7000000002", phone="222"))
+    db.session.commit()
+    csv_text = "first_name,last_name,pn,phone\nBoris,Moved,7000000002,333\nVera,New,7000000003,\n"
+    response = client.post("/admin/players/import_csv",
+                           data={"csv_file": (io.BytesIO(csv_text.encode()), "players.csv"), "dry_run": "1"},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+    response = client.post("/admin/players/import_zip",
+                           data={"zipfile": (players_zip(enso), "players.zip"), "dry_run": "1"},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    assert {p.pn: p.phone for p in enso.Player.query} == {"7000000002": "222"}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_zip_import_rejects_pn_that_is_not_ten_digits(enso, db, client, tmp_path):
+    upload(client, players_zip(enso, pn="712345678"))
+    assert enso.Player.query.count() == 0
+    assert list(tmp_path.iterdir()) == []
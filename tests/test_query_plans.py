@@ -0,0 +1,155 @@
+"""The statements the hot pages actually issue must seek their indexes, never scan the big tables."""
+import re
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import event, text
+
+FULL_SCAN = re.compile(r"\bSCAN (player|training_session|payment_record|payment|event_registration)\b(?! USING)")
+
+# Page -> indexes its statements must use, on a year of seeded history
+PAGES = {
+    "fees_report": ("/reports/fees?year={year}&month={month}",
+                    {"ix_player_name", "ix_payment_year_month", "ix_training_session_date_pn",
+                     "ix_payment_record_paid_year_month", "ix_payment_record_kind_year_month",
+                     "ix_event_registration_pn_paid"}),
+    "player_detail": ("/players/{id}",
+                      {"ix_payment_pn_year_month_paid", "ix_training_session_pn_date_paid",
+                       "ix_payment_record_pn_kind_paid_at"}),
+    "dues_modal": ("/admin/players/{id}/dues_json",
+                   {"ix_payment_pn_year_month_paid", "ix_event_registration_pn_paid"}),
+    "players_list": ("/players", {"ix_player_name_key", "ix_payment_year_month"}),
+    "kiosk": ("/kiosk", {"ix_player_first_name_key"}),
+    "debts_report": ("/admin/reports/debts", {"ix_payment_record_debt_status"}),
+}
+
+
+@contextmanager
+def captured_selects(engine):
+    """Collect (statement, parameters) for every SELECT run on engine inside the block."""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def query_plan(engine, statement, parameters):
+    with engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()]
+
+
+def indexes_used(plan):
+    return {m.group(2) for step in plan for m in [re.search(r"USING (COVERING )?INDEX (\w+)", step)] if m}
+
+
+def assert_no_full_scan(plan, statement):
+    assert not any(FULL_SCAN.search(step) for step in plan), (statement, plan)
+
+
+def add_history(enso, db, players, months):
+    """Older settled months for every player, written in bulk so the tables have production-like sizes."""
+    payments, sessions, receipts = [], [], []
+    today = date.today()
+    for k in range(12, 12 + months):
+        year, month = divmod(today.year * 12 + today.month - 1 - k, 12)
+        month += 1
+        for p in players:
+            payments.append({"player_id": p.id, "player_pn": p.pn, "year": year, "month": month, "amount": 40, "paid": True})
+            sessions.extend({"player_id": p.id, "player_pn": p.pn, "date": date(year, month, day),
+                             "session_id": f"h{p.id}_{year}{month:02d}{day:02d}", "paid": True} for day in (2, 9, 16))
+            receipts.append({"kind": "training_month", "player_id": p.id, "player_pn": p.pn, "amount": 40,
+                             "year": year, "month": month, "paid_at": datetime(year, month, 3),
+                             "paid_year_month": year * 100 + month})
+    conn = db.session.connection()  # Core inserts: history does not need the rollup or card index
+    conn.execute(enso.Payment.__table__.insert(), payments)
+    conn.execute(enso.TrainingSession.__table__.insert(), sessions)
+    conn.execute(enso.PaymentRecord.__table__.insert(), receipts)
+
+
+@pytest.fixture
+def analyzed(enso, db, seed_players):
+    # A year of history up to this month, so the month-scoped indexes are selective the way they are in production
+    today = date.today()
+    players = []
+    for k in range(12):
+        year, month = divmod(today.year * 12 + today.month - 1 - k, 12)
+        players += seed_players(10, year, month + 1, start=k * 10)
+    add_history(enso, db, players, months=24)
+    # ...and a few open debts among many settled receipts
+    for player in enso.Player.query.limit(5):
+        db.session.add(enso.PaymentRecord(kind="training_session", player_id=player.id, player_pn=player.pn,
+                                          amount=0, is_debt=True, debt_status="open",
+                                          note="AUTO_DEBT from session", paid_at=datetime.now()))
+    db.session.commit()
+    db.session.execute(text("ANALYZE"))
+    db.session.commit()
+    db.engine.dispose()  # pooled connections keep the statistics they loaded when they opened
+    return db
+
+
+@pytest.fixture
+def admin_client(enso):
+    client = enso.app.test_client()
+    with client.session_transaction() as s:
+        s["is_admin"] = True
+    return client
+
+
+def test_schema_is_fully_migrated(enso, db):
+    version = enso.schema_version(db.session.connection())
+    assert version == max(m[0] for m in enso.MIGRATIONS)
+
+
+@pytest.mark.parametrize("page", sorted(PAGES))
+def test_page_statements_use_their_indexes(enso, analyzed, admin_client, page):
+    url, expected = PAGES[page]
+    player = enso.Player.query.filter_by(pn="7000000003").one()  # a per-session payer with history
+    today = date.today()
+    with captured_selects(analyzed.engine) as captured:
+        assert admin_client.get(url.format(id=player.id, year=today.year, month=today.month)).status_code == 200
+    assert captured
+    used = set()
+    for statement, parameters in captured:
+        plan = query_plan(analyzed.engine, statement, parameters)
+        assert_no_full_scan(plan, statement)
+        used |= indexes_used(plan)
+    assert expected <= used, used
+
+
+@pytest.mark.parametrize("sort, index", [("name", "ix_player_name_key"),
+                                         ("first_name", "ix_player_first_name_key")])
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_player_keyset_page_seeks_name_key_index(enso, analyzed, sort, index, direction):
+    first, cursor = enso.player_keyset_page(enso.Player.query, sort, direction, limit=10)
+    assert cursor
+    with captured_selects(analyzed.engine) as captured:
+        enso.player_keyset_page(enso.Player.query, sort, direction, cursor=cursor, limit=10)
+    statement, parameters = next((s, p) for s, p in captured if "FROM player" in s)
+    plan = query_plan(analyzed.engine, statement, parameters)
+    assert_no_full_scan(plan, statement)
+    assert index in indexes_used(plan), plan
+    assert any(step.startswith("SEARCH player") for step in plan), plan
+
+
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_player_keyset_page_folds_cyrillic_case(enso, db, direction):
+    # NOCASE folds only ASCII, so "Борис" used to sort before "ана"
+    for i, first in enumerate(("вера", "Борис", "ана", "Вадим")):
+        db.session.add(enso.Player(first_name=first, last_name="Тест", pn=f"{7100000000 + i}"))
+    db.session.commit()
+    names, cursor = [], None
+    while True:
+        page, cursor = enso.player_keyset_page(enso.Player.query, "first_name", direction, cursor=cursor, limit=1)
+        names += [p.first_name for p in page]
+        if not cursor:
+            break
+    expected = ["ана", "Борис", "Вадим", "вера"]
+    assert names == (expected if direction == "asc" else expected[::-1])